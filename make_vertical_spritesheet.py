@@ -1,21 +1,32 @@
 #!/usr/bin/env python3
-"""Create a vertical spritesheet from PNG files matched by a glob pattern.
+"""Create a vertical, horizontal or grid spritesheet from PNG files matched by a glob pattern.
 
 Example:
     python make_vertical_spritesheet.py "image_*.png" -o spritesheet.png
+    python make_vertical_spritesheet.py "sheets/*.png" --layout grid --columns 4 --stream
 """
 
 from __future__ import annotations
 
 import argparse
 import glob
+import math
 import os
 import re
 import sys
-from typing import List
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Tuple
 
 from PIL import Image
 
+if TYPE_CHECKING:
+    import numpy as np
+
+LAYOUTS = ("vertical", "horizontal", "grid")
+STRIP_BYTES = 4 << 20
+
 
 def natural_key(path: str):
     """Sort paths like image_2.png before image_10.png."""
@@ -30,28 +41,154 @@ def collect_images(pattern: str) -> List[str]:
     return pngs
 
 
+def read_image_sizes(image_paths: List[str]) -> List[Tuple[int, int]]:
+    """Image sizes from the file headers, without decoding any pixels."""
+    sizes = []
+    for path in image_paths:
+        with Image.open(path) as img:
+            sizes.append(img.size)
+    return sizes
+
+
+def layout_columns(layout: str, count: int, columns: int = 0) -> int:
+    if layout == "vertical":
+        return 1
+    if layout == "horizontal":
+        return max(1, count)
+    if columns > 0:
+        return columns
+    return max(1, math.ceil(math.sqrt(count)))
+
+
+def compute_layout(sizes: List[Tuple[int, int]], columns: int) -> Tuple[List[List[Tuple[int, int]]], int, int]:
+    """Place images ``columns`` per row, left to right and top to bottom.
+
+    Each row is as tall as its tallest image and images in a row are packed
+    side by side. Returns ``(rows, width, height)`` where ``rows`` lists, per
+    row, ``(image_index, x)`` pairs, plus the row's top ``y`` and height as
+    the last entry.
+    """
+    rows = []
+    width = 0
+    y = 0
+    for start in range(0, len(sizes), columns):
+        x = 0
+        row = []
+        row_height = 0
+        for index in range(start, min(start + columns, len(sizes))):
+            w, h = sizes[index]
+            row.append((index, x))
+            x += w
+            row_height = max(row_height, h)
+        row.append((y, row_height))
+        rows.append(row)
+        width = max(width, x)
+        y += row_height
+    return rows, width, y
+
+
+def build_spritesheet(image_paths: List[str], output_path: str, layout: str = "vertical", columns: int = 0) -> None:
+    """Paste images one at a time into an in-memory sheet and save it."""
+    sizes = read_image_sizes(image_paths)
+    rows, width, height = compute_layout(sizes, layout_columns(layout, len(sizes), columns))
+
+    sheet = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    for row in rows:
+        y, _ = row[-1]
+        for index, x in row[:-1]:
+            with Image.open(image_paths[index]) as img:
+                sheet.paste(img.convert("RGBA"), (x, y))
+    sheet.save(output_path)
+
+
 def build_vertical_spritesheet(image_paths: List[str], output_path: str) -> None:
-    images = [Image.open(path).convert("RGBA") for path in image_paths]
-    try:
-        max_width = max(img.width for img in images)
-        total_height = sum(img.height for img in images)
+    build_spritesheet(image_paths, output_path, layout="vertical")
+
+
+def _bounded_map(pool: ThreadPoolExecutor, fn, items: Iterable, window: int) -> Iterator:
+    """Like ``pool.map`` but with at most ``window`` results pending at once."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def load_rgba(path: str) -> np.ndarray:
+    """Decode one image to a (height, width, 4) uint8 RGBA array."""
+    import numpy as np
+
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGBA"))
+
 
-        sheet = Image.new("RGBA", (max_width, total_height), (0, 0, 0, 0))
+def stream_spritesheet(
+    image_paths: List[str],
+    output_path: str,
+    layout: str = "vertical",
+    columns: int = 0,
+    workers: int = 4,
+    compress_level: int = 6,
+    filter_name: str = "none",
+) -> None:
+    """Assemble the sheet strip by strip and stream it to PNG.
 
-        y = 0
-        for img in images:
-            sheet.paste(img, (0, y))
-            y += img.height
+    Only headers are read up front to compute the layout. Images are then
+    decoded one per task on a thread pool, in order, with at most
+    ``2 * workers`` decodes pending. Images that share a layout row with
+    others (horizontal and grid layouts) are spilled to a temporary ``.npy``
+    file as soon as they are decoded and read back through a memory map, so
+    a row is never held in memory as a whole: the sheet is written in
+    strips of about ``STRIP_BYTES`` (at least one scanline).
 
-        sheet.save(output_path)
-    finally:
-        for img in images:
-            img.close()
+    Needs numpy and ``voxel_core``, which are imported here so that the
+    in-memory path works with Pillow alone.
+    """
+    import numpy as np
+
+    from voxel_core import PNGStreamWriter
+
+    sizes = read_image_sizes(image_paths)
+    rows, width, height = compute_layout(sizes, layout_columns(layout, len(sizes), columns))
+    shared = {index for row in rows if len(row) > 2 for index, _ in row[:-1]}
+
+    strip_rows = max(1, STRIP_BYTES // max(1, width * 4))
+    workers = max(1, workers)
+    png = PNGStreamWriter(output_path, width, height, compress_level=compress_level, filter_name=filter_name)
+    try:
+        with tempfile.TemporaryDirectory(prefix="spritesheet_") as spill_dir, ThreadPoolExecutor(max_workers=workers) as pool:
+
+            def decode(index):
+                pixels = load_rgba(image_paths[index])
+                if index not in shared:
+                    return pixels
+                path = os.path.join(spill_dir, f"{index}.npy")
+                np.save(path, pixels)
+                return path
+
+            decoded = _bounded_map(pool, decode, range(len(image_paths)), 2 * workers)
+            for row in rows:
+                _, row_height = row[-1]
+                placed = [(next(decoded), x) for _, x in row[:-1]]
+                for top in range(0, row_height, strip_rows):
+                    bottom = min(top + strip_rows, row_height)
+                    strip = np.zeros((bottom - top, width, 4), dtype=np.uint8)
+                    for source, x in placed:
+                        pixels = np.load(source, mmap_mode="r") if isinstance(source, str) else source
+                        part = pixels[top:bottom]
+                        strip[: part.shape[0], x : x + part.shape[1]] = part
+                    png.write_rows(strip)
+    except BaseException:
+        png.abort()
+        raise
+    png.close()
 
 
 def main() -> int:
     parser = argparse.ArgumentParser(
-        description="Stack PNG files into one vertical spritesheet in sorted order."
+        description="Stack PNG files into one spritesheet in sorted order."
     )
     parser.add_argument(
         "pattern",
@@ -63,6 +200,40 @@ def main() -> int:
         default="spritesheet.png",
         help="Output spritesheet path (default: spritesheet.png)",
     )
+    parser.add_argument(
+        "--layout",
+        choices=LAYOUTS,
+        default="vertical",
+        help="Stack images vertically, side by side, or in a grid (default: vertical)",
+    )
+    parser.add_argument(
+        "--columns",
+        type=int,
+        default=0,
+        help="Images per row for --layout grid (default: square-ish grid)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write the sheet in strips with bounded memory instead of building it in memory",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Threads decoding input images in --stream mode (default: 4)",
+    )
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        default=6,
+        help="zlib level 0-9 for --stream output (default: 6)",
+    )
+    parser.add_argument(
+        "--png-filter",
+        default="none",
+        help="PNG scanline filter for --stream output: none, sub, up, average, paeth or adaptive (default: none)",
+    )
     args = parser.parse_args()
 
     image_paths = collect_images(args.pattern)
@@ -70,7 +241,22 @@ def main() -> int:
         print(f"No PNG files matched pattern: {args.pattern}", file=sys.stderr)
         return 1
 
-    build_vertical_spritesheet(image_paths, args.output)
+    if args.stream:
+        from voxel_core import PNG_FILTERS
+
+        if args.png_filter not in PNG_FILTERS:
+            parser.error(f"argument --png-filter: invalid choice: {args.png_filter!r} (choose from {', '.join(PNG_FILTERS)})")
+        stream_spritesheet(
+            image_paths,
+            args.output,
+            layout=args.layout,
+            columns=args.columns,
+            workers=args.workers,
+            compress_level=min(9, max(0, args.compress_level)),
+            filter_name=args.png_filter,
+        )
+    else:
+        build_spritesheet(image_paths, args.output, layout=args.layout, columns=args.columns)
     print(f"Created '{args.output}' with {len(image_paths)} images.")
     return 0
 
@@ -149,6 +149,8 @@ def _clean_generated_outputs(fbx: Path) -> list[Path]:
 
     matches = []
     matches.extend(parent.glob(f"{out_base}__*.png"))
+    matches.extend(parent.glob(f"{out_base}__*.json"))
+    matches.extend(parent.glob(f"{out_base}__*.vxa"))
     matches.append(parent / f"{out_base}.log")
     matches.append(parent / f"{out_base}.batch.log")
 
@@ -174,10 +176,22 @@ def main() -> int:
     parser.add_argument("--runner", default="", help="Path to run_voxelator_fbx.py (default: sibling file)")
     parser.add_argument("--res", type=int, default=64, help="Voxel resolution (default: 64)")
     parser.add_argument("--fill", type=int, choices=(0, 1), default=0, help="Fill volume (default: 0)")
+    parser.add_argument("--surface-color-only", type=int, choices=(0, 1), default=0, help="Color filled interiors from the nearest surface voxel (default: 0)")
     parser.add_argument("--separate", type=int, choices=(0, 1), default=0, help="Separate cubes (default: 0)")
     parser.add_argument("--rot-offset", type=float, default=0.0, help="Z rotation offset in degrees (default: 0)")
+    parser.add_argument("--rot-offsets", default="", help="Comma-separated Z rotation offsets exported per FBX in one run, one PNG per angle")
     parser.add_argument("--action", default="All", help="Action name or All (default: All)")
     parser.add_argument("--frame-step", type=int, default=1, help="Animation frame step (default: 1)")
+    parser.add_argument("--voxel-data", type=int, choices=(0, 1), default=0, help="Also write .vxa voxel files (default: 0)")
+    parser.add_argument("--slice-columns", type=int, default=0, help="Slice tiles per row inside each frame (default: 0, one row)")
+    parser.add_argument("--frame-columns", type=int, default=1, help="Animation frames per spritesheet row (default: 1)")
+    parser.add_argument("--pow2", type=int, choices=(0, 1), default=0, help="Pad spritesheets to power-of-two dimensions (default: 0)")
+    parser.add_argument("--palette", choices=("none", "exact", "quantize"), default="none", help="Indexed-color PNG palette mode (default: none)")
+    parser.add_argument("--palette-colors", type=int, default=256, help="Largest palette size when quantizing (default: 256)")
+    parser.add_argument("--palette-scope", choices=("action", "all"), default="action", help="Palette per action or per FBX (default: action)")
+    parser.add_argument("--png-compression", type=int, default=6, help="zlib level 0-9 for the written PNGs (default: 6)")
+    parser.add_argument("--png-filter", choices=("none", "sub", "up", "average", "paeth", "adaptive"), default="none", help="PNG scanline filter (default: none)")
+    parser.add_argument("--shared-grid", type=int, choices=(0, 1), default=0, help="Export all actions of an FBX on one shared grid (default: 0)")
     parser.add_argument("--skip-existing", action="store_true", help="Skip files with existing output pattern")
     parser.add_argument("--max-files", type=int, default=0, help="Optional cap for number of FBX files")
     parser.add_argument("--dry-run", action="store_true", help="Only list discovered files and exit")
@@ -266,16 +280,40 @@ def main() -> int:
             str(max(1, args.res)),
             "--fill",
             str(args.fill),
+            "--surface-color-only",
+            str(args.surface_color_only),
             "--separate",
             str(args.separate),
             "--rot-offset",
             str(args.rot_offset),
+            "--rot-offsets",
+            args.rot_offsets,
             "--export-animation",
             "1",
             "--action",
             str(args.action),
             "--frame-step",
             str(max(1, args.frame_step)),
+            "--shared-grid",
+            str(args.shared_grid),
+            "--voxel-data",
+            str(args.voxel_data),
+            "--slice-columns",
+            str(args.slice_columns),
+            "--frame-columns",
+            str(args.frame_columns),
+            "--pow2",
+            str(args.pow2),
+            "--palette",
+            args.palette,
+            "--palette-colors",
+            str(args.palette_colors),
+            "--palette-scope",
+            args.palette_scope,
+            "--png-compression",
+            str(args.png_compression),
+            "--png-filter",
+            args.png_filter,
         ]
 
         print(f"[{idx}/{len(fbx_files)}] START {rel}", flush=True)
@@ -341,8 +379,10 @@ def main() -> int:
         "settings": {
             "res": args.res,
             "fill": args.fill,
+            "surface_color_only": args.surface_color_only,
             "separate": args.separate,
             "rot_offset": args.rot_offset,
+            "rot_offsets": args.rot_offsets,
             "action": args.action,
             "frame_step": args.frame_step,
             "skip_existing": args.skip_existing,
@@ -6,7 +6,7 @@ Usage:
     --fbx "/path/model.fbx" \
     --out "output.png" \
     --res 64 --fill 0 --separate 0 \
-    --export-animation 1 --action "All" --frame-step 2
+    --export-animation 1 --action "All" --frame-step 2 --shared-grid 1
 """
 
 from __future__ import annotations
@@ -136,7 +136,15 @@ def _out_path_for_action(base_out_path, action_name):
     return f"{root}__{_sanitize_name(action_name)}{ext}"
 
 
-def _run_voxelize(mesh_obj, out_path, args, export_animation=False, action_name="NONE"):
+def _out_paths_for_angles(path, rot_offsets):
+    angles = [float(part) for part in rot_offsets.replace(";", ",").split(",") if part.strip()]
+    if len(angles) < 2:
+        return [path]
+    root, ext = os.path.splitext(path)
+    return [f"{root}__rot{angle:g}{ext}" for angle in angles]
+
+
+def _run_voxelize(mesh_obj, out_path, args, export_animation=False, action_name="NONE", animation_batch=None):
     for obj in bpy.context.selected_objects:
         obj.select_set(False)
     mesh_obj.select_set(True)
@@ -145,17 +153,38 @@ def _run_voxelize(mesh_obj, out_path, args, export_animation=False, action_name=
     op_args = {
         "voxelizeResolution": max(1, int(args.res)),
         "fill_volume": bool(args.fill),
+        "surface_color_only": bool(args.surface_color_only),
         "separate_cubes": bool(args.separate),
         "rotation_offset_deg": float(args.rot_offset),
+        "rotation_offsets": args.rot_offsets,
         "slices_only": True,
         "export_animation": bool(export_animation),
         "frame_step": max(1, int(args.frame_step)),
+        "frame_sampling": args.frame_sampling.upper(),
+        "frame_budget": max(0, int(args.frame_budget)),
+        "motion_threshold": max(0.0, float(args.motion_threshold)),
+        "frame_cache_mb": max(0, int(args.frame_cache_mb)),
+        "incremental_frames": bool(args.incremental),
+        "workers": max(1, int(args.workers)),
+        "fast_skinning": bool(args.fast_skinning),
         "slices_filepath": out_path,
+        "voxel_data": bool(args.voxel_data),
+        "slice_columns": max(0, int(args.slice_columns)),
+        "frame_columns": max(1, int(args.frame_columns)),
+        "pad_pow2": bool(args.pow2),
+        "palette_mode": args.palette.upper(),
+        "palette_colors": min(256, max(2, int(args.palette_colors))),
+        "palette_scope": args.palette_scope.upper(),
+        "png_backend": args.png_backend.upper(),
+        "png_compression": min(9, max(0, int(args.png_compression))),
+        "png_filter": args.png_filter.upper(),
         "log_filepath": args.log_path,
         "console_progress": True,
     }
     if action_name and action_name in bpy.data.actions.keys():
         op_args["animation_action"] = action_name
+    if animation_batch:
+        op_args["animation_batch"] = json.dumps([{"action": name, "filepath": path} for name, path in animation_batch])
 
     result = bpy.ops.object.voxelize("EXEC_DEFAULT", **op_args)
     return result
@@ -179,11 +208,31 @@ def main():
     parser.add_argument("--out", default="", help="Output PNG path or filename (default: FBX folder)")
     parser.add_argument("--res", type=int, default=64, help="Voxel resolution (default: 64)")
     parser.add_argument("--fill", type=int, choices=(0, 1), default=0, help="Fill volume (0/1)")
+    parser.add_argument("--surface-color-only", type=int, choices=(0, 1), default=0, help="With --fill 1, color interior voxels from the nearest surface voxel (0/1)")
     parser.add_argument("--separate", type=int, choices=(0, 1), default=0, help="Separate cubes (0/1)")
     parser.add_argument("--rot-offset", type=float, default=0.0, help="Z rotation offset in degrees (default: 0)")
+    parser.add_argument("--rot-offsets", default="", help="Comma-separated Z rotation offsets; animation exports write one PNG per angle from one evaluation pass (overrides --rot-offset)")
     parser.add_argument("--export-animation", type=int, choices=(0, 1), default=0, help="Export animation mode (0/1)")
     parser.add_argument("--action", default="DefaultPose", help="Action name or 'All' for all detected FBX actions")
+    parser.add_argument("--frame-sampling", choices=("stride", "adaptive"), default="stride", help="Keep every --frame-step candidate, or choose candidates by mesh motion (default: stride)")
+    parser.add_argument("--frame-budget", type=int, default=0, help="Adaptive sampling: at most this many frames per action (default: 0, no limit)")
+    parser.add_argument("--motion-threshold", type=float, default=1.0, help="Adaptive sampling: keep a frame after this many voxels of vertex motion (default: 1.0)")
+    parser.add_argument("--shared-grid", type=int, choices=(0, 1), default=0, help="Export all selected actions in one run on a single grid with a consistent voxel scale (0/1)")
     parser.add_argument("--frame-step", type=int, default=1, help="Frame step for animation export (default: 1)")
+    parser.add_argument("--fast-skinning", type=int, choices=(0, 1), default=1, help="Skin armature-only meshes from pose bone matrices instead of evaluating each frame (0/1)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for animation frame voxelization (default: 1)")
+    parser.add_argument("--incremental", type=int, choices=(0, 1), default=1, help="Re-voxelize only triangles that moved since the previous frame (0/1)")
+    parser.add_argument("--frame-cache-mb", type=int, default=2048, help="Memory for cached frame geometry before spilling to temp files (default: 2048)")
+    parser.add_argument("--voxel-data", type=int, choices=(0, 1), default=0, help="Also write a compact .vxa voxel file next to each PNG (0/1)")
+    parser.add_argument("--slice-columns", type=int, default=0, help="Slice tiles per row inside each frame (default: 0, one row)")
+    parser.add_argument("--frame-columns", type=int, default=1, help="Animation frames per spritesheet row (default: 1)")
+    parser.add_argument("--pow2", type=int, choices=(0, 1), default=0, help="Pad spritesheets to power-of-two dimensions (0/1)")
+    parser.add_argument("--palette", choices=("none", "exact", "quantize"), default="none", help="Write indexed-color PNGs with an exact or quantized palette (default: none)")
+    parser.add_argument("--palette-colors", type=int, default=256, help="Largest palette size when quantizing, 2-256 (default: 256)")
+    parser.add_argument("--palette-scope", choices=("action", "all"), default="action", help="Share one palette per action or across all outputs of the FBX; all spans actions with --shared-grid 1 (default: action)")
+    parser.add_argument("--png-backend", choices=("direct", "blender"), default="direct", help="Write single-frame PNGs directly or through a Blender image datablock (default: direct)")
+    parser.add_argument("--png-compression", type=int, default=6, help="zlib level 0-9 for directly encoded PNGs (default: 6)")
+    parser.add_argument("--png-filter", choices=("none", "sub", "up", "average", "paeth", "adaptive"), default="none", help="Scanline filter for directly encoded PNGs (default: none)")
     parser.add_argument("--log", default="", help="Optional log file path or filename (default: alongside output)")
     args = parser.parse_args(_script_args(sys.argv))
 
@@ -255,6 +304,23 @@ def main():
     success_paths = []
     failures = []
     total_actions = len(actions_to_run)
+    if bool(args.shared_grid) and total_actions > 1:
+        batch = [(action.name, _out_path_for_action(out_path, action.name)) for action in actions_to_run]
+        print(f"[Voxelator CLI] Exporting {total_actions} actions on a shared grid", flush=True)
+        for name, path in batch:
+            print(f"[Voxelator CLI] Output '{name}': {path}", flush=True)
+        t0 = time.perf_counter()
+        result = _run_voxelize(joined_mesh, out_path, args, export_animation=True, animation_batch=batch)
+        if "FINISHED" in result:
+            dt = time.perf_counter() - t0
+            print(f"[Voxelator CLI] Finished {total_actions} actions in {dt:.2f}s", flush=True)
+            for _, path in batch:
+                success_paths.extend(_out_paths_for_angles(path, args.rot_offsets))
+        else:
+            failures.extend((name, str(result)) for name, _ in batch)
+            print(f"WARNING: shared-grid export failed: {result}")
+        actions_to_run = []
+
     for idx, action in enumerate(actions_to_run, start=1):
         action_out = _out_path_for_action(out_path, action.name) if len(actions_to_run) > 1 else out_path
         print(f"[Voxelator CLI] Action {idx}/{total_actions}: '{action.name}'", flush=True)
@@ -264,7 +330,7 @@ def main():
         if "FINISHED" in result:
             dt = time.perf_counter() - t0
             print(f"[Voxelator CLI] Finished '{action.name}' in {dt:.2f}s", flush=True)
-            success_paths.append(action_out)
+            success_paths.extend(_out_paths_for_angles(action_out, args.rot_offsets))
         else:
             failures.append((action.name, str(result)))
             print(f"WARNING: failed action '{action.name}': {result}")
@@ -0,0 +1,76 @@
+"""Tests for make_vertical_spritesheet; they need Pillow."""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import make_vertical_spritesheet as mvs  # noqa: E402
+
+
+@pytest.fixture
+def image_paths(tmp_path):
+    """Seven PNGs of mixed sizes and modes."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(7):
+        h, w = rng.integers(3, 20, 2)
+        pixels = rng.integers(0, 256, (h, w, 4), dtype=np.uint8)
+        path = str(tmp_path / f"image_{i}.png")
+        Image.fromarray(pixels).convert(("RGBA", "RGB", "L")[i % 3]).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_collect_images_sorts_naturally(tmp_path):
+    for name in ("image_10.png", "image_2.png", "image_1.PNG", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    found = mvs.collect_images(str(tmp_path / "*"))
+    assert [p.rsplit("/", 1)[-1] for p in found] == ["image_1.PNG", "image_2.png", "image_10.png"]
+
+
+def test_vertical_sheet_stacks_images_top_to_bottom(image_paths, tmp_path):
+    out = str(tmp_path / "sheet.png")
+    mvs.build_vertical_spritesheet(image_paths, out)
+    images = [np.asarray(Image.open(p).convert("RGBA")) for p in image_paths]
+    with Image.open(out) as img:
+        sheet = np.asarray(img)
+    assert sheet.shape == (sum(i.shape[0] for i in images), max(i.shape[1] for i in images), 4)
+    y = 0
+    for pixels in images:
+        h, w = pixels.shape[:2]
+        np.testing.assert_array_equal(sheet[y:y + h, :w], pixels)
+        assert not sheet[y:y + h, w:].any()
+        y += h
+
+
+@pytest.mark.parametrize("layout, columns", [("vertical", 0), ("horizontal", 0), ("grid", 0), ("grid", 3)])
+@pytest.mark.parametrize("workers, strip_bytes", [(1, None), (3, None), (3, 64)])
+def test_stream_matches_in_memory_sheet(image_paths, tmp_path, monkeypatch, layout, columns, workers, strip_bytes):
+    if strip_bytes is not None:
+        monkeypatch.setattr(mvs, "STRIP_BYTES", strip_bytes)
+    expected, streamed = str(tmp_path / "expected.png"), str(tmp_path / "streamed.png")
+    mvs.build_spritesheet(image_paths, expected, layout, columns)
+    mvs.stream_spritesheet(image_paths, streamed, layout, columns, workers=workers, filter_name="paeth")
+    with Image.open(expected) as a, Image.open(streamed) as b:
+        np.testing.assert_array_equal(np.asarray(b), np.asarray(a))
+
+
+def test_in_memory_sheet_needs_only_pillow(image_paths, tmp_path):
+    out = tmp_path / "sheet.png"
+    script = (
+        "import sys; sys.modules['numpy'] = sys.modules['voxel_core'] = None; "
+        "import make_vertical_spritesheet as mvs; "
+        "sys.argv = ['make_vertical_spritesheet.py', sys.argv[1], '-o', sys.argv[2], '--layout', 'grid']; "
+        "raise SystemExit(mvs.main())"
+    )
+    subprocess.run([sys.executable, "-c", script, str(tmp_path / "image_*.png"), str(out)],
+                   cwd=os.path.dirname(os.path.abspath(mvs.__file__)), check=True, capture_output=True)
+    expected = tmp_path / "expected.png"
+    mvs.build_spritesheet(image_paths, str(expected), "grid")
+    with Image.open(expected) as a, Image.open(out) as b:
+        np.testing.assert_array_equal(np.asarray(b), np.asarray(a))
@@ -0,0 +1,536 @@
+"""Tests for voxel_core and voxel_format; they run outside Blender (pytest)."""
+
+from collections import deque
+
+import numpy as np
+import pytest
+
+import voxel_core
+import voxel_format
+
+
+def uv_sphere(radius=1.0, segments=12, rings=8, center=(0.0, 0.0, 0.0)):
+    """Closed UV sphere as (verts, tris)."""
+    verts = [(0.0, 0.0, radius)]
+    for r in range(1, rings):
+        theta = np.pi * r / rings
+        for s in range(segments):
+            phi = 2.0 * np.pi * s / segments
+            verts.append((radius * np.sin(theta) * np.cos(phi), radius * np.sin(theta) * np.sin(phi), radius * np.cos(theta)))
+    verts.append((0.0, 0.0, -radius))
+    bottom = len(verts) - 1
+
+    def ring(r, s):
+        return 1 + (r - 1) * segments + s % segments
+
+    tris = []
+    for s in range(segments):
+        tris.append((0, ring(1, s), ring(1, s + 1)))
+        tris.append((bottom, ring(rings - 1, s + 1), ring(rings - 1, s)))
+    for r in range(1, rings - 1):
+        for s in range(segments):
+            a, b = ring(r, s), ring(r, s + 1)
+            c, d = ring(r + 1, s), ring(r + 1, s + 1)
+            tris.append((a, c, d))
+            tris.append((a, d, b))
+    return np.asarray(verts) + np.asarray(center), np.asarray(tris)
+
+
+def sphere_tri_pts(**kwargs):
+    verts, tris = uv_sphere(**kwargs)
+    return voxel_core.triangle_points(verts, tris)
+
+
+def triangle_soup(grid, count=300, seed=0):
+    """Random triangles inside ``grid``: half large, half smaller than a cell."""
+    rng = np.random.default_rng(seed)
+    lo = np.asarray(grid.grid_min)
+    hi = lo + np.asarray(grid.dims) * grid.cell_len
+    centers = rng.uniform(lo, hi, (count, 1, 3))
+    size = np.where(np.arange(count) % 2 == 0, 3.0, 0.2)[:, None, None] * grid.cell_len
+    return centers + rng.uniform(-0.5, 0.5, (count, 3, 3)) * size
+
+
+def grid_for(tri_pts, resolution):
+    return voxel_core.compute_grid(tri_pts.reshape(-1, 3).min(axis=0), tri_pts.reshape(-1, 3).max(axis=0), resolution)
+
+
+def colorize(voxels, seed=0, distinct=40):
+    """Color voxels from ``distinct`` random colors, leaving every 7th without a material."""
+    rng = np.random.default_rng(seed)
+    palette = rng.random((distinct, 4), dtype=np.float32)
+    palette[:, 3] = 1.0
+    voxels.init_attributes()
+    voxels.colors[:] = palette[rng.integers(0, distinct, len(voxels.colors))]
+    voxels.material_index[:] = 0
+    voxels.material_index[::7] = -1
+    return voxels
+
+
+def reference_flood_fill(occupancy):
+    """The original per-cell BFS over 6-neighbours from the empty boundary cells."""
+    dx, dy, dz = occupancy.shape
+    blocked = occupancy.reshape(-1) != voxel_core.EMPTY
+    outside = np.zeros(occupancy.size, dtype=bool)
+    boundary = np.zeros(occupancy.shape, dtype=bool)
+    boundary[[0, -1]] = boundary[:, [0, -1]] = boundary[:, :, [0, -1]] = True
+    q = deque(np.flatnonzero(boundary.reshape(-1) & ~blocked).tolist())
+    outside[list(q)] = True
+    sx, sy = dy * dz, dz
+    while q:
+        idx = q.popleft()
+        ix, rem = divmod(idx, sx)
+        iy, iz = divmod(rem, sy)
+        for ok, nb in ((ix > 0, idx - sx), (ix < dx - 1, idx + sx), (iy > 0, idx - sy), (iy < dy - 1, idx + sy), (iz > 0, idx - 1), (iz < dz - 1, idx + 1)):
+            if ok and not blocked[nb] and not outside[nb]:
+                outside[nb] = True
+                q.append(nb)
+    return outside.reshape(occupancy.shape)
+
+
+def serpentine_maze(n):
+    """Solid block with one corridor that winds through every other layer."""
+    occ = np.full((n, n, n), voxel_core.SHELL, dtype=np.uint8)
+    zs = list(range(1, n - 1, 2))
+    ys = list(range(1, n - 1, 2))
+    for li, z in enumerate(zs):
+        for ri, y in enumerate(ys):
+            occ[1:n - 1, y, z] = voxel_core.EMPTY
+            if ri + 1 < len(ys):
+                occ[n - 2 if ri % 2 == 0 else 1, y + 1, z] = voxel_core.EMPTY
+        if li + 1 < len(zs):
+            occ[n - 2 if (len(ys) - 1) % 2 == 0 else 1, ys[-1], z + 1] = voxel_core.EMPTY
+    occ[0, 1, 1] = voxel_core.EMPTY
+    return occ
+
+
+def nested_shells(n):
+    r = np.sqrt(((np.indices((n, n, n)) - n / 2.0) ** 2).sum(axis=0))
+    occ = np.zeros((n, n, n), dtype=np.uint8)
+    for radius in (n * 0.15, n * 0.3, n * 0.45):
+        occ[np.abs(r - radius) < 1.0] = voxel_core.SHELL
+    return occ
+
+
+def assert_same_voxels(a, b):
+    np.testing.assert_array_equal(a.occupancy, b.occupancy)
+    np.testing.assert_array_equal(a.owner_tri, b.owner_tri)
+    np.testing.assert_allclose(a.owner_bary, b.owner_bary, atol=1e-6)
+
+
+@pytest.mark.parametrize("fill_volume", [False, True])
+def test_overlap_engines_agree_on_closed_mesh(fill_volume):
+    tri_pts = sphere_tri_pts()
+    grid = grid_for(tri_pts, 12)
+    scalar = voxel_core.voxelize(tri_pts, grid, fill_volume=fill_volume, overlap_engine='SCALAR')
+    batched = voxel_core.voxelize(tri_pts, grid, fill_volume=fill_volume, overlap_engine='NUMPY')
+    assert scalar.shell_count > 0
+    assert_same_voxels(scalar, batched)
+
+
+@pytest.mark.parametrize("batch", [1, 97])
+def test_sat_batch_size_does_not_change_voxels(monkeypatch, batch):
+    tri_pts = sphere_tri_pts()
+    grid = grid_for(tri_pts, 12)
+    expected = voxel_core.voxelize(tri_pts, grid, fill_volume=True)
+    monkeypatch.setattr(voxel_core, "SAT_PAIR_BATCH", batch)
+    assert_same_voxels(voxel_core.voxelize(tri_pts, grid, fill_volume=True), expected)
+
+
+def test_overlap_engines_agree_on_splatted_triangles():
+    grid = voxel_core.GridSpec(10, 9, 8, 0.25, (-1.0, -1.0, -1.0))
+    tri_pts = triangle_soup(grid)
+    splat = voxel_core._splat_small_triangles(tri_pts, grid)[0]
+    assert 0 < splat.sum() < len(tri_pts)
+    assert_same_voxels(
+        voxel_core.voxelize(tri_pts, grid, overlap_engine='SCALAR'),
+        voxel_core.voxelize(tri_pts, grid, overlap_engine='NUMPY'),
+    )
+
+
+def reference_voxel_mesh_data(cells, origin, cell_len, separate_cubes):
+    """The original per-cell mesh builder, returning lists."""
+    face_defs = (
+        ((1, 0, 0), ((1, -1, -1), (1, -1, 1), (1, 1, 1), (1, 1, -1))),
+        ((-1, 0, 0), ((-1, -1, -1), (-1, 1, -1), (-1, 1, 1), (-1, -1, 1))),
+        ((0, 1, 0), ((-1, 1, -1), (1, 1, -1), (1, 1, 1), (-1, 1, 1))),
+        ((0, -1, 0), ((-1, -1, -1), (-1, -1, 1), (1, -1, 1), (1, -1, -1))),
+        ((0, 0, 1), ((-1, -1, 1), (-1, 1, 1), (1, 1, 1), (1, -1, 1))),
+        ((0, 0, -1), ((-1, -1, -1), (1, -1, -1), (1, 1, -1), (-1, 1, -1))),
+    )
+    half = 0.5 * cell_len
+    verts, faces, face_cells, vert_map = [], [], [], {}
+    for cell in sorted(cells):
+        ix, iy, iz = cell
+        for (nx, ny, nz), corners in face_defs:
+            if not separate_cubes and (ix + nx, iy + ny, iz + nz) in cells:
+                continue
+            face = []
+            for sx, sy, sz in corners:
+                key = (2 * ix + sx, 2 * iy + sy, 2 * iz + sz)
+                vi = None if separate_cubes else vert_map.get(key)
+                if vi is None:
+                    vi = len(verts)
+                    verts.append(tuple(o + k * half for o, k in zip(origin, key)))
+                    if not separate_cubes:
+                        vert_map[key] = vi
+                face.append(vi)
+            faces.append(face)
+            face_cells.append(cell)
+    return verts, faces, face_cells
+
+
+@pytest.mark.parametrize("separate_cubes", [False, True])
+def test_voxel_mesh_data_matches_per_cell_builder(separate_cubes):
+    tri_pts = sphere_tri_pts()
+    grid = grid_for(tri_pts, 8)
+    voxels = voxel_core.voxelize(tri_pts, grid, fill_volume=True)
+    coords = voxels.cell_coords()
+    verts, faces, face_cells = voxel_core.build_voxel_mesh_data(voxels, separate_cubes)
+    ref_verts, ref_faces, ref_cells = reference_voxel_mesh_data(set(map(tuple, coords.tolist())), grid.origin, grid.cell_len, separate_cubes)
+    np.testing.assert_allclose(verts, ref_verts)
+    np.testing.assert_array_equal(faces, ref_faces)
+    assert list(map(tuple, coords[face_cells].tolist())) == ref_cells
+
+
+@pytest.mark.parametrize("name", ["maze", "shells", "random", "full", "empty", "flat"])
+@pytest.mark.parametrize("min_sweep_gain", [0.0, 0.01, 1.0])
+def test_flood_fill_matches_bfs(name, min_sweep_gain):
+    rng = np.random.default_rng(3)
+    occupancy = {
+        "maze": lambda: serpentine_maze(20),
+        "shells": lambda: nested_shells(24),
+        "random": lambda: (rng.random((17, 13, 11)) < 0.35).astype(np.uint8),
+        "full": lambda: np.ones((4, 5, 6), dtype=np.uint8),
+        "empty": lambda: np.zeros((4, 5, 6), dtype=np.uint8),
+        "flat": lambda: (rng.random((1, 9, 12)) < 0.3).astype(np.uint8),
+    }[name]()
+    outside = voxel_core.flood_fill_outside(occupancy, min_sweep_gain=min_sweep_gain)
+    np.testing.assert_array_equal(outside, reference_flood_fill(occupancy))
+
+
+def test_propagate_shell_attributes_copies_the_nearest_shell_voxel():
+    tri_pts = sphere_tri_pts(segments=16, rings=12)
+    grid = grid_for(tri_pts, 20)
+    voxels = colorize(voxel_core.voxelize(tri_pts, grid, fill_volume=True))
+    coords = voxels.cell_coords()
+    is_shell = voxels.occupancy.reshape(-1)[voxels.cell_indices()] == voxel_core.SHELL
+    shell, interior = np.flatnonzero(is_shell), np.flatnonzero(~is_shell)
+    assert len(interior)
+
+    nearest = voxel_core.nearest_shell_indices(voxels)
+    np.testing.assert_array_equal(nearest[shell], shell)
+    assert is_shell[nearest[interior]].all()
+    delta = coords[interior][:, None, :] - coords[shell][None, :, :]
+    exact = np.sqrt(np.einsum("ijk,ijk->ij", delta, delta).min(axis=1))
+    found = np.linalg.norm(coords[interior] - coords[nearest[interior]], axis=1)
+    np.testing.assert_allclose(found, exact, atol=1e-9)
+
+    before = voxels.colors.copy()
+    voxel_core.propagate_shell_attributes(voxels)
+    np.testing.assert_array_equal(voxels.colors, before[nearest])
+
+
+@pytest.mark.parametrize("shell_fraction", [0.0, 0.003, 0.1])
+def test_nearest_shell_indices_is_exact(shell_fraction):
+    rng = np.random.default_rng(7)
+    occupancy = np.where(rng.random((13, 17, 11)) < 0.6, voxel_core.INTERIOR, voxel_core.EMPTY).astype(np.uint8)
+    occupancy[rng.random(occupancy.shape) < shell_fraction] = voxel_core.SHELL
+    voxels = voxel_core.VoxelGrid(voxel_core.GridSpec(13, 17, 11, 1.0, (0.0, 0.0, 0.0)), occupancy)
+    nearest = voxel_core.nearest_shell_indices(voxels)
+    coords = voxels.cell_coords()
+    shell = np.flatnonzero(occupancy.reshape(-1)[voxels.cell_indices()] == voxel_core.SHELL)
+    if not len(shell):
+        assert (nearest == -1).all()
+        return
+    np.testing.assert_array_equal(nearest[shell], shell)
+    delta = coords[:, None, :] - coords[shell][None, :, :]
+    exact = np.sqrt(np.einsum("ijk,ijk->ij", delta, delta).min(axis=1))
+    np.testing.assert_allclose(np.linalg.norm(coords - coords[nearest], axis=1), exact, atol=1e-9)
+
+
+def test_sample_image_bilinear_batch_matches_scalar():
+    rng = np.random.default_rng(1)
+    h, w = 7, 11
+    pixels = rng.random((h, w, 4), dtype=np.float32)
+    uvs = rng.uniform(-1.5, 2.5, (200, 2))
+    uvs[:4] = [(0.0, 0.0), (1.0, 1.0), (0.999999, 0.5), (-0.25, 1.0)]
+    batch = voxel_core.sample_image_bilinear_batch(pixels, uvs)
+    flat = pixels.reshape(-1)
+    scalar = np.array([voxel_core.sample_image_bilinear(w, h, flat, uv) for uv in uvs.tolist()])
+    np.testing.assert_allclose(batch, scalar, rtol=1e-6, atol=1e-7)
+
+
+def test_interpolate_triangle_uvs():
+    rng = np.random.default_rng(4)
+    tri_uvs = rng.random((5, 3, 2))
+    tri = np.array([4, 0, 2, 2])
+    bary = rng.random((4, 3))
+    bary /= bary.sum(axis=1, keepdims=True)
+    expected = [sum(b * uv for b, uv in zip(bary[i], tri_uvs[t])) for i, t in enumerate(tri)]
+    np.testing.assert_allclose(voxel_core.interpolate_triangle_uvs(tri_uvs, tri, bary), expected)
+
+
+@pytest.mark.parametrize("max_bytes", [0, 1 << 20])
+def test_frame_geometry_store_round_trip(tmp_path, max_bytes):
+    rng = np.random.default_rng(5)
+    tri_verts = np.arange(30).reshape(10, 3)
+    frames = {f: dict(verts=rng.random((12, 3)), tri_verts=tri_verts) for f in range(5)}
+    with voxel_core.FrameGeometryStore(max_bytes, spill_dir=str(tmp_path)) as store:
+        for f, arrays in frames.items():
+            store.put(f, **arrays)
+        assert store.keys() == list(frames)
+        for f, arrays in frames.items():
+            got = store.get(f)
+            for name, arr in arrays.items():
+                np.testing.assert_array_equal(got[name], arr)
+        assert store.shared_arrays == len(frames) - 1
+        assert (store.spilled_bytes > 0) == (max_bytes == 0)
+        assert (store.memory_bytes > 0) == (max_bytes > 0)
+    assert not list(tmp_path.iterdir())
+
+
+def test_frame_geometry_store_shares_spilled_arrays(tmp_path):
+    tri_verts = np.arange(30).reshape(10, 3)
+    with voxel_core.FrameGeometryStore(0, spill_dir=str(tmp_path)) as store:
+        for f in range(3):
+            store.put(f, verts=np.full((12, 3), float(f)), tri_verts=tri_verts.copy())
+        assert all(isinstance(value, str) for entry in store.frames.values() for value in entry.values())
+        assert len({store.frames[f]["tri_verts"] for f in range(3)}) == 1
+        assert store.shared_arrays == 2
+        assert store.spilled_bytes == 3 * 12 * 3 * 8 + tri_verts.nbytes
+        np.testing.assert_array_equal(store.get(2)["tri_verts"], tri_verts)
+
+
+@pytest.mark.parametrize("fill_volume", [False, True])
+def test_incremental_voxelizer_matches_voxelize(fill_volume):
+    base = sphere_tri_pts(radius=1.0, segments=10, rings=6)
+    grid = voxel_core.GridSpec(16, 16, 16, 0.15, (-1.2, -1.2, -1.2))
+    moved = base.copy()
+    moved[:5] += 0.07
+    shifted = base + (0.1, -0.05, 0.0)
+    fewer = base[:-4]
+    frames = [base, base, moved, moved, shifted, fewer, base[:0], base[:0], base]
+
+    incremental = voxel_core.IncrementalVoxelizer(grid, fill_volume=fill_volume)
+    for i, tri_pts in enumerate(frames):
+        voxels = incremental.update(tri_pts)
+        assert_same_voxels(voxels, voxel_core.voxelize(tri_pts, grid, fill_volume=fill_volume))
+        if i == 1:
+            assert incremental.moved_count == 0
+        if i == 2:
+            assert incremental.moved_count == 5
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_voxelize_frame_chunk_matches_voxelize(incremental):
+    verts, tris = uv_sphere(segments=8, rings=6)
+    grid = voxel_core.GridSpec(14, 14, 14, 0.17, (-1.2, -1.2, -1.2))
+    color = (0.2, 0.4, 0.6, 1.0)
+    frames = [dict(verts=verts + (dx, 0.0, 0.0), tri_verts=tris, tri_mat=np.zeros(len(tris), dtype=np.int64)) for dx in (0.0, 0.0, 0.05, 0.1)]
+    job = dict(grid=grid, frames=frames, fill_volume=True, surface_only=True, overlap_engine='NUMPY',
+               incremental=incremental, material_sources=[("solid", color)], image_paths={})
+    results = voxel_core.voxelize_frame_chunk(job)
+    assert len(results) == len(frames)
+    assert (results[1] is results[0]) == incremental
+    for geometry, voxels in zip(frames, results):
+        tri_pts = voxel_core.triangle_points(geometry["verts"], geometry["tri_verts"])
+        assert_same_voxels(voxels, voxel_core.voxelize(tri_pts, grid, fill_volume=True))
+        assert (voxels.material_index == 0).all()
+        np.testing.assert_allclose(voxels.colors, np.broadcast_to(color, voxels.colors.shape))
+
+
+def test_geometry_fingerprint_matches_identical_frames_only():
+    verts, tris = uv_sphere(segments=8, rings=6)
+    fingerprint = voxel_core.geometry_fingerprint(dict(verts=verts, tri_verts=tris))
+    assert voxel_core.geometry_fingerprint(dict(tri_verts=tris.copy(), verts=verts.copy())) == fingerprint
+    nudged = verts.copy()
+    nudged[3, 1] += 1e-9
+    for changed in (dict(verts=nudged, tri_verts=tris),
+                    dict(verts=verts.astype(np.float32), tri_verts=tris),
+                    dict(verts=verts.reshape(3, -1), tri_verts=tris),
+                    dict(verts=verts, tri_verts=tris, tri_mat=np.zeros(len(tris)))):
+        assert voxel_core.geometry_fingerprint(changed) != fingerprint
+
+
+def test_skin_vertices_matches_hand_computed_blend():
+    rest = np.array([(1.0, 0.0, 0.0), (0.0, 2.0, 0.0), (0.0, 0.0, 3.0), (1.0, 1.0, 1.0)])
+    translate = np.eye(4)
+    translate[:3, 3] = (0.5, -1.0, 2.0)
+    rotate = np.eye(4)
+    rotate[:3, :3] = ((0.0, -1.0, 0.0), (1.0, 0.0, 0.0), (0.0, 0.0, 1.0))
+    bone_index = np.array([(0, -1), (1, -1), (0, 1), (-1, -1)], dtype=np.int32)
+    weights = np.array([(1.0, 0.0), (0.5, 0.0), (0.25, 0.75), (0.0, 0.0)])
+    expected = [
+        (1.5, -1.0, 2.0),  # fully on the translated bone
+        (-2.0, 0.0, 0.0),  # a lone partial weight is normalized to 1
+        (0.125, -0.25, 3.5),  # 1/4 translated + 3/4 rotated about its own axis
+        (1.0, 1.0, 1.0),  # unweighted vertices keep their rest position
+    ]
+    skinned = voxel_core.skin_vertices(rest, bone_index, weights, np.stack([translate, rotate]))
+    np.testing.assert_allclose(skinned, expected, atol=1e-12)
+
+
+def test_skin_vertices_without_bones_keeps_rest_positions():
+    rest = np.arange(12, dtype=np.float64).reshape(4, 3)
+    bone_index = np.zeros((4, 1), dtype=np.int32)
+    weights = np.ones((4, 1))
+    np.testing.assert_array_equal(voxel_core.skin_vertices(rest, bone_index, weights, np.zeros((0, 4, 4))), rest)
+
+
+def test_vertex_displacement():
+    a = np.zeros((3, 3))
+    b = a.copy()
+    b[1] = (3.0, 4.0, 0.0)
+    assert voxel_core.vertex_displacement(a, b) == 5.0
+    assert voxel_core.vertex_displacement(None, b) == np.inf
+    assert voxel_core.vertex_displacement(a[:2], b) == np.inf
+    assert voxel_core.vertex_displacement(a[:0], b[:0]) == 0.0
+
+
+def test_select_frames_by_motion():
+    motion = [0.0, 1.0, 1.0, 1.0, 0.0, 0.0, 2.0, 1.0]
+    assert voxel_core.select_frames_by_motion([]) == []
+    assert voxel_core.select_frames_by_motion(motion) == list(range(len(motion)))
+    assert voxel_core.select_frames_by_motion(motion, threshold=2.0) == [0, 2, 6]
+    assert voxel_core.select_frames_by_motion([0.0, 0.1, np.inf, 0.1, 0.1], threshold=1.0) == [0, 2]
+    assert voxel_core.select_frames_by_motion([0.0] + [1.0] * 9, budget=4) == [0, 3, 6, 9]
+
+
+@pytest.mark.parametrize("filter_name", voxel_core.PNG_FILTERS)
+def test_write_png_round_trip(tmp_path, filter_name):
+    Image = pytest.importorskip("PIL.Image")
+    rng = np.random.default_rng(2)
+    rows = rng.integers(0, 256, (9, 13, 4), dtype=np.uint8)
+    rows[3:5] = rows[2]
+    path = str(tmp_path / "rows.png")
+    voxel_core.write_png(path, rows, filter_name=filter_name)
+    with Image.open(path) as img:
+        np.testing.assert_array_equal(np.asarray(img), rows)
+
+
+def sheet_frames():
+    tri_pts = sphere_tri_pts(segments=8, rings=6)
+    grid = voxel_core.GridSpec(12, 10, 6, 0.2, (-1.2, -1.0, -0.6))
+    frames = [colorize(voxel_core.voxelize(tri_pts + (0.1 * i, 0.0, 0.0), grid), seed=i) for i in range(3)]
+    return grid, frames + [frames[0]]
+
+
+def reference_sheet(frames, layout, tile):
+    return layout.compose([layout.arrange(voxel_core.float_to_byte(voxel_core.render_frame_band(v, tile))) for v in frames])
+
+
+def test_render_frame_band_clips_to_each_tile():
+    grid = voxel_core.GridSpec(6, 5, 3, 1.0, (0.0, 0.0, 0.0))
+    voxels = colorize(voxel_core.VoxelGrid(grid, np.ones(grid.dims, dtype=np.uint8)), distinct=4)
+    tile = 4
+    band = voxel_core.render_frame_band(voxels, tile)
+    coords = voxels.cell_coords()
+    for z in range(grid.dz):
+        expected = np.zeros((tile, tile, 4), dtype=np.float32)
+        for i in np.flatnonzero((coords[:, 2] == z) & (voxels.material_index >= 0)):
+            x, y = coords[i, 0] - 1, coords[i, 1] - 1
+            if 0 <= x < tile and 0 <= y < tile:
+                expected[y, x] = voxels.colors[i]
+        np.testing.assert_array_equal(band[:, z * tile:(z + 1) * tile], expected)
+
+
+def test_render_spritesheet_pixels_is_a_bottom_up_band():
+    grid, frames = sheet_frames()
+    width, height, px = voxel_core.render_spritesheet_pixels(frames[1], 14)
+    band = voxel_core.render_frame_band(frames[1], 14)
+    assert (height, width) == band.shape[:2]
+    np.testing.assert_array_equal(np.asarray(px).reshape(height, width, 4)[::-1], band)
+
+
+@pytest.mark.parametrize("slice_columns, frame_columns, pow2", [(0, 1, False), (4, 2, False), (3, 3, True)])
+def test_animation_sheet_round_trip(tmp_path, slice_columns, frame_columns, pow2):
+    Image = pytest.importorskip("PIL.Image")
+    grid, frames = sheet_frames()
+    tile = 14
+    layout = voxel_core.SheetLayout(tile, grid.dz, len(frames) + 1, slice_columns, frame_columns, pow2)
+    path = str(tmp_path / "sheet.png")
+    with voxel_core.AnimationSheetWriter(path, tile, grid.dz, len(frames) + 1, filter_name="paeth", layout=layout) as sheet:
+        for voxels in frames:
+            sheet.add_frame(voxels)
+        sheet.repeat_frame(1)
+    assert sheet.reused == 2
+    with Image.open(path) as img:
+        assert img.size == (layout.width, layout.height)
+        np.testing.assert_array_equal(np.asarray(img), reference_sheet(frames + [frames[1]], layout, tile))
+
+
+def test_indexed_sheet_with_exact_palette_matches_rgba(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    grid, frames = sheet_frames()
+    tile = 12
+    layout = voxel_core.SheetLayout(tile, grid.dz, len(frames), slice_columns=3)
+    path = str(tmp_path / "indexed.png")
+    with voxel_core.IndexedSheetWriter(path, tile, grid.dz, len(frames), layout=layout) as sheet:
+        for voxels in frames:
+            sheet.add_frame(voxels)
+    sheet.encode(voxel_core.build_palette(sheet.color_counts, 256, exact=True))
+    with Image.open(path) as img:
+        assert img.mode == "P"
+        np.testing.assert_array_equal(np.asarray(img.convert("RGBA")), reference_sheet(frames, layout, tile))
+
+
+def test_build_palette_median_cut_maps_to_nearest_entry():
+    rng = np.random.default_rng(6)
+    rgba = rng.integers(0, 256, (500, 4), dtype=np.uint8)
+    rgba[:, 3] = 255
+    counts = voxel_core.ColorCounts()
+    counts.add(rgba[:250])
+    counts.add(rgba[250:], weight=3)
+    palette = voxel_core.build_palette(counts, 16)
+    assert palette.shape == (16, 4)
+    assert not palette[0].any()
+    indices = voxel_core.palette_indices(rgba, palette)
+    assert indices.min() >= 1
+    delta = rgba[:, None, :].astype(np.int64) - palette[None, 1:, :]
+    dist = np.einsum("ijk,ijk->ij", delta, delta)
+    np.testing.assert_array_equal(dist[np.arange(len(rgba)), indices - 1], dist.min(axis=1))
+
+    few = voxel_core.ColorCounts()
+    few.add(rgba[:10])
+    exact = voxel_core.build_palette(few, 16, exact=True)
+    assert set(map(tuple, exact[1:].tolist())) == set(map(tuple, rgba[:10].tolist()))
+
+
+def test_voxel_data_round_trip(tmp_path):
+    grid, frames = sheet_frames()
+    path = str(tmp_path / "frames.vxa")
+    with voxel_format.VoxelDataWriter(path, grid) as writer:
+        for voxels in frames:
+            writer.add_frame(voxels)
+        writer.repeat_frame(2)
+    assert writer.reused == 2
+
+    reader = voxel_format.VoxelDataReader(path)
+    try:
+        assert len(reader) == len(frames) + 1
+        assert reader.grid.dims == grid.dims
+        for i, voxels in enumerate(frames + [frames[2]]):
+            expected = np.zeros(grid.dims + (4,), dtype=np.uint8)
+            colored = np.flatnonzero(voxels.material_index >= 0)
+            expected.reshape(-1, 4)[voxels.cell_indices()[colored]] = voxel_core.float_to_byte(voxels.colors[colored])
+            np.testing.assert_array_equal(reader.frame_colors(i), expected)
+    finally:
+        reader.close()
+
+
+def test_voxel_data_writer_removes_file_on_error(tmp_path):
+    grid, frames = sheet_frames()
+    path = tmp_path / "broken.vxa"
+    with pytest.raises(RuntimeError):
+        with voxel_format.VoxelDataWriter(str(path), grid) as writer:
+            writer.add_frame(frames[0])
+            raise RuntimeError("boom")
+    assert not path.exists()
+
+
+def test_rle_round_trip():
+    values = np.array([0, 0, 0, 5, 5, 1, 0, 0, 7], dtype=np.uint32)
+    runs, run_values = voxel_format.rle_encode(values)
+    np.testing.assert_array_equal(runs, [3, 2, 1, 2, 1])
+    np.testing.assert_array_equal(voxel_format.rle_decode(runs, run_values), values)
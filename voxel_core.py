@@ -0,0 +1,1816 @@
+"""Blender-independent voxelization core.
+
+Everything here works on plain NumPy arrays (vertex positions, triangle
+indices, image pixels) so it can be profiled, tested and run in worker
+processes without ``bpy``. ``voxelator.py`` extracts arrays from Blender
+meshes (e.g. via ``foreach_get``) and hands them to these functions.
+"""
+
+import hashlib
+import math
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from collections import deque
+
+import numpy as np
+
+# One SAT batch keeps about SAT_PAIR_BYTES of temporaries per candidate
+# (triangle, cell) pair alive, mostly inside tri_box_overlap_batch; batches
+# are sized to stay within SAT_BATCH_BYTES.
+SAT_BATCH_BYTES = 64 << 20
+SAT_PAIR_BYTES = 512
+SAT_PAIR_BATCH = SAT_BATCH_BYTES // SAT_PAIR_BYTES
+SPLAT_MARGIN = 1e-6
+
+EMPTY = 0
+SHELL = 1
+INTERIOR = 2
+
+
+def noop_log(msg):
+    """Default ``log`` callback: discard the message."""
+
+
+class GridSpec:
+    """Voxel grid placement: cell counts per axis, cell size and min corner."""
+
+    __slots__ = ("dx", "dy", "dz", "cell_len", "grid_min")
+
+    def __init__(self, dx, dy, dz, cell_len, grid_min):
+        self.dx = int(dx)
+        self.dy = int(dy)
+        self.dz = int(dz)
+        self.cell_len = float(cell_len)
+        self.grid_min = tuple(float(c) for c in grid_min)
+
+    @property
+    def dims(self):
+        return (self.dx, self.dy, self.dz)
+
+    @property
+    def origin(self):
+        half = 0.5 * self.cell_len
+        return tuple(c + half for c in self.grid_min)
+
+    @property
+    def center(self):
+        return tuple(c + n * self.cell_len * 0.5 for c, n in zip(self.grid_min, self.dims))
+
+
+def compute_grid(min_co, max_co, resolution):
+    min_x, min_y, min_z = (float(c) for c in min_co)
+    max_x, max_y, max_z = (float(c) for c in max_co)
+    span_x = max_x - min_x
+    span_y = max_y - min_y
+    span_z = max_z - min_z
+    max_span = max(span_x, span_y, span_z)
+
+    cube_size = max_span / (resolution * 2) if resolution else 0.5
+    cell_len = cube_size * 2
+
+    eps = cell_len * 1e-6
+    tol = max_span * 1e-6 if max_span > 0.0 else 0.0
+
+    dims = []
+    for span in (span_x, span_y, span_z):
+        if abs(span - max_span) <= tol:
+            dims.append(max(1, int(resolution)))
+        else:
+            dims.append(max(1, int(math.ceil((span + eps) / cell_len))))
+    dx, dy, dz = dims
+
+    center_x = (min_x + max_x) * 0.5
+    center_y = (min_y + max_y) * 0.5
+    center_z = (min_z + max_z) * 0.5
+    grid_min = (
+        center_x - (dx * cell_len) * 0.5,
+        center_y - (dy * cell_len) * 0.5,
+        center_z - (dz * cell_len) * 0.5,
+    )
+    return GridSpec(dx, dy, dz, cell_len, grid_min)
+
+
+class VoxelGrid:
+    """Dense per-cell occupancy for one frame plus packed per-voxel attributes.
+
+    ``occupancy`` is a (dx, dy, dz) uint8 array holding ``EMPTY``, ``SHELL``
+    or ``INTERIOR``. ``colors`` (N, 4 float32) and ``material_index`` (N int16,
+    -1 when the voxel has no material) are parallel to ``cell_indices()``,
+    i.e. occupied cells in C order, which is also sorted ``(ix, iy, iz)`` order.
+
+    ``owner_tri`` (N int32, -1 when unknown) and ``owner_bary`` (N, 3 float32)
+    record, per voxel, the source triangle that produced it and the barycentric
+    coordinates of that triangle's closest point to the voxel centre.
+    """
+
+    __slots__ = ("spec", "occupancy", "colors", "material_index", "owner_tri", "owner_bary")
+
+    def __init__(self, spec, occupancy=None):
+        self.spec = spec
+        self.occupancy = np.zeros(spec.dims, dtype=np.uint8) if occupancy is None else occupancy
+        self.colors = None
+        self.material_index = None
+        self.owner_tri = None
+        self.owner_bary = None
+
+    @property
+    def count(self):
+        return int(np.count_nonzero(self.occupancy))
+
+    @property
+    def shell_count(self):
+        return int(np.count_nonzero(self.occupancy == SHELL))
+
+    @property
+    def colored_count(self):
+        if self.material_index is None:
+            return 0
+        return int(np.count_nonzero(self.material_index >= 0))
+
+    def cell_indices(self):
+        return np.flatnonzero(self.occupancy)
+
+    def cell_coords(self):
+        return np.stack(np.unravel_index(self.cell_indices(), self.spec.dims), axis=1)
+
+    def cell_centers(self):
+        return cell_centers(self.cell_coords(), self.spec)
+
+    def init_attributes(self):
+        n = self.count
+        self.colors = np.zeros((n, 4), dtype=np.float32)
+        self.material_index = np.full(n, -1, dtype=np.int16)
+
+    def set_owners(self, flat, tri, bary):
+        """Attach owners given as flat cell indices; cells not listed get -1."""
+        cells = self.cell_indices()
+        n = len(cells)
+        self.owner_tri = np.full(n, -1, dtype=np.int32)
+        self.owner_bary = np.zeros((n, 3), dtype=np.float32)
+        pos = np.searchsorted(cells, flat)
+        self.owner_tri[pos] = tri
+        self.owner_bary[pos] = bary
+
+    def matching_owners(self, other):
+        """Indices ``(mine, theirs)`` of voxels in the same cell with the same owner triangle and barycentrics."""
+        _, mine, theirs = np.intersect1d(self.cell_indices(), other.cell_indices(), assume_unique=True, return_indices=True)
+        same = self.owner_tri[mine] >= 0
+        same &= self.owner_tri[mine] == other.owner_tri[theirs]
+        same &= (self.owner_bary[mine] == other.owner_bary[theirs]).all(axis=1)
+        return mine[same], theirs[same]
+
+    def fingerprint(self):
+        """Digest of occupancy, colors and materials; equal grids render identical slices."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(repr(self.occupancy.shape).encode())
+        for arr in (self.occupancy, self.colors, self.material_index):
+            if arr is not None:
+                h.update(np.ascontiguousarray(arr).tobytes())
+        return h.hexdigest()
+
+    def owner_pairs(self):
+        if self.owner_tri is None:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty.astype(np.int32), np.zeros((0, 3), dtype=np.float32)
+        owned = self.owner_tri >= 0
+        return self.cell_indices()[owned], self.owner_tri[owned], self.owner_bary[owned]
+
+
+class FrameGeometryStore:
+    """Per-frame geometry arrays captured once and read back later.
+
+    ``put(key, **arrays)`` keeps the arrays of one frame; an array equal to the
+    same-named array of the previous frame (e.g. unchanged triangle indices or
+    UVs, compared by digest) is stored once and shared. Arrays are kept in memory until
+    ``max_bytes`` is reached, after which new frames are spilled to ``.npy``
+    files in a temporary directory and memory-mapped on ``get``. Call
+    ``close()`` (or use as a context manager) to delete spilled files.
+    """
+
+    def __init__(self, max_bytes, spill_dir=None):
+        self.max_bytes = int(max_bytes)
+        self.spill_dir = spill_dir
+        self.frames = {}
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+        self.shared_arrays = 0
+        self._last = {}
+        self._tmpdir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __contains__(self, key):
+        return key in self.frames
+
+    def keys(self):
+        return list(self.frames)
+
+    def put(self, key, **arrays):
+        entry = {}
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            # Compare by digest so a spilled array is not kept alive just to
+            # check the next frame against it; share whatever was stored.
+            signature = (arr.shape, arr.dtype.str, hashlib.blake2b(arr.tobytes(), digest_size=16).digest())
+            last = self._last.get(name)
+            if last is not None and last[0] == signature:
+                entry[name] = last[1]
+                self.shared_arrays += 1
+                continue
+
+            if self.memory_bytes + arr.nbytes > self.max_bytes:
+                if self._tmpdir is None:
+                    self._tmpdir = tempfile.mkdtemp(prefix="voxelator_frames_", dir=self.spill_dir)
+                path = os.path.join(self._tmpdir, f"{len(self.frames)}_{name}.npy")
+                np.save(path, arr)
+                entry[name] = path
+                self.spilled_bytes += arr.nbytes
+            else:
+                entry[name] = arr
+                self.memory_bytes += arr.nbytes
+            self._last[name] = (signature, entry[name])
+        self.frames[key] = entry
+
+    def get(self, key):
+        out = {}
+        for name, value in self.frames[key].items():
+            out[name] = np.load(value, mmap_mode="r") if isinstance(value, str) else value
+        return out
+
+    def stats(self):
+        return f"frames={len(self.frames)} memory_bytes={self.memory_bytes} spilled_bytes={self.spilled_bytes} shared_arrays={self.shared_arrays}"
+
+    def close(self):
+        self.frames = {}
+        self._last = {}
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+
+def geometry_fingerprint(geometry):
+    """Digest of a frame's geometry arrays (name, dtype, shape and contents)."""
+    h = hashlib.blake2b(digest_size=16)
+    for name in sorted(geometry):
+        arr = np.ascontiguousarray(geometry[name])
+        h.update(f"{name}:{arr.dtype.str}:{arr.shape}".encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def vertex_displacement(prev_verts, verts):
+    """Largest per-vertex distance between two frames (inf if topology differs)."""
+    if prev_verts is None or len(prev_verts) != len(verts):
+        return math.inf
+    if not len(verts):
+        return 0.0
+    delta = np.asarray(verts, dtype=np.float64) - np.asarray(prev_verts, dtype=np.float64)
+    return float(np.sqrt(np.einsum("ij,ij->i", delta, delta).max()))
+
+
+def select_frames_by_motion(step_motion, budget=0, threshold=0.0):
+    """Indices of the frames worth keeping from a sequence of candidates.
+
+    ``step_motion[i]`` is how far the mesh moved between candidates ``i-1``
+    and ``i`` (the first entry is ignored). Motion accumulates along the
+    sequence; with ``threshold`` a candidate is kept once it has moved at
+    least that far since the last kept one. With ``budget`` the kept frames
+    are then thinned to at most that many, spread evenly over the
+    accumulated motion. The first candidate is always kept.
+    """
+    step_motion = np.asarray(step_motion, dtype=np.float64)
+    n = len(step_motion)
+    if n == 0:
+        return []
+    # Topology changes count as a large jump that is always kept but does
+    # not swamp the motion spacing of the frames around it.
+    jumps = ~np.isfinite(step_motion)
+    jumps[0] = False
+    finite = np.where(jumps, 0.0, step_motion)
+    finite[0] = 0.0
+    cumulative = np.cumsum(finite)
+
+    kept = [0]
+    for i in range(1, n):
+        if jumps[i] or cumulative[i] - cumulative[kept[-1]] >= threshold:
+            kept.append(i)
+
+    budget = int(budget)
+    if budget > 0 and len(kept) > budget:
+        forced = [i for i in kept if i == 0 or jumps[i]][:budget]
+        kept_arr = np.asarray(kept)
+        targets = np.linspace(0.0, cumulative[kept_arr[-1]], budget)
+        picks = np.searchsorted(cumulative[kept_arr], targets).clip(0, len(kept_arr) - 1)
+        extra = [int(i) for i in kept_arr[np.unique(picks)] if int(i) not in forced]
+        kept = sorted(forced + extra[:budget - len(forced)])
+    return kept
+
+
+def cell_centers(coords, grid):
+    return np.asarray(grid.grid_min, dtype=np.float64) + (coords + 0.5) * grid.cell_len
+
+
+def transform_points(co, matrix):
+    co = np.asarray(co, dtype=np.float64).reshape(-1, 3)
+    m = np.asarray(matrix, dtype=np.float64).reshape(4, 4)
+    return co @ m[:3, :3].T + m[:3, 3]
+
+
+def skin_vertices(rest_co, bone_index, weights, bone_matrices):
+    """Linear blend skinning the way Blender's armature modifier does it.
+
+    ``rest_co`` (V, 3) are rest positions, ``bone_index``/``weights`` (V, K)
+    the deforming bone (-1 for none) and weight of each vertex group entry,
+    and ``bone_matrices`` (B, 4, 4) the bone deform matrices in the mesh's
+    space. Offsets are normalized by the total weight; vertices with no
+    deforming weight (or no bones at all) keep their rest position.
+    """
+    co = np.asarray(rest_co, dtype=np.float64).reshape(-1, 3)
+    mats = np.asarray(bone_matrices, dtype=np.float64).reshape(-1, 4, 4)
+    if not len(mats):
+        return co.copy()
+    offset = np.zeros_like(co)
+    contrib = np.zeros(len(co))
+    for k in range(bone_index.shape[1]):
+        bone = bone_index[:, k]
+        valid = bone >= 0
+        w = np.where(valid, weights[:, k], 0.0)
+        m = mats[np.where(valid, bone, 0)]
+        moved = np.einsum("vij,vj->vi", m[:, :3, :3], co) + m[:, :3, 3]
+        offset += w[:, None] * (moved - co)
+        contrib += w
+    skinned = contrib > 1e-4
+    co = co.copy()
+    co[skinned] += offset[skinned] / contrib[skinned, None]
+    return co
+
+
+def triangle_points(verts, tris):
+    verts = np.asarray(verts, dtype=np.float64).reshape(-1, 3)
+    tris = np.asarray(tris, dtype=np.int64).reshape(-1, 3)
+    return verts[tris]
+
+
+def _plane_box_overlap(normal, vert, maxbox):
+    nx, ny, nz = normal
+    vx, vy, vz = vert
+    mx, my, mz = maxbox
+
+    if nx > 0.0:
+        vmin_x = -mx - vx
+        vmax_x = mx - vx
+    else:
+        vmin_x = mx - vx
+        vmax_x = -mx - vx
+
+    if ny > 0.0:
+        vmin_y = -my - vy
+        vmax_y = my - vy
+    else:
+        vmin_y = my - vy
+        vmax_y = -my - vy
+
+    if nz > 0.0:
+        vmin_z = -mz - vz
+        vmax_z = mz - vz
+    else:
+        vmin_z = mz - vz
+        vmax_z = -mz - vz
+
+    if (nx * vmin_x + ny * vmin_y + nz * vmin_z) > 0.0:
+        return False
+    if (nx * vmax_x + ny * vmax_y + nz * vmax_z) >= 0.0:
+        return True
+    return False
+
+
+def tri_box_overlap(center, half_size, tri):
+    cx, cy, cz = center
+    hx, hy, hz = half_size
+    (ax, ay, az), (bx, by, bz), (cx2, cy2, cz2) = tri
+
+    v0x = ax - cx
+    v0y = ay - cy
+    v0z = az - cz
+    v1x = bx - cx
+    v1y = by - cy
+    v1z = bz - cz
+    v2x = cx2 - cx
+    v2y = cy2 - cy
+    v2z = cz2 - cz
+
+    e0x = v1x - v0x
+    e0y = v1y - v0y
+    e0z = v1z - v0z
+    e1x = v2x - v1x
+    e1y = v2y - v1y
+    e1z = v2z - v1z
+    e2x = v0x - v2x
+    e2y = v0y - v2y
+    e2z = v0z - v2z
+
+    def axis_test(axv, ayv, azv):
+        p0 = axv * v0x + ayv * v0y + azv * v0z
+        p1 = axv * v1x + ayv * v1y + azv * v1z
+        p2 = axv * v2x + ayv * v2y + azv * v2z
+        min_p = min(p0, p1, p2)
+        max_p = max(p0, p1, p2)
+        rad = hx * abs(axv) + hy * abs(ayv) + hz * abs(azv)
+        return not (min_p > rad or max_p < -rad)
+
+    axes = (
+        (0.0, -e0z, e0y), (e0z, 0.0, -e0x), (-e0y, e0x, 0.0),
+        (0.0, -e1z, e1y), (e1z, 0.0, -e1x), (-e1y, e1x, 0.0),
+        (0.0, -e2z, e2y), (e2z, 0.0, -e2x), (-e2y, e2x, 0.0),
+    )
+    for axv, ayv, azv in axes:
+        if not axis_test(axv, ayv, azv):
+            return False
+
+    min_x = min(v0x, v1x, v2x)
+    max_x = max(v0x, v1x, v2x)
+    if min_x > hx or max_x < -hx:
+        return False
+
+    min_y = min(v0y, v1y, v2y)
+    max_y = max(v0y, v1y, v2y)
+    if min_y > hy or max_y < -hy:
+        return False
+
+    min_z = min(v0z, v1z, v2z)
+    max_z = max(v0z, v1z, v2z)
+    if min_z > hz or max_z < -hz:
+        return False
+
+    nx = e0y * e1z - e0z * e1y
+    ny = e0z * e1x - e0x * e1z
+    nz = e0x * e1y - e0y * e1x
+    if not _plane_box_overlap((nx, ny, nz), (v0x, v0y, v0z), (hx, hy, hz)):
+        return False
+
+    return True
+
+
+def tri_box_overlap_batch(centers, half_size, tris):
+    """Vectorized ``tri_box_overlap`` over N (centre, triangle) pairs.
+
+    ``centers`` is (N, 3) and ``tris`` is (N, 3, 3); returns a bool (N,) mask.
+    The arithmetic mirrors the scalar test operation for operation so both
+    paths classify boundary cases identically.
+    """
+    hx, hy, hz = half_size
+    v0 = tris[:, 0, :] - centers
+    v1 = tris[:, 1, :] - centers
+    v2 = tris[:, 2, :] - centers
+    v0x, v0y, v0z = v0[:, 0], v0[:, 1], v0[:, 2]
+    v1x, v1y, v1z = v1[:, 0], v1[:, 1], v1[:, 2]
+    v2x, v2y, v2z = v2[:, 0], v2[:, 1], v2[:, 2]
+
+    e0x = v1x - v0x
+    e0y = v1y - v0y
+    e0z = v1z - v0z
+    e1x = v2x - v1x
+    e1y = v2y - v1y
+    e1z = v2z - v1z
+    e2x = v0x - v2x
+    e2y = v0y - v2y
+    e2z = v0z - v2z
+
+    hit = np.ones(len(centers), dtype=bool)
+
+    def axis_test(axv, ayv, azv):
+        p0 = axv * v0x + ayv * v0y + azv * v0z
+        p1 = axv * v1x + ayv * v1y + azv * v1z
+        p2 = axv * v2x + ayv * v2y + azv * v2z
+        min_p = np.minimum(np.minimum(p0, p1), p2)
+        max_p = np.maximum(np.maximum(p0, p1), p2)
+        rad = hx * np.abs(axv) + hy * np.abs(ayv) + hz * np.abs(azv)
+        return ~((min_p > rad) | (max_p < -rad))
+
+    axes = (
+        (0.0, -e0z, e0y), (e0z, 0.0, -e0x), (-e0y, e0x, 0.0),
+        (0.0, -e1z, e1y), (e1z, 0.0, -e1x), (-e1y, e1x, 0.0),
+        (0.0, -e2z, e2y), (e2z, 0.0, -e2x), (-e2y, e2x, 0.0),
+    )
+    for axv, ayv, azv in axes:
+        hit &= axis_test(axv, ayv, azv)
+
+    for a, b, c, h in ((v0x, v1x, v2x, hx), (v0y, v1y, v2y, hy), (v0z, v1z, v2z, hz)):
+        min_v = np.minimum(np.minimum(a, b), c)
+        max_v = np.maximum(np.maximum(a, b), c)
+        hit &= ~((min_v > h) | (max_v < -h))
+
+    nx = e0y * e1z - e0z * e1y
+    ny = e0z * e1x - e0x * e1z
+    nz = e0x * e1y - e0y * e1x
+    vmin_x = np.where(nx > 0.0, -hx - v0x, hx - v0x)
+    vmax_x = np.where(nx > 0.0, hx - v0x, -hx - v0x)
+    vmin_y = np.where(ny > 0.0, -hy - v0y, hy - v0y)
+    vmax_y = np.where(ny > 0.0, hy - v0y, -hy - v0y)
+    vmin_z = np.where(nz > 0.0, -hz - v0z, hz - v0z)
+    vmax_z = np.where(nz > 0.0, hz - v0z, -hz - v0z)
+    hit &= ~((nx * vmin_x + ny * vmin_y + nz * vmin_z) > 0.0)
+    hit &= (nx * vmax_x + ny * vmax_y + nz * vmax_z) >= 0.0
+    return hit
+
+
+def closest_point_on_triangles(points, tris):
+    """Closest point on each triangle ``tris[i]`` (N, 3, 3) to ``points[i]`` (N, 3).
+
+    Returns ``(closest, bary)`` with barycentric weights per triangle corner.
+    Follows the Voronoi-region walk from Ericson's Real-Time Collision Detection.
+    """
+    a = tris[:, 0, :]
+    b = tris[:, 1, :]
+    c = tris[:, 2, :]
+    ab = b - a
+    ac = c - a
+    ap = points - a
+    bp = points - b
+    cp = points - c
+    d1 = np.einsum("ij,ij->i", ab, ap)
+    d2 = np.einsum("ij,ij->i", ac, ap)
+    d3 = np.einsum("ij,ij->i", ab, bp)
+    d4 = np.einsum("ij,ij->i", ac, bp)
+    d5 = np.einsum("ij,ij->i", ab, cp)
+    d6 = np.einsum("ij,ij->i", ac, cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = va + vb + vc
+        v = vb / denom
+        w = vc / denom
+        bary = np.stack((1.0 - v - w, v, w), axis=1)
+
+        t_bc = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        t_ac = d2 / (d2 - d6)
+        t_ab = d1 / (d1 - d3)
+        ones = np.ones_like(d1)
+        zeros = np.zeros_like(d1)
+        regions = (
+            ((va <= 0.0) & ((d4 - d3) >= 0.0) & ((d5 - d6) >= 0.0), (zeros, 1.0 - t_bc, t_bc)),
+            ((vb <= 0.0) & (d2 >= 0.0) & (d6 <= 0.0), (1.0 - t_ac, zeros, t_ac)),
+            ((d6 >= 0.0) & (d5 <= d6), (zeros, zeros, ones)),
+            ((vc <= 0.0) & (d1 >= 0.0) & (d3 <= 0.0), (1.0 - t_ab, t_ab, zeros)),
+            ((d3 >= 0.0) & (d4 <= d3), (zeros, ones, zeros)),
+            ((d1 <= 0.0) & (d2 <= 0.0), (ones, zeros, zeros)),
+        )
+        for mask, weights in regions:
+            bary[mask] = np.stack(weights, axis=1)[mask]
+
+    bad = ~np.isfinite(bary).all(axis=1)
+    bary[bad] = (1.0, 0.0, 0.0)
+    closest = np.einsum("ij,ijk->ik", bary, tris)
+    return closest, bary
+
+
+def _reduce_owner_pairs(flat, tri, dist2, bary):
+    """Keep one (triangle, barycentric) per cell: the nearest, lowest index on ties."""
+    if len(flat) == 0:
+        return flat, tri, dist2, bary
+    order = np.lexsort((tri, dist2, flat))
+    flat = flat[order]
+    first = np.ones(len(flat), dtype=bool)
+    first[1:] = flat[1:] != flat[:-1]
+    keep = order[first]
+    return flat[first], tri[keep], dist2[keep], bary[keep]
+
+
+def _pair_distances(tri_ids, centers, tri_pts):
+    closest, bary = closest_point_on_triangles(centers, tri_pts[tri_ids])
+    diff = closest - centers
+    return np.einsum("ij,ij->i", diff, diff), bary
+
+
+def _owner_candidates(flat, tri_ids, centers, tri_pts):
+    dist2, bary = _pair_distances(tri_ids, centers, tri_pts)
+    return _reduce_owner_pairs(flat, tri_ids, dist2, bary)
+
+
+def _candidate_cell_ranges(tri_pts, grid):
+    grid_min = np.asarray(grid.grid_min, dtype=np.float64)
+    dims = np.asarray(grid.dims, dtype=np.int64)
+    lo = np.floor((tri_pts.min(axis=1) - grid_min) / grid.cell_len).astype(np.int64) - 1
+    hi = np.floor((tri_pts.max(axis=1) - grid_min) / grid.cell_len).astype(np.int64) + 1
+    lo = np.maximum(lo, 0)
+    hi = np.minimum(hi, dims - 1)
+    return lo, hi
+
+
+def _splat_small_triangles(tri_pts, grid):
+    """Cells covered by triangles that fit inside one cell column.
+
+    A triangle whose extent stays strictly inside a single cell on at least two
+    axes, and whose end points on the third axis keep clear of cell faces, can
+    only touch the straight run of cells between its end points, and it touches
+    all of them. ``SPLAT_MARGIN`` (a fraction of the cell size) keeps the result
+    identical to the full overlap test. Returns the splat mask per triangle and
+    the ``(flat, tri_ids, cells)`` hits of the splatted triangles.
+    """
+    dims = np.asarray(grid.dims, dtype=np.int64)
+    grid_min = np.asarray(grid.grid_min, dtype=np.float64)
+    fmin = (tri_pts.min(axis=1) - grid_min) / grid.cell_len
+    fmax = (tri_pts.max(axis=1) - grid_min) / grid.cell_len
+    lo = np.floor(fmin)
+    hi = np.floor(fmax)
+    clear = ((fmin - lo) > SPLAT_MARGIN) & ((fmin - lo) < 1.0 - SPLAT_MARGIN)
+    clear &= ((fmax - hi) > SPLAT_MARGIN) & ((fmax - hi) < 1.0 - SPLAT_MARGIN)
+    lo = lo.astype(np.int64)
+    hi = hi.astype(np.int64)
+    single = lo == hi
+    splat = clear.all(axis=1) & (single.sum(axis=1) >= 2) & (lo >= 0).all(axis=1) & (hi < dims).all(axis=1)
+
+    tri_ids = np.flatnonzero(splat)
+    runs = (hi[tri_ids] - lo[tri_ids] + 1).max(axis=1)
+    axis = np.argmin(single[tri_ids], axis=1)
+    step = np.repeat(np.arange(len(tri_ids)), runs)
+    offset = np.arange(len(step), dtype=np.int64) - np.repeat(np.cumsum(runs) - runs, runs)
+    cells = lo[tri_ids][step]
+    cells[np.arange(len(step)), axis[step]] += offset
+    tri_ids = tri_ids[step]
+    flat = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    return splat, flat, tri_ids, cells
+
+
+def build_shell_cells_scalar(tri_pts, grid, log=noop_log):
+    """Reference surface voxelization: one ``tri_box_overlap`` call per candidate cell."""
+    cell_len = grid.cell_len
+    grid_min_x, grid_min_y, grid_min_z = grid.grid_min
+    dx, dy, dz = grid.dims
+    half = 0.5 * cell_len
+    voxels = VoxelGrid(grid)
+    occ = voxels.occupancy
+    hit_flat = []
+    hit_tri = []
+    total_tris = len(tri_pts)
+    step = max(1, total_tris // 10) if total_tris else 1
+
+    for ti in range(total_tris):
+        a, b, c = (tuple(p) for p in tri_pts[ti].tolist())
+        tri = (a, b, c)
+
+        min_x = min(a[0], b[0], c[0])
+        min_y = min(a[1], b[1], c[1])
+        min_z = min(a[2], b[2], c[2])
+        max_x = max(a[0], b[0], c[0])
+        max_y = max(a[1], b[1], c[1])
+        max_z = max(a[2], b[2], c[2])
+
+        ix0 = max(0, int(math.floor((min_x - grid_min_x) / cell_len)) - 1)
+        iy0 = max(0, int(math.floor((min_y - grid_min_y) / cell_len)) - 1)
+        iz0 = max(0, int(math.floor((min_z - grid_min_z) / cell_len)) - 1)
+        ix1 = min(dx - 1, int(math.floor((max_x - grid_min_x) / cell_len)) + 1)
+        iy1 = min(dy - 1, int(math.floor((max_y - grid_min_y) / cell_len)) + 1)
+        iz1 = min(dz - 1, int(math.floor((max_z - grid_min_z) / cell_len)) + 1)
+
+        if ix1 >= ix0 and iy1 >= iy0 and iz1 >= iz0:
+            for ix in range(ix0, ix1 + 1):
+                cx = grid_min_x + (ix + 0.5) * cell_len
+                for iy in range(iy0, iy1 + 1):
+                    cy = grid_min_y + (iy + 0.5) * cell_len
+                    for iz in range(iz0, iz1 + 1):
+                        cz = grid_min_z + (iz + 0.5) * cell_len
+                        if tri_box_overlap((cx, cy, cz), (half, half, half), tri):
+                            occ[ix, iy, iz] = SHELL
+                            hit_flat.append((ix * dy + iy) * dz + iz)
+                            hit_tri.append(ti)
+
+        if ((ti + 1) % step) == 0 or (ti + 1) == total_tris:
+            log(f"[Voxelator] Surface voxelize {ti+1}/{total_tris}")
+
+    flat = np.array(hit_flat, dtype=np.int64)
+    tri_ids = np.array(hit_tri, dtype=np.int64)
+    centers = cell_centers(np.stack(np.unravel_index(flat, grid.dims), axis=1), grid)
+    flat, tri_ids, _, bary = _owner_candidates(flat, tri_ids, centers, tri_pts)
+    voxels.set_owners(flat, tri_ids, bary)
+    return voxels
+
+
+def _shell_hit_batches(tri_pts, grid, tri_subset=None, log=noop_log):
+    """Yield ``(flat, tri_ids, centers)`` for every overlapping (cell, triangle) pair.
+
+    Only triangles in ``tri_subset`` (all when None) are rasterized: sub-voxel
+    triangles are splatted, the rest are SAT-tested in batches of
+    ``SAT_PAIR_BATCH`` candidate pairs.
+    """
+    cell_len = grid.cell_len
+    dx, dy, dz = grid.dims
+    half = 0.5 * cell_len
+    subset = np.arange(len(tri_pts)) if tri_subset is None else np.asarray(tri_subset, dtype=np.int64)
+    total_tris = len(subset)
+
+    splat, flat, local_ids, cells = _splat_small_triangles(tri_pts[subset], grid)
+    yield flat, subset[local_ids], cell_centers(cells, grid)
+
+    sat_tris = subset[~splat]
+    lo, hi = _candidate_cell_ranges(tri_pts[sat_tris], grid)
+    extent = np.maximum(hi - lo + 1, 0)
+    counts = extent[:, 0] * extent[:, 1] * extent[:, 2]
+    pair_ends = np.cumsum(counts)
+    sat_count = len(sat_tris)
+    log(f"[Voxelator] Surface voxelize: splatted {total_tris - sat_count}/{total_tris} triangles, {int(counts.sum())} overlap tests")
+
+    ti = 0
+    next_log = max(1, sat_count // 10)
+    while ti < sat_count:
+        pair_base = pair_ends[ti] - counts[ti]
+        tj = int(np.searchsorted(pair_ends, pair_base + SAT_PAIR_BATCH, side="right"))
+        tj = min(sat_count, max(tj, ti + 1))
+
+        batch_counts = counts[ti:tj]
+        n_pairs = int(batch_counts.sum())
+        if n_pairs:
+            local_tris = np.repeat(np.arange(ti, tj), batch_counts)
+            tri_ids = sat_tris[local_tris]
+            local = np.arange(n_pairs, dtype=np.int64) - np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+            ny = extent[local_tris, 1]
+            nz = extent[local_tris, 2]
+            cells = lo[local_tris].copy()
+            cells[:, 0] += local // (ny * nz)
+            cells[:, 1] += (local // nz) % ny
+            cells[:, 2] += local % nz
+
+            centers = cell_centers(cells, grid)
+            hit = tri_box_overlap_batch(centers, (half, half, half), tri_pts[tri_ids])
+            flat = (cells[hit, 0] * dy + cells[hit, 1]) * dz + cells[hit, 2]
+            yield flat, tri_ids[hit], centers[hit]
+
+        ti = tj
+        if ti >= next_log or ti == sat_count:
+            log(f"[Voxelator] Surface voxelize {ti}/{sat_count}")
+            next_log = ti + max(1, sat_count // 10)
+
+
+def build_shell_cells_batched(tri_pts, grid, log=noop_log):
+    """Surface voxelization testing (triangle, cell) pairs in batches of ``SAT_PAIR_BATCH``."""
+    voxels = VoxelGrid(grid)
+    occ_flat = voxels.occupancy.reshape(-1)
+    owner_parts = []
+    for flat, tri_ids, centers in _shell_hit_batches(tri_pts, grid, log=log):
+        occ_flat[flat] = SHELL
+        owner_parts.append(_owner_candidates(flat, tri_ids, centers, tri_pts))
+
+    flat, tri_ids, dist2, bary = (np.concatenate(parts) for parts in zip(*owner_parts))
+    flat, tri_ids, _, bary = _reduce_owner_pairs(flat, tri_ids, dist2, bary)
+    voxels.set_owners(flat, tri_ids, bary)
+    return voxels
+
+
+def _spread_along_last_axis(empty, outside):
+    """Mark every run of empty cells along the last axis that touches ``outside``."""
+    n = empty.shape[-1]
+    empty2 = empty.reshape(-1, n)
+    starts = empty2.copy()
+    starts[:, 1:] &= ~empty2[:, :-1]
+    run_id = np.cumsum(starts.reshape(-1)) - 1
+    flat_empty = empty2.reshape(-1)
+    seeded = np.zeros(int(run_id[-1]) + 1 if len(run_id) else 0, dtype=bool)
+    seeded[run_id[flat_empty & outside.reshape(-1)]] = True
+    spread = np.zeros(flat_empty.shape, dtype=bool)
+    spread[flat_empty] = seeded[run_id[flat_empty]]
+    return spread.reshape(empty.shape)
+
+
+def _finish_flood_fill(empty, outside):
+    """Extend ``outside`` over the empty cells 6-connected to it, by BFS.
+
+    Only cells that are still unresolved are visited, starting from the
+    outside cells that border them.
+    """
+    dx, dy, dz = empty.shape
+    pending = empty & ~outside
+    touches = np.zeros(empty.shape, dtype=bool)
+    touches[1:] |= pending[:-1]
+    touches[:-1] |= pending[1:]
+    touches[:, 1:] |= pending[:, :-1]
+    touches[:, :-1] |= pending[:, 1:]
+    touches[:, :, 1:] |= pending[:, :, :-1]
+    touches[:, :, :-1] |= pending[:, :, 1:]
+
+    open_cells = bytearray(pending.tobytes())
+    q = deque(np.flatnonzero(outside & touches).tolist())
+    sx = dy * dz
+    sy = dz
+    while q:
+        idx = q.popleft()
+        ix, rem = divmod(idx, sx)
+        iy, iz = divmod(rem, sy)
+        for ok, nb in ((ix > 0, idx - sx), (ix < dx - 1, idx + sx), (iy > 0, idx - sy), (iy < dy - 1, idx + sy), (iz > 0, idx - 1), (iz < dz - 1, idx + 1)):
+            if ok and open_cells[nb]:
+                open_cells[nb] = 0
+                q.append(nb)
+    reached = pending & ~np.frombuffer(bytes(open_cells), dtype=bool).reshape(empty.shape)
+    return outside | reached
+
+
+def flood_fill_outside(occupancy, min_sweep_gain=0.01):
+    """Mark empty cells 6-connected to the grid boundary; returns a bool array.
+
+    Instead of a per-cell BFS this alternates scanline sweeps along x, y and z:
+    each sweep marks whole runs of empty cells that contain an outside cell,
+    which spreads the outside region along straight corridors in one array
+    pass. Each x/y/z round only gets past one turn of a corridor, though, so
+    a winding outside region (a serpentine maze needs one round per bend)
+    would take many rounds. Once a round marks fewer than ``min_sweep_gain``
+    of the empty cells, the rest is finished by a BFS from the frontier; for
+    typical meshes the sweeps converge after a round or two and the BFS has
+    nothing left to do.
+    """
+    empty = occupancy == EMPTY
+    outside = np.zeros(empty.shape, dtype=bool)
+    outside[[0, -1], :, :] = empty[[0, -1], :, :]
+    outside[:, [0, -1], :] |= empty[:, [0, -1], :]
+    outside[:, :, [0, -1]] |= empty[:, :, [0, -1]]
+
+    min_gain = max(1, int(min_sweep_gain * np.count_nonzero(empty)))
+    count = int(np.count_nonzero(outside))
+    while True:
+        for axis in (0, 1, 2):
+            e = np.moveaxis(empty, axis, -1)
+            o = np.moveaxis(outside, axis, -1)
+            outside = np.moveaxis(_spread_along_last_axis(np.ascontiguousarray(e), np.ascontiguousarray(o)), -1, axis)
+        new_count = int(np.count_nonzero(outside))
+        if new_count == count:
+            return outside
+        if new_count - count < min_gain:
+            return _finish_flood_fill(empty, outside)
+        count = new_count
+
+
+def fill_interior(voxels, log=noop_log):
+    occ = voxels.occupancy
+    owners = voxels.owner_pairs()
+    outside = flood_fill_outside(occ)
+    occ[(occ == EMPTY) & ~outside] = INTERIOR
+    voxels.set_owners(*owners)
+    log(f"[Voxelator] Volume fill: shell={voxels.shell_count} outside={int(np.count_nonzero(outside))} total={voxels.count}")
+    return voxels
+
+
+def _lower_envelope_argmin(f):
+    """Per column of ``f`` (n, m), the row ``j`` minimizing ``(i - j) ** 2 + f[j]`` for every row ``i``.
+
+    Felzenszwalb and Huttenlocher's lower envelope of parabolas, run on all
+    columns in lockstep. Columns without a finite ``f`` get -1.
+    """
+    n, m = f.shape
+    ff = f.reshape(-1)
+    sites = np.zeros(n * m, dtype=np.int64)
+    bounds = np.empty((n + 1) * m)
+    top = np.full(m, -1, dtype=np.int64)
+    for q in range(n):
+        live = np.flatnonzero(f[q] < np.inf)
+        if not len(live):
+            continue
+        fq = f[q, live] + q * q
+        k = top[live]
+        at = k.clip(0) * m + live
+        v = sites[at]
+        s = (fq - (ff[v * m + live] + v * v)) / (2.0 * np.maximum(q - v, 1))
+        # Pop envelope parabolas hidden by the new one (bounds[0] is -inf, so k stays >= 0).
+        pop = np.flatnonzero((k >= 0) & (s <= bounds[at]))
+        while len(pop):
+            k[pop] -= 1
+            at = k[pop] * m + live[pop]
+            v = sites[at]
+            s[pop] = (fq[pop] - (ff[v * m + live[pop]] + v * v)) / (2.0 * (q - v))
+            pop = pop[s[pop] <= bounds[at]]
+        k += 1
+        top[live] = k
+        at = k * m + live
+        sites[at] = q
+        bounds[at] = np.where(k == 0, -np.inf, s)
+        bounds[at + m] = np.inf
+
+    arg = np.full((n, m), -1, dtype=np.int64)
+    cols = np.flatnonzero(top >= 0)
+    k = np.zeros(len(cols), dtype=np.int64)
+    for q in range(n):
+        while True:
+            step = bounds[(k + 1) * m + cols] < q
+            if not step.any():
+                break
+            k += step
+        arg[q, cols] = sites[k * m + cols]
+    return arg
+
+
+def nearest_shell_indices(voxels):
+    """For every occupied voxel, the packed index of the closest shell voxel.
+
+    Shell voxels map to themselves; interior voxels get the shell voxel whose
+    centre is nearest in Euclidean distance (ties go to either). This is an
+    exact distance transform that carries the nearest shell cell along, done
+    one axis at a time over the dense grid. Every voxel gets -1 if there is
+    no shell voxel.
+    """
+    occ = voxels.occupancy
+    shell = occ == SHELL
+    owner = np.where(shell, np.arange(occ.size).reshape(occ.shape), -1)
+    dist2 = np.where(shell, 0.0, np.inf)
+    for axis in (2, 1, 0):
+        shape = np.moveaxis(dist2, axis, 0).shape
+        f = np.ascontiguousarray(np.moveaxis(dist2, axis, 0).reshape(shape[0], -1))
+        lines = np.moveaxis(owner, axis, 0).reshape(shape[0], -1)
+        arg = _lower_envelope_argmin(f)
+        found = arg >= 0
+        cols = np.arange(f.shape[1])
+        arg = arg.clip(0)
+        offset = np.arange(shape[0])[:, None] - arg
+        dist2 = np.moveaxis(np.where(found, offset * offset + f[arg, cols], np.inf).reshape(shape), 0, axis)
+        owner = np.moveaxis(np.where(found, lines[arg, cols], -1).reshape(shape), 0, axis)
+
+    cells = voxels.cell_indices()
+    packed = np.full(occ.size, -1, dtype=np.int64)
+    packed[cells] = np.arange(len(cells))
+    owner = owner.reshape(-1)[cells]
+    return np.where(owner >= 0, packed[owner], -1)
+
+
+def propagate_shell_attributes(voxels):
+    """Give interior voxels the color and material of their nearest shell voxel."""
+    nearest = nearest_shell_indices(voxels)
+    interior = np.flatnonzero(voxels.occupancy.reshape(-1)[voxels.cell_indices()] == INTERIOR)
+    src = nearest[interior]
+    reached = src >= 0
+    voxels.colors[interior[reached]] = voxels.colors[src[reached]]
+    voxels.material_index[interior[reached]] = voxels.material_index[src[reached]]
+    return voxels
+
+
+def voxelize(tri_pts, grid, fill_volume=False, overlap_engine='NUMPY', log=noop_log):
+    """Voxelize world-space triangles ``tri_pts`` (T, 3, 3) into ``grid``.
+
+    Returns a ``VoxelGrid`` whose occupancy marks shell and (optionally) interior
+    cells. Shell voxels carry their owning triangle (index into ``tri_pts``) and
+    barycentrics; interior voxels are left without an owner.
+    """
+    tri_pts = np.asarray(tri_pts, dtype=np.float64).reshape(-1, 3, 3)
+    if overlap_engine == 'SCALAR':
+        voxels = build_shell_cells_scalar(tri_pts, grid, log=log)
+    else:
+        voxels = build_shell_cells_batched(tri_pts, grid, log=log)
+
+    if not fill_volume:
+        return voxels
+    return fill_interior(voxels, log=log)
+
+
+class IncrementalVoxelizer:
+    """Voxelize consecutive frames, re-rasterizing only the triangles that moved.
+
+    Every (cell, triangle) overlap of the previous frame is kept with its owner
+    distance and barycentrics. For a new frame, triangles whose corners are
+    bit-identical keep their pairs; the pairs of moved triangles are dropped
+    and rasterized again, owners are re-reduced only for the cells those pairs
+    touch, and the volume fill is redone only when the shell changed. The
+    result equals ``voxelize`` on the same triangles.
+
+    ``moved_count`` is the number of triangles re-rasterized by the last
+    ``update``; 0 means the frame matches the previous one exactly.
+    """
+
+    def __init__(self, grid, fill_volume=False, log=noop_log):
+        self.grid = grid
+        self.fill_volume = fill_volume
+        self.log = log
+        self.moved_count = 0
+        self.total_moved = 0
+        self.total_tris = 0
+        self._tri_pts = None
+        self._pairs = None
+        self._owners = None
+        self._outside = None
+
+    def stats(self):
+        return f"moved_tris={self.total_moved}/{self.total_tris}"
+
+    def _rasterize(self, tri_pts, tri_subset):
+        parts = []
+        for flat, tri_ids, centers in _shell_hit_batches(tri_pts, self.grid, tri_subset, log=self.log):
+            dist2, bary = _pair_distances(tri_ids, centers, tri_pts)
+            parts.append((flat, tri_ids, dist2, bary))
+        return tuple(np.concatenate(p) for p in zip(*parts))
+
+    def update(self, tri_pts):
+        tri_pts = np.asarray(tri_pts, dtype=np.float64).reshape(-1, 3, 3)
+        n_tris = len(tri_pts)
+        prev = self._tri_pts
+        if prev is None or prev.shape != tri_pts.shape:
+            moved = np.arange(n_tris)
+            pairs = self._rasterize(tri_pts, moved)
+            owners = _reduce_owner_pairs(*pairs)
+        else:
+            moved = np.flatnonzero((tri_pts != prev).reshape(n_tris, 9).any(axis=1))
+            moved_mask = np.zeros(n_tris, dtype=bool)
+            moved_mask[moved] = True
+            old_flat, old_tri, old_dist2, old_bary = self._pairs
+            stale = moved_mask[old_tri]
+            new_pairs = self._rasterize(tri_pts, moved)
+            affected = np.union1d(old_flat[stale], new_pairs[0])
+
+            pairs = tuple(np.concatenate((old[~stale], new)) for old, new in zip(self._pairs, new_pairs))
+            redo = np.isin(pairs[0], affected)
+            redone = _reduce_owner_pairs(*(p[redo] for p in pairs))
+            keep = ~np.isin(self._owners[0], affected)
+            merged = tuple(np.concatenate((old[keep], new)) for old, new in zip(self._owners, redone))
+            order = np.argsort(merged[0], kind="stable")
+            owners = tuple(m[order] for m in merged)
+
+        shell_changed = self._owners is None or not np.array_equal(owners[0], self._owners[0])
+        self._tri_pts = tri_pts
+        self._pairs = pairs
+        self._owners = owners
+        self.moved_count = len(moved)
+        self.total_moved += len(moved)
+        self.total_tris += n_tris
+
+        voxels = VoxelGrid(self.grid)
+        occ = voxels.occupancy
+        occ.reshape(-1)[owners[0]] = SHELL
+        if self.fill_volume:
+            if shell_changed:
+                self._outside = flood_fill_outside(occ)
+            occ[(occ == EMPTY) & ~self._outside] = INTERIOR
+            self.log(f"[Voxelator] Volume fill: shell={voxels.shell_count} total={voxels.count} refilled={shell_changed}")
+        voxels.set_owners(owners[0], owners[1], owners[3])
+        self.log(f"[Voxelator] Incremental voxelize: moved {len(moved)}/{n_tris} triangles")
+        return voxels
+
+
+def sample_image_bilinear(w, h, pixels, uv):
+    """Bilinearly sample a flat RGBA float ``pixels`` buffer of a w x h image at ``uv``.
+
+    Per-sample reference for ``sample_image_bilinear_batch``.
+    """
+    u = uv[0] % 1.0
+    v = uv[1] % 1.0
+
+    x = u * (w - 1)
+    y = v * (h - 1)
+    x0 = int(math.floor(x))
+    y0 = int(math.floor(y))
+    x1 = min(x0 + 1, w - 1)
+    y1 = min(y0 + 1, h - 1)
+    tx = x - x0
+    ty = y - y0
+
+    def px(ix, iy):
+        idx = (iy * w + ix) * 4
+        return (pixels[idx], pixels[idx + 1], pixels[idx + 2], pixels[idx + 3])
+
+    c00 = px(x0, y0)
+    c10 = px(x1, y0)
+    c01 = px(x0, y1)
+    c11 = px(x1, y1)
+
+    out = [0.0, 0.0, 0.0, 0.0]
+    for i in range(4):
+        a = c00[i] * (1.0 - tx) + c10[i] * tx
+        b = c01[i] * (1.0 - tx) + c11[i] * tx
+        out[i] = a * (1.0 - ty) + b * ty
+    return tuple(out)
+
+
+def sample_image_bilinear_batch(pixels, uvs):
+    """Vectorized ``sample_image_bilinear`` over many UVs at once.
+
+    ``pixels`` is an (h, w, 4) array in Blender ``Image.pixels`` row order
+    (bottom row first) and ``uvs`` is (N, 2). Returns (N, 4) float64 colors,
+    computed with the same operation order as the scalar sampler.
+    """
+    h, w = pixels.shape[:2]
+    uvs = np.asarray(uvs, dtype=np.float64).reshape(-1, 2)
+    u = np.mod(uvs[:, 0], 1.0)
+    v = np.mod(uvs[:, 1], 1.0)
+
+    x = u * (w - 1)
+    y = v * (h - 1)
+    x0 = np.floor(x).astype(np.int64)
+    y0 = np.floor(y).astype(np.int64)
+    x1 = np.minimum(x0 + 1, w - 1)
+    y1 = np.minimum(y0 + 1, h - 1)
+    tx = (x - x0)[:, None]
+    ty = (y - y0)[:, None]
+
+    c00 = pixels[y0, x0].astype(np.float64)
+    c10 = pixels[y0, x1].astype(np.float64)
+    c01 = pixels[y1, x0].astype(np.float64)
+    c11 = pixels[y1, x1].astype(np.float64)
+
+    a = c00 * (1.0 - tx) + c10 * tx
+    b = c01 * (1.0 - tx) + c11 * tx
+    return a * (1.0 - ty) + b * ty
+
+
+def interpolate_triangle_uvs(tri_uvs, tri, bary):
+    """Barycentric UVs for points on triangles.
+
+    ``tri_uvs`` is (T, 3, 2) loop UVs per triangle in corner order, ``tri`` the
+    (N,) owning triangle per point and ``bary`` the (N, 3) weights of those
+    corners. Returns (N, 2) float64 UVs.
+    """
+    tri_uvs = np.asarray(tri_uvs, dtype=np.float64)
+    bary = np.asarray(bary, dtype=np.float64).reshape(-1, 3)
+    return np.einsum("ij,ijk->ik", bary, tri_uvs[np.asarray(tri, dtype=np.int64)])
+
+
+def color_voxels(voxels, indices, tri_mat, tri_uvs, material_sources, image_pixels, log=noop_log):
+    """Color the voxels at ``indices`` from their owner triangles.
+
+    ``material_sources`` holds, per material slot, None or a resolved source,
+    either ``("solid", rgba)`` or ``("image", key, fallback_rgba)``.
+    ``image_pixels(key)`` returns (h, w, 4) pixels for an image key, or None.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    owner_tri = voxels.owner_tri
+    voxel_mat = tri_mat[owner_tri[indices]]
+    image_samples = {}
+    for mi in np.unique(voxel_mat).tolist():
+        if mi >= len(material_sources) or material_sources[mi] is None:
+            continue
+        idx = indices[voxel_mat == mi]
+        voxels.material_index[idx] = mi
+        log(f"[Voxelator] Material map {mi}: {len(idx)}/{len(owner_tri)} voxels")
+
+        source = material_sources[mi]
+        if source[0] == "solid":
+            voxels.colors[idx] = source[1]
+            continue
+        voxels.colors[idx] = source[2]
+        if tri_uvs is not None:
+            image_samples.setdefault(source[1], []).append(idx)
+
+    for key, parts in image_samples.items():
+        idx = np.concatenate(parts)
+        pixels = image_pixels(key)
+        if pixels is not None:
+            uvs = interpolate_triangle_uvs(tri_uvs, owner_tri[idx], voxels.owner_bary[idx])
+            voxels.colors[idx] = sample_image_bilinear_batch(pixels, uvs)
+        log(f"[Voxelator] Sampled {len(idx)} voxels from image '{key}'")
+
+
+def color_owned_voxels(voxels, geometry, material_sources, image_pixels, previous=None, log=noop_log):
+    """Color every voxel that has an owner triangle.
+
+    With ``previous`` (the prior frame, same topology), voxels whose cell,
+    owner triangle and barycentrics are unchanged copy its colors instead.
+    """
+    todo = voxels.owner_tri >= 0
+    if previous is not None:
+        mine, theirs = voxels.matching_owners(previous)
+        voxels.colors[mine] = previous.colors[theirs]
+        voxels.material_index[mine] = previous.material_index[theirs]
+        todo[mine] = False
+        log(f"[Voxelator] Reused colors of {len(mine)}/{len(todo)} voxels from the previous frame")
+    color_voxels(voxels, np.flatnonzero(todo), geometry["tri_mat"], geometry.get("tri_uvs"), material_sources, image_pixels, log=log)
+
+
+_worker_images = {}
+
+
+def _worker_image_pixels(key, paths):
+    pixels = _worker_images.get(key)
+    if pixels is None and key in paths:
+        pixels = _worker_images[key] = np.load(paths[key], mmap_mode="r")
+    return pixels
+
+
+def voxelize_frame_chunk(job):
+    """Worker entry point: voxelize and color a contiguous run of frames.
+
+    ``job`` carries the ``grid``, the per-frame geometry arrays in ``frames``,
+    the voxelize options, ``material_sources`` and ``image_paths`` (image key
+    to ``.npy`` pixels). Voxels without an owner triangle (filled interiors,
+    unless ``surface_only``) are left uncolored for the caller. A frame equal
+    to the one before it is returned as the same ``VoxelGrid`` object.
+    """
+    grid = job["grid"]
+    fill_volume = job["fill_volume"]
+    surface_only = job["surface_only"]
+    paths = job["image_paths"]
+    incremental = IncrementalVoxelizer(grid, fill_volume=fill_volume) if job["incremental"] else None
+    results = []
+    for geometry in job["frames"]:
+        tri_pts = triangle_points(geometry["verts"], geometry["tri_verts"])
+        previous = None
+        if incremental is None:
+            voxels = voxelize(tri_pts, grid, fill_volume=fill_volume, overlap_engine=job["overlap_engine"])
+        else:
+            voxels = incremental.update(tri_pts)
+            if results and incremental.moved_count < len(tri_pts):
+                previous = results[-1]
+                if incremental.moved_count == 0:
+                    results.append(previous)
+                    continue
+
+        voxels.init_attributes()
+        color_owned_voxels(voxels, geometry, job["material_sources"], lambda key: _worker_image_pixels(key, paths), previous=previous)
+        if surface_only and voxels.count > voxels.shell_count:
+            propagate_shell_attributes(voxels)
+        results.append(voxels)
+    return results
+
+
+def render_spritesheet_pixels(voxels, tile_size, log=noop_log, layout=None):
+    """Lay out the ``dz`` slices of one voxel frame side by side (or per a ``SheetLayout``).
+
+    Returns ``(width, height, px)`` where ``px`` is a bottom-up flat RGBA
+    float32 array, ready for ``Image.pixels.foreach_set``.
+    """
+    band = render_frame_band(voxels, tile_size)
+    if layout is not None:
+        band = layout.compose([layout.arrange(band)])
+    height, width = band.shape[:2]
+    log(f"[Voxelator] Spritesheet fill {voxels.colored_count} voxels")
+    return width, height, np.ascontiguousarray(band[::-1]).reshape(-1)
+
+
+def render_frame_band(voxels, tile_size):
+    """One frame's row of ``dz`` slice tiles as a (tile, tile * dz, 4) float32 array.
+
+    Rows are top-down (PNG order). Slices are centered in their tile; cells
+    that fall outside their own tile are clipped rather than drawn into the
+    neighbouring slice.
+    """
+    dx, dy, dz = voxels.spec.dims
+    tile = max(1, int(tile_size))
+    width = tile * dz
+    band = np.zeros((tile, width, 4), dtype=np.float32)
+    if voxels.material_index is None:
+        return band
+
+    coords = voxels.cell_coords()
+    colored = np.flatnonzero(voxels.material_index >= 0)
+    by_z = colored[np.argsort(coords[colored, 2], kind="stable")]
+    tile_x = (tile - dx) // 2 + coords[by_z, 0]
+    px_y = (tile - dy) // 2 + coords[by_z, 1]
+    inside = (tile_x >= 0) & (tile_x < tile) & (px_y >= 0) & (px_y < tile)
+    by_z, px_y = by_z[inside], px_y[inside]
+    px_x = coords[by_z, 2] * tile + tile_x[inside]
+
+    # Later voxels (in z, then packed order) win when cells share a pixel.
+    flat = px_y * width + px_x
+    _, last = np.unique(flat[::-1], return_index=True)
+    keep = len(flat) - 1 - last
+    band.reshape(-1, 4)[flat[keep]] = voxels.colors[by_z[keep]]
+    return band
+
+
+def _next_pow2(n):
+    return 1 << max(0, int(n) - 1).bit_length()
+
+
+class SheetLayout:
+    """Where slice tiles and frames go in a spritesheet.
+
+    Each frame is a cell of ``slice_columns`` x ``slice_rows`` slice tiles
+    (slice ``z`` at column ``z % slice_columns``, row ``z // slice_columns``),
+    and frame cells are laid out ``frame_columns`` per row, frame 0 at the top
+    left. ``slice_columns=0`` puts all slices in one row and
+    ``frame_columns=1`` stacks frames vertically, the classic layout. With
+    ``pow2`` the image is padded right/bottom to power-of-two dimensions.
+    Offsets are in pixels from the top-left corner.
+    """
+
+    def __init__(self, tile_size, dz, frame_count=1, slice_columns=0, frame_columns=1, pow2=False):
+        self.tile = max(1, int(tile_size))
+        self.dz = max(1, int(dz))
+        self.frame_count = max(1, int(frame_count))
+        self.slice_columns = self.dz if slice_columns <= 0 else min(int(slice_columns), self.dz)
+        self.slice_rows = -(-self.dz // self.slice_columns)
+        self.frame_columns = min(max(1, int(frame_columns)), self.frame_count)
+        self.frame_rows = -(-self.frame_count // self.frame_columns)
+        self.cell_width = self.tile * self.slice_columns
+        self.cell_height = self.tile * self.slice_rows
+        self.content_width = self.cell_width * self.frame_columns
+        self.content_height = self.cell_height * self.frame_rows
+        self.pow2 = bool(pow2)
+        self.width = _next_pow2(self.content_width) if pow2 else self.content_width
+        self.height = _next_pow2(self.content_height) if pow2 else self.content_height
+
+    def slice_offset(self, z):
+        return (z % self.slice_columns) * self.tile, (z // self.slice_columns) * self.tile
+
+    def frame_offset(self, index):
+        return (index % self.frame_columns) * self.cell_width, (index // self.frame_columns) * self.cell_height
+
+    def arrange(self, band):
+        """Rearrange a (tile, tile * dz, ...) ``render_frame_band`` row into one frame cell."""
+        if self.slice_columns == self.dz:
+            return band
+        t = self.tile
+        extra = band.shape[2:]
+        tiles = np.zeros((self.slice_rows * self.slice_columns, t, t) + extra, dtype=band.dtype)
+        tiles[:self.dz] = np.moveaxis(band.reshape((t, self.dz, t) + extra), 1, 0)
+        tiles = tiles.reshape((self.slice_rows, self.slice_columns, t, t) + extra).swapaxes(1, 2)
+        return tiles.reshape((self.cell_height, self.cell_width) + extra)
+
+    def compose(self, cells):
+        """Whole sheet (height, width, ...) from a list of frame cells."""
+        sheet = np.zeros((self.height, self.width) + cells[0].shape[2:], dtype=cells[0].dtype)
+        for i, cell in enumerate(cells):
+            x, y = self.frame_offset(i)
+            sheet[y:y + self.cell_height, x:x + self.cell_width] = cell
+        return sheet
+
+    def to_dict(self):
+        return {
+            "origin": "top-left",
+            "width": self.width,
+            "height": self.height,
+            "tile_size": self.tile,
+            "slice_columns": self.slice_columns,
+            "slice_rows": self.slice_rows,
+            "frame_columns": self.frame_columns,
+            "frame_rows": self.frame_rows,
+            "frame_size": [self.cell_width, self.cell_height],
+            "slice_offsets": [list(self.slice_offset(z)) for z in range(self.dz)],
+            "frame_offsets": [list(self.frame_offset(i)) for i in range(self.frame_count)],
+        }
+
+
+def float_to_byte(pixels):
+    """Float RGBA to uint8 the way Blender stores byte images (round half up, clamped)."""
+    f = np.asarray(pixels, dtype=np.float32)
+    out = (f * np.float32(255.0) + np.float32(0.5)).clip(0, 255).astype(np.uint8)
+    out[f <= 0.0] = 0
+    out[f > np.float32(1.0 - 0.5 / 255.0)] = 255
+    return out
+
+
+PNG_FILTERS = ("none", "sub", "up", "average", "paeth", "adaptive")
+
+
+def _paeth_predict(a, b, c):
+    a = a.astype(np.int16)
+    b = b.astype(np.int16)
+    c = c.astype(np.int16)
+    p = a + b - c
+    pa = np.abs(p - a)
+    pb = np.abs(p - b)
+    pc = np.abs(p - c)
+    return np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c)).astype(np.uint8)
+
+
+def png_filter_rows(rows, prev_row, filter_name="none", bpp=4):
+    """Apply a PNG scanline filter to (n, stride) uint8 rows of ``bpp``-byte pixels.
+
+    ``prev_row`` is the unfiltered row above the first one (None at the top
+    of the image). Returns (n, 1 + stride) bytes with the filter type byte
+    first; ``"adaptive"`` picks, per row, the filter with the smallest sum of
+    absolute signed residuals, like libpng's default heuristic.
+    """
+    rows = np.asarray(rows, dtype=np.uint8)
+    n, stride = rows.shape
+    up = np.zeros_like(rows)
+    if n:
+        up[0] = 0 if prev_row is None else prev_row
+        up[1:] = rows[:-1]
+    left = np.zeros_like(rows)
+    left[:, bpp:] = rows[:, :-bpp]
+    up_left = np.zeros_like(rows)
+    up_left[:, bpp:] = up[:, :-bpp]
+
+    kinds = PNG_FILTERS[:5] if filter_name == "adaptive" else (filter_name,)
+    candidates = []
+    for kind in kinds:
+        if kind == "none":
+            res = rows
+        elif kind == "sub":
+            res = rows - left
+        elif kind == "up":
+            res = rows - up
+        elif kind == "average":
+            res = rows - ((left.astype(np.uint16) + up) >> 1).astype(np.uint8)
+        elif kind == "paeth":
+            res = rows - _paeth_predict(left, up, up_left)
+        else:
+            raise ValueError(f"Unknown PNG filter: {filter_name!r}")
+        candidates.append(res)
+
+    out = np.empty((n, 1 + stride), dtype=np.uint8)
+    if len(candidates) == 1:
+        out[:, 0] = PNG_FILTERS.index(kinds[0])
+        out[:, 1:] = candidates[0]
+        return out
+    cost = np.stack([np.abs(c.view(np.int8).astype(np.int32)).sum(axis=1) for c in candidates])
+    best = cost.argmin(axis=0)
+    out[:, 0] = best
+    out[:, 1:] = np.stack(candidates)[best, np.arange(n)]
+    return out
+
+
+class PNGStreamWriter:
+    """Minimal 8-bit PNG encoder that compresses rows as they are written.
+
+    Rows are passed top-down as (n, width, 4) uint8 RGBA arrays, or, when a
+    (N, 4) uint8 ``palette`` is given, as (n, width) uint8 palette indices
+    for an indexed-color PNG (alpha goes to a tRNS chunk). Only the zlib
+    stream state and the last row (for filtering) are kept between calls.
+    ``filter_name`` is one of ``PNG_FILTERS``.
+    """
+
+    def __init__(self, path, width, height, compress_level=6, filter_name="none", palette=None):
+        if filter_name not in PNG_FILTERS:
+            raise ValueError(f"Unknown PNG filter: {filter_name!r}")
+        self.path = path
+        self.width = int(width)
+        self.height = int(height)
+        self.filter_name = filter_name
+        self.bpp = 4 if palette is None else 1
+        self.rows_written = 0
+        self._prev_row = None
+        self._file = open(path, "wb")
+        self._zlib = zlib.compressobj(compress_level)
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        if palette is None:
+            self._chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 6, 0, 0, 0))
+        else:
+            palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 4)
+            if not 1 <= len(palette) <= 256:
+                raise ValueError(f"PNG palette needs 1..256 colors, got {len(palette)}")
+            self._chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 3, 0, 0, 0))
+            self._chunk(b"PLTE", palette[:, :3].tobytes())
+            opaque = np.flatnonzero(palette[:, 3] != 255)
+            if len(opaque):
+                self._chunk(b"tRNS", palette[:opaque[-1] + 1, 3].tobytes())
+
+    def _chunk(self, tag, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(tag)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF))
+
+    def write_rows(self, rows):
+        rows = np.asarray(rows, dtype=np.uint8).reshape(-1, self.width * self.bpp)
+        if not len(rows):
+            return
+        data = png_filter_rows(rows, self._prev_row, self.filter_name, self.bpp)
+        self._prev_row = rows[-1].copy()
+        out = self._zlib.compress(data.tobytes())
+        if out:
+            self._chunk(b"IDAT", out)
+        self.rows_written += len(rows)
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self.path)
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"PNG {self.path}: wrote {self.rows_written} of {self.height} rows")
+            self._chunk(b"IDAT", self._zlib.flush())
+            self._chunk(b"IEND", b"")
+        finally:
+            self._file.close()
+            self._file = None
+
+
+def write_png(path, rows, compress_level=6, filter_name="none", palette=None):
+    """Encode top-down (height, width, 4) uint8 RGBA ``rows`` as one PNG file.
+
+    With a ``palette``, ``rows`` are (height, width) indices into it.
+    """
+    rows = np.asarray(rows, dtype=np.uint8)
+    png = PNGStreamWriter(path, rows.shape[1], rows.shape[0], compress_level=compress_level, filter_name=filter_name, palette=palette)
+    try:
+        png.write_rows(rows)
+    except BaseException:
+        png.abort()
+        raise
+    png.close()
+
+
+def pack_rgba(rgba):
+    """RGBA8 pixels (..., 4) as one little-endian uint32 per pixel."""
+    return np.ascontiguousarray(rgba, dtype=np.uint8).reshape(-1, 4).view("<u4").ravel()
+
+
+def unpack_rgba(packed):
+    """Inverse of ``pack_rgba``: (N, 4) uint8 RGBA."""
+    return np.ascontiguousarray(packed, dtype="<u4").view(np.uint8).reshape(-1, 4)
+
+
+class ColorCounts:
+    """Pixel counts per distinct RGBA8 color, merged across rows and sheets."""
+
+    def __init__(self):
+        self.colors = np.zeros(0, dtype="<u4")
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.colors)
+
+    def add(self, rgba, weight=1):
+        colors, counts = np.unique(pack_rgba(rgba), return_counts=True)
+        self._merge(colors, counts * int(weight))
+
+    def update(self, other):
+        self._merge(other.colors, other.counts)
+
+    def _merge(self, colors, counts):
+        merged, inverse = np.unique(np.concatenate((self.colors, colors)), return_inverse=True)
+        total = np.zeros(len(merged), dtype=np.int64)
+        np.add.at(total, inverse.ravel(), np.concatenate((self.counts, counts)))
+        self.colors, self.counts = merged, total
+
+
+def _median_cut(colors, counts, max_colors):
+    boxes = [np.arange(len(colors))]
+    while len(boxes) < max_colors:
+        best, best_score, best_axis = None, 0, 0
+        for bi, box in enumerate(boxes):
+            if len(box) < 2:
+                continue
+            spread = colors[box].max(axis=0) - colors[box].min(axis=0)
+            axis = int(spread.argmax())
+            score = int(spread[axis]) * int(counts[box].sum())
+            if score > best_score:
+                best, best_score, best_axis = bi, score, axis
+        if best is None:
+            break
+        box = boxes.pop(best)
+        box = box[np.argsort(colors[box, best_axis], kind="stable")]
+        weight = np.cumsum(counts[box])
+        cut = int(np.searchsorted(weight, weight[-1] / 2.0)) + 1
+        cut = min(max(cut, 1), len(box) - 1)
+        boxes.extend((box[:cut], box[cut:]))
+    palette = np.empty((len(boxes), 4), dtype=np.uint8)
+    for bi, box in enumerate(boxes):
+        w = counts[box].astype(np.float64)
+        palette[bi] = np.rint((colors[box] * w[:, None]).sum(axis=0) / w.sum())
+    return palette
+
+
+def build_palette(color_counts, max_colors=256, exact=False, log=noop_log):
+    """An RGBA8 palette (N, 4) for the counted colors; entry 0 is transparent black.
+
+    Colors are kept as they are when they fit in ``max_colors`` entries.
+    Otherwise they are reduced with a count-weighted median cut; with
+    ``exact`` that only happens (with a warning) when more than 256 entries
+    would be needed, the limit of an indexed PNG.
+    """
+    max_colors = min(256, max(2, int(max_colors)))
+    colors = color_counts.colors[color_counts.colors != 0]
+    counts = color_counts.counts[color_counts.colors != 0]
+    limit = 256 if exact else max_colors
+    if len(colors) + 1 <= limit:
+        return np.concatenate((np.zeros((1, 4), dtype=np.uint8), unpack_rgba(colors)))
+    if exact:
+        log(f"[Voxelator] Warning: {len(colors)} distinct colors do not fit an exact palette; quantizing to 256")
+    quantized = _median_cut(unpack_rgba(colors).astype(np.int64), counts, limit - 1)
+    log(f"[Voxelator] Palette: quantized {len(colors)} colors to {len(quantized)}")
+    return np.concatenate((np.zeros((1, 4), dtype=np.uint8), quantized))
+
+
+def palette_indices(rgba, palette, block=4096):
+    """uint8 indices of the nearest ``palette`` entry for each RGBA8 pixel (exact matches first)."""
+    rgba = np.asarray(rgba, dtype=np.uint8)
+    unique, inverse = np.unique(pack_rgba(rgba), return_inverse=True)
+    packed_palette = pack_rgba(palette)
+    order = np.argsort(packed_palette, kind="stable")
+    pos = np.searchsorted(packed_palette[order], unique).clip(0, len(order) - 1)
+    lut = order[pos].astype(np.uint8)
+    missing = np.flatnonzero(packed_palette[order][pos] != unique)
+    if len(missing):
+        pal = palette[1:].astype(np.int32)
+        wanted = unpack_rgba(unique[missing]).astype(np.int32)
+        for start in range(0, len(missing), block):
+            diff = wanted[start:start + block, None, :] - pal[None, :, :]
+            lut[missing[start:start + block]] = 1 + np.einsum("ijk,ijk->ij", diff, diff).argmin(axis=1)
+    return lut[inverse.ravel()].reshape(rgba.shape[:-1])
+
+
+class AnimationSheetWriter:
+    """Stream an animation spritesheet to PNG one frame at a time.
+
+    Frames are placed by a ``SheetLayout`` (by default one row of ``dz``
+    slice tiles per frame as drawn by ``render_frame_band``, frame 0 at the
+    top). Pixels are encoded as soon as a full row of frame cells is
+    available, so at most ``frame_columns`` cells are held in memory. Cells
+    are also kept in a temporary spool file so that frames whose voxel
+    fingerprint was already seen (or ``repeat_frame``) can reuse them
+    without rendering again.
+    """
+
+    def __init__(self, path, tile_size, dz, frame_count, compress_level=6, filter_name="none", layout=None, log=noop_log):
+        self.layout = layout or SheetLayout(tile_size, dz, frame_count)
+        self.tile = self.layout.tile
+        self.width = self.layout.width
+        self.frame_count = int(frame_count)
+        self.log = log
+        self.rows = []
+        self.reused = 0
+        self._cell_shape = (self.layout.cell_height, self.layout.cell_width, 4)
+        self._cell_bytes = self.layout.cell_height * self.layout.cell_width * 4
+        self._row_for_key = {}
+        self._band_cells = []
+        self._spool = tempfile.TemporaryFile(prefix="voxelator_rows_")
+        self._png = self._open_png(path, compress_level, filter_name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._spool.close()
+            self._png.abort()
+
+    def _open_png(self, path, compress_level, filter_name):
+        return PNGStreamWriter(path, self.layout.width, self.layout.height, compress_level=compress_level, filter_name=filter_name)
+
+    def _read_cell(self, offset):
+        self._spool.seek(offset)
+        return np.frombuffer(self._spool.read(self._cell_bytes), dtype=np.uint8).reshape(self._cell_shape)
+
+    def _place(self, cell):
+        self._band_cells.append(cell)
+        if len(self._band_cells) == self.layout.frame_columns:
+            self._flush_band()
+
+    def _flush_band(self):
+        cells, self._band_cells = self._band_cells, []
+        if not cells:
+            return
+        if len(cells) == 1 and cells[0].shape[1] == self.layout.width:
+            self._png.write_rows(cells[0])
+            return
+        band = np.zeros((cells[0].shape[0], self.layout.width) + cells[0].shape[2:], dtype=np.uint8)
+        for i, cell in enumerate(cells):
+            x = i * self.layout.cell_width
+            band[:, x:x + self.layout.cell_width] = cell
+        self._png.write_rows(band)
+
+    def _finish_png(self):
+        self._flush_band()
+        pad_rows = self.layout.height - self._png.rows_written
+        if pad_rows > 0:
+            blank = np.zeros((min(pad_rows, self.layout.cell_height), self.layout.width * self._png.bpp), dtype=np.uint8)
+            while pad_rows > 0:
+                self._png.write_rows(blank[:pad_rows])
+                pad_rows -= len(blank)
+        self._png.close()
+
+    def _new_cell(self, offset, cell):
+        self._place(cell)
+
+    def _reuse(self, offset):
+        self._place(self._read_cell(offset))
+        self.rows.append(offset)
+        self.reused += 1
+        self.log(f"[Voxelator] Animation row {len(self.rows)}/{self.frame_count} (reused)")
+
+    def add_frame(self, voxels):
+        key = voxels.fingerprint()
+        offset = self._row_for_key.get(key)
+        if offset is not None:
+            self._reuse(offset)
+            return
+        cell = self.layout.arrange(float_to_byte(render_frame_band(voxels, self.tile)))
+        offset = self._row_for_key[key] = self._spool.seek(0, os.SEEK_END)
+        self._spool.write(cell.tobytes())
+        self._new_cell(offset, cell)
+        self.rows.append(offset)
+        self.log(f"[Voxelator] Animation row {len(self.rows)}/{self.frame_count}")
+
+    def repeat_frame(self, index):
+        self._reuse(self.rows[index])
+
+    def close(self):
+        try:
+            self._finish_png()
+        finally:
+            self._spool.close()
+        self.log(f"[Voxelator] Animation rows: rendered={len(self._row_for_key)} reused={self.reused}")
+
+
+class IndexedSheetWriter(AnimationSheetWriter):
+    """``AnimationSheetWriter`` variant that writes an indexed-color PNG.
+
+    An indexed PNG needs its palette before any pixel data, so frame cells
+    are only spooled while frames are added and ``color_counts`` tallies
+    their colors. After ``close()``, build a palette (``build_palette``,
+    possibly from the merged counts of several sheets) and call
+    ``encode(palette)`` to write the file.
+    """
+
+    def _open_png(self, path, compress_level, filter_name):
+        self.path = path
+        self.compress_level = compress_level
+        self.filter_name = filter_name
+        self.color_counts = ColorCounts()
+        self._cell_counts = {}
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _new_cell(self, offset, cell):
+        counts = ColorCounts()
+        counts.add(cell)
+        self._cell_counts[offset] = counts
+        self.color_counts.update(counts)
+
+    def _reuse(self, offset):
+        self.color_counts.update(self._cell_counts[offset])
+        self.rows.append(offset)
+        self.reused += 1
+        self.log(f"[Voxelator] Animation row {len(self.rows)}/{self.frame_count} (reused)")
+
+    def close(self):
+        self.log(f"[Voxelator] Animation rows: rendered={len(self._row_for_key)} reused={self.reused} colors={len(self.color_counts)}")
+
+    def abort(self):
+        self._spool.close()
+
+    def encode(self, palette):
+        self._png = PNGStreamWriter(self.path, self.layout.width, self.layout.height, compress_level=self.compress_level, filter_name=self.filter_name, palette=palette)
+        try:
+            for offset in self.rows:
+                self._place(palette_indices(self._read_cell(offset), palette))
+            self._finish_png()
+        except BaseException:
+            self._png.abort()
+            raise
+        finally:
+            self._spool.close()
+        self.log(f"[Voxelator] Indexed spritesheet: {self.path} palette={len(palette)}")
+
+
+_FACE_DEFS = (
+    ((1, 0, 0), ((1, -1, -1), (1, -1, 1), (1, 1, 1), (1, 1, -1))),
+    ((-1, 0, 0), ((-1, -1, -1), (-1, 1, -1), (-1, 1, 1), (-1, -1, 1))),
+    ((0, 1, 0), ((-1, 1, -1), (1, 1, -1), (1, 1, 1), (-1, 1, 1))),
+    ((0, -1, 0), ((-1, -1, -1), (-1, -1, 1), (1, -1, 1), (1, -1, -1))),
+    ((0, 0, 1), ((-1, -1, 1), (-1, 1, 1), (1, 1, 1), (1, -1, 1))),
+    ((0, 0, -1), ((-1, -1, -1), (1, -1, -1), (1, 1, -1), (-1, 1, -1))),
+)
+
+
+def build_voxel_mesh_data(voxels, separate_cubes):
+    """Build cube geometry for the occupied cells of ``voxels``.
+
+    Returns ``(verts, faces, face_cells)`` as arrays: (V, 3) float positions,
+    (F, 4) vertex indices and, per face, the index of its voxel in the packed
+    attribute arrays. Faces between neighbouring cells are culled unless
+    ``separate_cubes`` is set. Order matches iterating sorted cells and the
+    six face directions in ``_FACE_DEFS`` order.
+    """
+    spec = voxels.spec
+    ox, oy, oz = spec.origin
+    half = 0.5 * spec.cell_len
+    occ = voxels.occupancy != EMPTY
+    coords = voxels.cell_coords()
+    n = len(coords)
+
+    exposed = np.ones((n, len(_FACE_DEFS)), dtype=bool)
+    if not separate_cubes:
+        padded = np.pad(occ, 1)
+        for fi, (normal, _) in enumerate(_FACE_DEFS):
+            nx, ny, nz = normal
+            exposed[:, fi] = ~padded[coords[:, 0] + 1 + nx, coords[:, 1] + 1 + ny, coords[:, 2] + 1 + nz]
+
+    face_cells, face_dirs = np.nonzero(exposed)
+    corners = np.array([c for _, c in _FACE_DEFS], dtype=np.int64)
+    keys = 2 * coords[face_cells][:, None, :] + corners[face_dirs]
+    keys = keys.reshape(-1, 3)
+
+    if separate_cubes:
+        lattice = keys
+        faces = np.arange(len(keys), dtype=np.int64).reshape(-1, 4)
+    else:
+        lattice, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        order = np.argsort(first, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        lattice = lattice[order]
+        faces = rank[inverse.reshape(-1)].reshape(-1, 4)
+
+    verts = np.empty((len(lattice), 3), dtype=np.float64)
+    verts[:, 0] = ox + lattice[:, 0] * half
+    verts[:, 1] = oy + lattice[:, 1] * half
+    verts[:, 2] = oz + lattice[:, 2] * half
+    return verts, faces, face_cells
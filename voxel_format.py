@@ -0,0 +1,213 @@
+"""Compact binary voxel animation format (``.vxa``).
+
+A ``.vxa`` file holds the voxel colors of one or more frames on a shared
+grid, run-length encoded over palette indices. It is written frame by frame
+(see ``VoxelDataWriter``) and read back through a memory map, so any frame
+can be decoded without touching the others (see ``VoxelDataReader``).
+
+Layout (little-endian)::
+
+    header   magic "VOXA", version u16, reserved u16,
+             dx dy dz u32, cell_len f64, grid_min 3 x f64,
+             footer_offset u64, frame_count u32, palette_size u32
+    frames   per unique frame: runs u32[n], then values (u8/u16/u32)[n]
+    footer   palette u8[palette_size, 4] (RGBA), then the frame table:
+             per frame offset u64, run count u32, index width u8, 3 pad bytes
+
+Cells are flattened in C order (x, then y, then z fastest), the same order
+as ``VoxelGrid.cell_indices()``. Palette index 0 is reserved for empty cells
+(and occupied cells without a color, which the slices PNG omits as well).
+Frames with identical voxels share one payload through the frame table.
+"""
+
+import os
+import struct
+
+import numpy as np
+
+import voxel_core
+
+MAGIC = b"VOXA"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHIIIddddQII")
+_TABLE_DTYPE = np.dtype([("offset", "<u8"), ("runs", "<u4"), ("index_bytes", "u1"), ("pad", "V3")])
+_INDEX_DTYPES = {1: np.dtype("u1"), 2: np.dtype("<u2"), 4: np.dtype("<u4")}
+
+
+def _index_width(max_index):
+    if max_index <= 0xFF:
+        return 1
+    if max_index <= 0xFFFF:
+        return 2
+    return 4
+
+
+def rle_encode(values):
+    """Run-length encode a 1-D array into ``(runs, values)``."""
+    values = np.asarray(values).ravel()
+    if not len(values):
+        return np.zeros(0, dtype=np.uint32), values[:0]
+    starts = np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1))
+    runs = np.diff(np.append(starts, len(values))).astype(np.uint32)
+    return runs, values[starts]
+
+
+def rle_decode(runs, values):
+    return np.repeat(values, np.asarray(runs, dtype=np.int64))
+
+
+class Palette:
+    """Exact RGBA8 palette that grows as colors are added; index 0 is empty."""
+
+    def __init__(self):
+        self._index = {}
+        self._colors = [0]
+
+    def __len__(self):
+        return len(self._colors)
+
+    def indices(self, rgba):
+        """Palette indices (uint32) for (N, 4) uint8 colors, adding new ones."""
+        packed = voxel_core.pack_rgba(rgba)
+        unique, inverse = np.unique(packed, return_inverse=True)
+        lut = np.empty(len(unique), dtype=np.uint32)
+        for i, key in enumerate(unique.tolist()):
+            idx = self._index.get(key)
+            if idx is None:
+                idx = self._index[key] = len(self._colors)
+                self._colors.append(key)
+            lut[i] = idx
+        return lut[inverse.ravel()]
+
+    def colors(self):
+        """(palette_size, 4) uint8 RGBA; entry 0 is transparent black."""
+        return voxel_core.unpack_rgba(self._colors)
+
+
+def frame_palette_indices(voxels, palette):
+    """Dense (dx, dy, dz) palette-index grid for a colored ``VoxelGrid``."""
+    indices = np.zeros(voxels.spec.dx * voxels.spec.dy * voxels.spec.dz, dtype=np.uint32)
+    if voxels.material_index is None:
+        return indices.reshape(voxels.spec.dims)
+    colored = np.flatnonzero(voxels.material_index >= 0)
+    rgba = voxel_core.float_to_byte(voxels.colors[colored])
+    indices[voxels.cell_indices()[colored]] = palette.indices(rgba)
+    return indices.reshape(voxels.spec.dims)
+
+
+class VoxelDataWriter:
+    """Write a ``.vxa`` file one frame at a time.
+
+    ``add_frame(voxels)`` appends a frame (reusing the payload of an earlier
+    frame with the same voxel fingerprint); ``repeat_frame(index)`` repeats an
+    already written frame. The palette and frame table are written by
+    ``close()``. As a context manager, an exception removes the partial file.
+    """
+
+    def __init__(self, path, grid, log=voxel_core.noop_log):
+        self.path = path
+        self.grid = grid
+        self.log = log
+        self.palette = Palette()
+        self.table = []
+        self.reused = 0
+        self._entry_for_key = {}
+        self._file = open(path, "wb")
+        self._file.write(b"\0" * _HEADER.size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add_frame(self, voxels):
+        key = voxels.fingerprint()
+        entry = self._entry_for_key.get(key)
+        if entry is not None:
+            self.table.append(entry)
+            self.reused += 1
+            return
+        runs, values = rle_encode(frame_palette_indices(voxels, self.palette))
+        width = _index_width(int(values.max()) if len(values) else 0)
+        offset = self._file.tell()
+        self._file.write(runs.astype("<u4").tobytes())
+        self._file.write(values.astype(_INDEX_DTYPES[width]).tobytes())
+        entry = self._entry_for_key[key] = (offset, len(runs), width)
+        self.table.append(entry)
+
+    def repeat_frame(self, index):
+        self.table.append(self.table[index])
+        self.reused += 1
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self.path)
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            palette = self.palette.colors()
+            footer_offset = self._file.tell()
+            self._file.write(palette.tobytes())
+            table = np.zeros(len(self.table), dtype=_TABLE_DTYPE)
+            if self.table:
+                table["offset"], table["runs"], table["index_bytes"] = zip(*self.table)
+            self._file.write(table.tobytes())
+            g = self.grid
+            self._file.seek(0)
+            self._file.write(_HEADER.pack(MAGIC, VERSION, 0, g.dx, g.dy, g.dz, g.cell_len, *g.grid_min, footer_offset, len(self.table), len(palette)))
+        finally:
+            self._file.close()
+            self._file = None
+        self.log(f"[Voxelator] Voxel data: frames={len(self.table)} unique={len(self._entry_for_key)} palette={len(self.palette)} bytes={os.path.getsize(self.path)}")
+
+
+class VoxelDataReader:
+    """Memory-mapped reader for ``.vxa`` files.
+
+    ``grid`` is the ``GridSpec`` the frames were voxelized on and ``palette``
+    the (palette_size, 4) uint8 RGBA table. ``frame_indices(i)`` decodes one
+    frame to a (dx, dy, dz) palette-index array and ``frame_colors(i)`` to a
+    (dx, dy, dz, 4) uint8 RGBA array; only that frame's payload is read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        if len(self._data) < _HEADER.size:
+            raise ValueError(f"{path}: too small for a voxel data header")
+        (magic, version, _, dx, dy, dz, cell_len, gx, gy, gz,
+         footer_offset, frame_count, palette_size) = _HEADER.unpack(self._data[:_HEADER.size].tobytes())
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a voxel data file")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported voxel data version {version}")
+        self.grid = voxel_core.GridSpec(dx, dy, dz, cell_len, (gx, gy, gz))
+        self.frame_count = frame_count
+        table_offset = footer_offset + palette_size * 4
+        self.palette = self._data[footer_offset:table_offset].reshape(-1, 4)
+        self.table = self._data[table_offset:table_offset + frame_count * _TABLE_DTYPE.itemsize].view(_TABLE_DTYPE)
+
+    def __len__(self):
+        return self.frame_count
+
+    def frame_indices(self, index):
+        offset, runs, width, _ = self.table[index].tolist()
+        runs_end = offset + runs * 4
+        run_lengths = self._data[offset:runs_end].view("<u4")
+        values = self._data[runs_end:runs_end + runs * width].view(_INDEX_DTYPES[width])
+        return rle_decode(run_lengths, values).reshape(self.grid.dims)
+
+    def frame_colors(self, index):
+        return np.asarray(self.palette)[self.frame_indices(index)]
+
+    def close(self):
+        self._data = None
@@ -13,10 +13,21 @@ bl_info = {
 
 import bpy
 import os
+import sys
 import time
 import math
-from collections import deque
+import json
+import contextlib
+import multiprocessing
+import pickle
+import shutil
+import tempfile
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from mathutils import Vector, Matrix
+from mathutils.bvhtree import BVHTree
 from bpy.props import (
     IntProperty,
     BoolProperty,
@@ -30,8 +41,19 @@ from bpy.types import (
     PropertyGroup
 )
 
-LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "voxelator.log")
+_ADDON_DIR = os.path.dirname(os.path.abspath(__file__))
+if _ADDON_DIR not in sys.path:
+    sys.path.append(_ADDON_DIR)
+
+import voxel_core
+import voxel_format
+
+LOG_FILE = os.path.join(_ADDON_DIR, "voxelator.log")
 LOG_TO_STDOUT = False
+IMAGE_CACHE_MAX_MB = 1024
+SKINNING_TOLERANCE = 1e-4
+SKINNING_CHECK_SAMPLES = 16
+FRAMES_PER_WORKER_JOB = 4
 
 def _log(msg):
     try:
@@ -91,391 +113,362 @@ def _get_material_color_source(mat, mat_source_cache):
     mat_source_cache[mat.name] = source
     return source
 
-def _sample_image_bilinear(image, uv, image_cache):
-    img_key = image.name
-    cached = image_cache.get(img_key)
-    if cached is None:
+def _material_sources(materials, mat_source_cache):
+    sources = []
+    images = {}
+    for mat in materials:
+        if not mat:
+            sources.append(None)
+            continue
+        source = _get_material_color_source(mat, mat_source_cache)
+        if source[0] == "image":
+            images[source[1].name_full] = source[1]
+            source = ("image", source[1].name_full, source[2])
+        sources.append(source)
+    return sources, images
+
+# Decoded image pixels shared across frames, actions and operator runs. Keys
+# include the image state that changes with its pixels so edited or reloaded
+# images are decoded again; least recently used entries go past max_bytes.
+class _ImageCache:
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.unsaved = set()
+
+    @staticmethod
+    def _key(image):
+        return (
+            getattr(image, "session_uid", 0),
+            image.name_full,
+            tuple(image.size),
+            image.source,
+            image.filepath_raw,
+            bool(image.is_dirty),
+            image.colorspace_settings.name,
+        )
+
+    def stats(self):
+        return f"hits={self.hits} misses={self.misses} evictions={self.evictions} entries={len(self.entries)} bytes={self.total_bytes}"
+
+    def drop_unsaved(self):
+        # is_dirty stays True after the first edit, so later paint strokes do
+        # not change the key; pixels of unsaved images only live for one run.
+        for key in self.unsaved:
+            pixels = self.entries.pop(key, None)
+            self.total_bytes -= pixels.nbytes if pixels is not None else 0
+        self.unsaved.clear()
+
+    def pixels(self, image):
+        key = self._key(image)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+        self.misses += 1
         w = int(image.size[0])
         h = int(image.size[1])
-        if w <= 0 or h <= 0:
-            return None
-        pixels = tuple(image.pixels[:])
-        cached = (w, h, pixels)
-        image_cache[img_key] = cached
-
-    w, h, pixels = cached
-    u = uv[0] % 1.0
-    v = uv[1] % 1.0
-
-    x = u * (w - 1)
-    y = v * (h - 1)
-    x0 = int(math.floor(x))
-    y0 = int(math.floor(y))
-    x1 = min(x0 + 1, w - 1)
-    y1 = min(y0 + 1, h - 1)
-    tx = x - x0
-    ty = y - y0
-
-    def px(ix, iy):
-        idx = (iy * w + ix) * 4
-        return (pixels[idx], pixels[idx + 1], pixels[idx + 2], pixels[idx + 3])
-
-    c00 = px(x0, y0)
-    c10 = px(x1, y0)
-    c01 = px(x0, y1)
-    c11 = px(x1, y1)
-
-    out = [0.0, 0.0, 0.0, 0.0]
-    for i in range(4):
-        a = c00[i] * (1.0 - tx) + c10[i] * tx
-        b = c01[i] * (1.0 - tx) + c11[i] * tx
-        out[i] = a * (1.0 - ty) + b * ty
-    return tuple(out)
-
-def _estimate_face_uv(location_local, poly, uv_data, loops, verts):
-    sum_u = 0.0
-    sum_v = 0.0
-    sum_w = 0.0
-    eps = 1e-8
-    for li in poly.loop_indices:
-        vi = loops[li].vertex_index
-        vco = verts[vi].co
-        d = (location_local - vco).length
-        w = 1.0 / max(d, eps)
-        luv = uv_data[li].uv
-        sum_u += luv.x * w
-        sum_v += luv.y * w
-        sum_w += w
-
-    if sum_w <= eps:
-        first_uv = uv_data[poly.loop_indices[0]].uv
-        return (float(first_uv.x), float(first_uv.y))
-    return (sum_u / sum_w, sum_v / sum_w)
-
-def _build_layer_color_map(dx, dy, dz, cube_color_map):
-    layers = [{} for _ in range(dz)]
-    for (ix, iy, iz), color in cube_color_map.items():
-        if 0 <= ix < dx and 0 <= iy < dy and 0 <= iz < dz and color:
-            layers[iz][(ix, iy)] = color
-    return layers
-
-def _render_layers_into_pixels(px, width, height, layers, dx, dy, dz, tile_size=None, row_count=1, row_index=0, align_left=False):
-    tile = int(tile_size) if tile_size is not None else max(dx, dy)
-    off_x = 0 if align_left else (tile - dx) // 2
-    off_y = (tile - dy) // 2
-    row_bottom = row_index * tile
-    step_z = max(1, dz // 10)
-
-    for z in range(dz):
-        x0 = z * tile
-        for (ix, iy), color in layers[z].items():
-            px_x = x0 + off_x + ix
-            px_y = row_bottom + off_y + iy
-            if 0 <= px_x < width and 0 <= px_y < height:
-                idx = ((height - 1 - px_y) * width + px_x) * 4
-                px[idx] = color[0]
-                px[idx + 1] = color[1]
-                px[idx + 2] = color[2]
-                px[idx + 3] = color[3] if len(color) > 3 else 1.0
-        if row_count == 1 and (((z + 1) % step_z) == 0 or (z + 1) == dz):
-            _log(f"[Voxelator] Spritesheet fill {z+1}/{dz}")
-
-def _save_voxel_spritesheet(dx, dy, dz, filepath, cube_color_map, tile_size):
-    layers = _build_layer_color_map(dx, dy, dz, cube_color_map)
-
-    cube_count = len(cube_color_map)
+        pixels = None
+        if w > 0 and h > 0:
+            pixels = np.empty(w * h * 4, dtype=np.float32)
+            image.pixels.foreach_get(pixels)
+            pixels = pixels.reshape(h, w, 4)
+
+        size = pixels.nbytes if pixels is not None else 0
+        if size > self.max_bytes:
+            _log(f"[Voxelator] Image '{image.name}' ({size} bytes) exceeds image cache limit; not cached")
+            return pixels
+
+        self.entries[key] = pixels
+        self.total_bytes += size
+        if image.is_dirty:
+            self.unsaved.add(key)
+        while self.total_bytes > self.max_bytes and self.entries:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.nbytes if evicted is not None else 0
+            self.unsaved.discard(evicted_key)
+            self.evictions += 1
+        return pixels
+
+_IMAGE_CACHE = _ImageCache(IMAGE_CACHE_MAX_MB << 20)
+
+def _mesh_triangle_uvs(mesh):
+    uv_layer = mesh.uv_layers.active
+    if uv_layer is None or not len(mesh.loops):
+        return None
+    loop_uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    uv_layer.data.foreach_get("uv", loop_uvs)
+    tri_loops = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("loops", tri_loops)
+    return loop_uvs.reshape(-1, 2)[tri_loops.reshape(-1, 3)]
+
+def _save_voxel_spritesheet(voxels, filepath, tile_size, backend='DIRECT', compress_level=6, filter_name="none", palette_mode='NONE', palette_colors=256, slice_columns=0, pad_pow2=False):
+    dx, dy, dz = voxels.spec.dims
+    cube_count = voxels.colored_count
     _log(f"[Voxelator] Building spritesheet from {cube_count} cubes; grid: {dx} {dy} {dz}")
 
     tile = max(1, int(tile_size))
     if dx > tile or dy > tile:
         _log(f"[Voxelator] Warning: grid {dx}x{dy} exceeds tile {tile} and may clip")
-    width = tile * dz
-    height = tile
     abs_path = bpy.path.abspath(filepath)
     base = os.path.splitext(os.path.basename(abs_path))[0]
+    layout = voxel_core.SheetLayout(tile, dz, 1, slice_columns=slice_columns, pow2=pad_pow2)
+    _log(f"[Voxelator] Spritesheet dimensions: {layout.width} x {layout.height}")
+    if slice_columns > 0 or pad_pow2:
+        metadata_path = _write_sheet_metadata(abs_path, {"image": os.path.basename(abs_path), "tile_size": tile, "grid": [int(d) for d in voxels.spec.dims], "cell_len": float(voxels.spec.cell_len), "layout": layout.to_dict()})
+        _log(f"[Voxelator] Saved spritesheet layout: {metadata_path}")
+    if palette_mode != 'NONE' and backend != 'DIRECT':
+        _log("[Voxelator] Warning: indexed palettes need the direct PNG backend; writing RGBA")
+    if backend == 'DIRECT':
+        band = voxel_core.float_to_byte(voxel_core.render_frame_band(voxels, tile))
+        sheet = layout.compose([layout.arrange(band)])
+        if palette_mode != 'NONE':
+            counts = voxel_core.ColorCounts()
+            counts.add(sheet)
+            palette = voxel_core.build_palette(counts, palette_colors, exact=palette_mode == 'EXACT', log=_log)
+            voxel_core.write_png(abs_path, voxel_core.palette_indices(sheet, palette), compress_level=compress_level, filter_name=filter_name, palette=palette)
+            _log(f"[Voxelator] Saved indexed spritesheet: {abs_path} palette={len(palette)}")
+            return
+        voxel_core.write_png(abs_path, sheet, compress_level=compress_level, filter_name=filter_name)
+        _log(f"[Voxelator] Saved spritesheet: {abs_path} (direct, compression={compress_level} filter={filter_name})")
+        return
+
+    width, height, px = voxel_core.render_spritesheet_pixels(voxels, tile, log=_log, layout=layout)
     img = bpy.data.images.new(f"voxel_slices_{base}", width=width, height=height, alpha=True, float_buffer=False)
-    px = [0.0] * (width * height * 4)
-    _log(f"[Voxelator] Spritesheet dimensions: {width} x {height}")
-    _render_layers_into_pixels(px, width, height, layers, dx, dy, dz, tile_size=tile)
-    img.pixels = px
-    img.filepath_raw = abs_path
-    img.file_format = 'PNG'
-    img.save()
+    try:
+        img.pixels.foreach_set(px)
+        img.filepath_raw = abs_path
+        img.file_format = 'PNG'
+        img.save()
+    finally:
+        bpy.data.images.remove(img)
     _log(f"[Voxelator] Saved spritesheet: {abs_path}")
 
-def _save_voxel_animation_spritesheet(frame_color_maps, dx, dy, dz, filepath, tile_size):
-    frame_count = len(frame_color_maps)
+def _open_animation_spritesheet(filepath, grid, tile_size, frame_count, compress_level=6, filter_name="none", indexed=False, slice_columns=0, frame_columns=1, pad_pow2=False):
+    dx, dy, dz = grid.dims
     tile = max(1, int(tile_size))
     if dx > tile or dy > tile:
         _log(f"[Voxelator] Warning: grid {dx}x{dy} exceeds tile {tile} and may clip")
-    width = tile * dz
-    height = tile * frame_count
     abs_path = bpy.path.abspath(filepath)
-    base = os.path.splitext(os.path.basename(abs_path))[0]
-    img = bpy.data.images.new(f"voxel_anim_slices_{base}", width=width, height=height, alpha=True, float_buffer=False)
-    px = [0.0] * (width * height * 4)
-
-    _log(f"[Voxelator] Building animation spritesheet frames={frame_count} grid={dx} {dy} {dz}")
-    _log(f"[Voxelator] Animation spritesheet dimensions: {width} x {height}")
-
-    for i, cube_color_map in enumerate(frame_color_maps):
-        layers = _build_layer_color_map(dx, dy, dz, cube_color_map)
-        _render_layers_into_pixels(px, width, height, layers, dx, dy, dz, tile_size=tile, row_count=frame_count, row_index=i, align_left=False)
-        _log(f"[Voxelator] Animation row {i+1}/{frame_count}")
-
-    img.pixels = px
-    img.filepath_raw = abs_path
-    img.file_format = 'PNG'
-    img.save()
-    _log(f"[Voxelator] Saved animation spritesheet: {abs_path}")
-
-def _plane_box_overlap(normal, vert, maxbox):
-    nx, ny, nz = normal
-    vx, vy, vz = vert
-    mx, my, mz = maxbox
-
-    if nx > 0.0:
-        vmin_x = -mx - vx
-        vmax_x = mx - vx
-    else:
-        vmin_x = mx - vx
-        vmax_x = -mx - vx
-
-    if ny > 0.0:
-        vmin_y = -my - vy
-        vmax_y = my - vy
-    else:
-        vmin_y = my - vy
-        vmax_y = -my - vy
-
-    if nz > 0.0:
-        vmin_z = -mz - vz
-        vmax_z = mz - vz
-    else:
-        vmin_z = mz - vz
-        vmax_z = -mz - vz
-
-    if (nx * vmin_x + ny * vmin_y + nz * vmin_z) > 0.0:
-        return False
-    if (nx * vmax_x + ny * vmax_y + nz * vmax_z) >= 0.0:
-        return True
-    return False
-
-def _tri_box_overlap(center, half_size, tri):
-    cx, cy, cz = center
-    hx, hy, hz = half_size
-    (ax, ay, az), (bx, by, bz), (cx2, cy2, cz2) = tri
-
-    v0x = ax - cx
-    v0y = ay - cy
-    v0z = az - cz
-    v1x = bx - cx
-    v1y = by - cy
-    v1z = bz - cz
-    v2x = cx2 - cx
-    v2y = cy2 - cy
-    v2z = cz2 - cz
-
-    e0x = v1x - v0x
-    e0y = v1y - v0y
-    e0z = v1z - v0z
-    e1x = v2x - v1x
-    e1y = v2y - v1y
-    e1z = v2z - v1z
-    e2x = v0x - v2x
-    e2y = v0y - v2y
-    e2z = v0z - v2z
-
-    def axis_test(axv, ayv, azv):
-        p0 = axv * v0x + ayv * v0y + azv * v0z
-        p1 = axv * v1x + ayv * v1y + azv * v1z
-        p2 = axv * v2x + ayv * v2y + azv * v2z
-        min_p = min(p0, p1, p2)
-        max_p = max(p0, p1, p2)
-        rad = hx * abs(axv) + hy * abs(ayv) + hz * abs(azv)
-        return not (min_p > rad or max_p < -rad)
-
-    axes = (
-        (0.0, -e0z, e0y), (e0z, 0.0, -e0x), (-e0y, e0x, 0.0),
-        (0.0, -e1z, e1y), (e1z, 0.0, -e1x), (-e1y, e1x, 0.0),
-        (0.0, -e2z, e2y), (e2z, 0.0, -e2x), (-e2y, e2x, 0.0),
-    )
-    for axv, ayv, azv in axes:
-        if not axis_test(axv, ayv, azv):
-            return False
-
-    min_x = min(v0x, v1x, v2x)
-    max_x = max(v0x, v1x, v2x)
-    if min_x > hx or max_x < -hx:
-        return False
-
-    min_y = min(v0y, v1y, v2y)
-    max_y = max(v0y, v1y, v2y)
-    if min_y > hy or max_y < -hy:
-        return False
-
-    min_z = min(v0z, v1z, v2z)
-    max_z = max(v0z, v1z, v2z)
-    if min_z > hz or max_z < -hz:
-        return False
 
-    nx = e0y * e1z - e0z * e1y
-    ny = e0z * e1x - e0x * e1z
-    nz = e0x * e1y - e0y * e1x
-    if not _plane_box_overlap((nx, ny, nz), (v0x, v0y, v0z), (hx, hy, hz)):
-        return False
-
-    return True
+    layout = voxel_core.SheetLayout(tile, dz, frame_count, slice_columns=slice_columns, frame_columns=frame_columns, pow2=pad_pow2)
 
-def _flood_fill_outside(dx, dy, dz, shell):
-    outside = set()
-    q = deque()
-
-    def try_push(ix, iy, iz):
-        cell = (ix, iy, iz)
-        if cell in shell or cell in outside:
-            return
-        outside.add(cell)
-        q.append(cell)
-
-    for ix in range(dx):
-        for iy in range(dy):
-            try_push(ix, iy, 0)
-            try_push(ix, iy, dz - 1)
-    for ix in range(dx):
-        for iz in range(dz):
-            try_push(ix, 0, iz)
-            try_push(ix, dy - 1, iz)
-    for iy in range(dy):
-        for iz in range(dz):
-            try_push(0, iy, iz)
-            try_push(dx - 1, iy, iz)
-
-    neigh = ((1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1))
-    while q:
-        ix, iy, iz = q.popleft()
-        for nx, ny, nz in neigh:
-            tx = ix + nx
-            ty = iy + ny
-            tz = iz + nz
-            if 0 <= tx < dx and 0 <= ty < dy and 0 <= tz < dz:
-                cell = (tx, ty, tz)
-                if cell not in shell and cell not in outside:
-                    outside.add(cell)
-                    q.append(cell)
-
-    return outside
-
-def _build_occupied_cells_from_mesh(mesh, matrix_world, cell_len, grid_min_x, grid_min_y, grid_min_z, dx, dy, dz, fill_volume):
+    _log(f"[Voxelator] Building animation spritesheet frames={frame_count} grid={dx} {dy} {dz}")
+    _log(f"[Voxelator] Animation spritesheet dimensions: {layout.width} x {layout.height} (slices {layout.slice_columns}x{layout.slice_rows}, frames {layout.frame_columns}x{layout.frame_rows})")
+    writer = voxel_core.IndexedSheetWriter if indexed else voxel_core.AnimationSheetWriter
+    return writer(abs_path, tile, dz, frame_count, compress_level=compress_level, filter_name=filter_name, layout=layout, log=_log)
+
+def _write_sheet_metadata(png_path, metadata):
+    path = os.path.splitext(bpy.path.abspath(png_path))[0] + ".json"
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(metadata, fh, indent=2)
+    return path
+
+def _write_animation_metadata(png_path, action, frames, grid, layout, sampling, rotation_deg, palette=None):
+    frame_end = int(math.ceil(action.frame_range[1]))
+    ends = list(frames[1:]) + [max(frame_end, frames[-1] + 1)]
+    metadata = {
+        "image": os.path.basename(png_path),
+        "action": action.name,
+        "frame_range": [int(math.floor(action.frame_range[0])), frame_end],
+        "sampling": sampling,
+        "rotation_deg": float(rotation_deg),
+        "frames": [int(frame) for frame in frames],
+        "durations": [int(end - frame) for frame, end in zip(frames, ends)],
+        "tile_size": layout.tile,
+        "grid": [int(d) for d in grid.dims],
+        "cell_len": float(grid.cell_len),
+        "layout": layout.to_dict(),
+    }
+    if palette is not None:
+        metadata["palette"] = palette.tolist()
+    return _write_sheet_metadata(png_path, metadata)
+
+def _open_voxel_data(png_path, grid):
+    path = os.path.splitext(bpy.path.abspath(png_path))[0] + ".vxa"
+    _log(f"[Voxelator] Saving voxel data to: {path}")
+    return voxel_format.VoxelDataWriter(path, grid, log=_log)
+
+def _mesh_vertex_array(mesh, matrix_world):
+    co = np.zeros(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    return voxel_core.transform_points(co, matrix_world)
+
+def _mesh_triangle_array(mesh):
     mesh.calc_loop_triangles()
-    verts_w = [matrix_world @ v.co for v in mesh.vertices]
-
-    half = 0.5 * cell_len
-    shell = set()
     tris = mesh.loop_triangles
-    total_tris = len(tris)
-    step = max(1, total_tris // 10) if total_tris else 1
-
-    for ti, tri in enumerate(tris):
-        a = verts_w[tri.vertices[0]]
-        b = verts_w[tri.vertices[1]]
-        c = verts_w[tri.vertices[2]]
-        tri_pts = ((a.x, a.y, a.z), (b.x, b.y, b.z), (c.x, c.y, c.z))
-
-        min_x = min(a.x, b.x, c.x)
-        min_y = min(a.y, b.y, c.y)
-        min_z = min(a.z, b.z, c.z)
-        max_x = max(a.x, b.x, c.x)
-        max_y = max(a.y, b.y, c.y)
-        max_z = max(a.z, b.z, c.z)
-
-        ix0 = max(0, int(math.floor((min_x - grid_min_x) / cell_len)) - 1)
-        iy0 = max(0, int(math.floor((min_y - grid_min_y) / cell_len)) - 1)
-        iz0 = max(0, int(math.floor((min_z - grid_min_z) / cell_len)) - 1)
-        ix1 = min(dx - 1, int(math.floor((max_x - grid_min_x) / cell_len)) + 1)
-        iy1 = min(dy - 1, int(math.floor((max_y - grid_min_y) / cell_len)) + 1)
-        iz1 = min(dz - 1, int(math.floor((max_z - grid_min_z) / cell_len)) + 1)
-
-        if ix1 < ix0 or iy1 < iy0 or iz1 < iz0:
-            continue
-
-        for ix in range(ix0, ix1 + 1):
-            cx = grid_min_x + (ix + 0.5) * cell_len
-            for iy in range(iy0, iy1 + 1):
-                cy = grid_min_y + (iy + 0.5) * cell_len
-                for iz in range(iz0, iz1 + 1):
-                    cz = grid_min_z + (iz + 0.5) * cell_len
-                    if _tri_box_overlap((cx, cy, cz), (half, half, half), tri_pts):
-                        shell.add((ix, iy, iz))
-
-        if ((ti + 1) % step) == 0 or (ti + 1) == total_tris:
-            _log(f"[Voxelator] Surface voxelize {ti+1}/{total_tris}")
-
-    if not fill_volume:
-        return shell
-
-    outside = _flood_fill_outside(dx, dy, dz, shell)
-    occupied = set(shell)
-    for ix in range(dx):
-        for iy in range(dy):
-            for iz in range(dz):
-                cell = (ix, iy, iz)
-                if cell not in outside:
-                    occupied.add(cell)
-    _log(f"[Voxelator] Volume fill: shell={len(shell)} outside={len(outside)} total={len(occupied)}")
-    return occupied
-
-def _build_voxel_mesh_data(occupied_cells, ox, oy, oz, cell_len, separate_cubes):
-    face_defs = (
-        ((1, 0, 0), ((1, -1, -1), (1, -1, 1), (1, 1, 1), (1, 1, -1))),
-        ((-1, 0, 0), ((-1, -1, -1), (-1, 1, -1), (-1, 1, 1), (-1, -1, 1))),
-        ((0, 1, 0), ((-1, 1, -1), (1, 1, -1), (1, 1, 1), (-1, 1, 1))),
-        ((0, -1, 0), ((-1, -1, -1), (-1, -1, 1), (1, -1, 1), (1, -1, -1))),
-        ((0, 0, 1), ((-1, -1, 1), (-1, 1, 1), (1, 1, 1), (1, -1, 1))),
-        ((0, 0, -1), ((-1, -1, -1), (1, -1, -1), (1, 1, -1), (-1, 1, -1))),
-    )
+    tri_verts = np.zeros(len(tris) * 3, dtype=np.int32)
+    tris.foreach_get("vertices", tri_verts)
+    return tri_verts.reshape(-1, 3)
+
+def _mesh_from_voxel_buffers(name, verts, faces):
+    mesh = bpy.data.meshes.new(name)
+    n_faces = len(faces)
+    mesh.vertices.add(len(verts))
+    mesh.loops.add(n_faces * 4)
+    mesh.polygons.add(n_faces)
+    mesh.vertices.foreach_set("co", np.ascontiguousarray(verts, dtype=np.float32).reshape(-1))
+    mesh.loops.foreach_set("vertex_index", np.ascontiguousarray(faces, dtype=np.int32).reshape(-1))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, n_faces * 4, 4, dtype=np.int32))
+    mesh.update(calc_edges=True)
+    return mesh
+
+def _mesh_frame_geometry(mesh, matrix_world):
+    tri_verts = _mesh_triangle_array(mesh)
+    tri_poly = np.zeros(len(tri_verts), dtype=np.int32)
+    mesh.loop_triangles.foreach_get("polygon_index", tri_poly)
+    poly_mat = np.zeros(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", poly_mat)
+    geometry = {
+        "verts": _mesh_vertex_array(mesh, matrix_world),
+        "tri_verts": tri_verts,
+        "tri_mat": poly_mat[tri_poly],
+    }
+    tri_uvs = _mesh_triangle_uvs(mesh)
+    if tri_uvs is not None:
+        geometry["tri_uvs"] = tri_uvs
+    return geometry
+
+def _armature_skinning_modifier(source):
+    if source.type != 'MESH':
+        return None, "not a mesh"
+    if source.data.shape_keys and len(source.data.shape_keys.key_blocks):
+        return None, "mesh has shape keys"
+    active = [mod for mod in source.modifiers if mod.show_viewport]
+    if len(active) != 1 or active[0].type != 'ARMATURE':
+        return None, "modifier stack is not a single armature modifier: " + ", ".join(mod.type for mod in active)
+    mod = active[0]
+    if not mod.object or mod.object.type != 'ARMATURE':
+        return None, "armature modifier has no armature object"
+    if not mod.use_vertex_groups or mod.use_bone_envelopes or mod.use_deform_preserve_volume or mod.use_multi_modifier or mod.vertex_group:
+        return None, "armature modifier uses envelopes, preserve volume, multi-modifier or a vertex group mask"
+    bbones = [bone.name for bone in mod.object.data.bones if bone.use_deform and bone.bbone_segments > 1]
+    if bbones:
+        return None, "deform bones use B-Bone segments: " + ", ".join(bbones[:5])
+    return mod, ""
+
+class _ArmatureSkinner:
+    def __init__(self, source, modifier):
+        self.source = source
+        self.modifier = modifier
+        self.armature = modifier.object
+        mesh = source.data
+
+        bones = [bone for bone in self.armature.data.bones if bone.use_deform]
+        self.bone_names = [bone.name for bone in bones]
+        self.bone_rest_inv = [bone.matrix_local.inverted() for bone in bones]
+        bone_lookup = {name: i for i, name in enumerate(self.bone_names)}
+        group_bone = [bone_lookup.get(vg.name, -1) for vg in source.vertex_groups]
+
+        n_verts = len(mesh.vertices)
+        self.rest_co = np.zeros(n_verts * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", self.rest_co)
+        max_groups = max((len(v.groups) for v in mesh.vertices), default=0)
+        self.bone_index = np.full((n_verts, max(1, max_groups)), -1, dtype=np.int32)
+        self.weights = np.zeros((n_verts, max(1, max_groups)), dtype=np.float64)
+        for vi, v in enumerate(mesh.vertices):
+            for k, g in enumerate(v.groups):
+                bone = group_bone[g.group] if g.group < len(group_bone) else -1
+                if bone >= 0:
+                    self.bone_index[vi, k] = bone
+                    self.weights[vi, k] = g.weight
+
+        self.topology = _mesh_frame_geometry(mesh, Matrix.Identity(4))
+        del self.topology["verts"]
+
+    def bone_matrices(self):
+        premat = self.armature.matrix_world.inverted() @ self.source.matrix_world
+        postmat = premat.inverted()
+        pose_bones = self.armature.pose.bones
+        return np.array([postmat @ pose_bones[name].matrix @ rest_inv @ premat for name, rest_inv in zip(self.bone_names, self.bone_rest_inv)], dtype=np.float64)
+
+    def pose_displacement(self):
+        co = voxel_core.skin_vertices(self.rest_co, self.bone_index, self.weights, self.bone_matrices())
+        return voxel_core.vertex_displacement(self.rest_co.reshape(-1, 3), co)
+
+    def frame_geometry(self, matrix_world):
+        co = voxel_core.skin_vertices(self.rest_co, self.bone_index, self.weights, self.bone_matrices())
+        geometry = dict(self.topology)
+        geometry["verts"] = voxel_core.transform_points(co, matrix_world)
+        return geometry
+
+def _setup_fast_skinning(source):
+    mod, reason = _armature_skinning_modifier(source)
+    if mod is None:
+        _log(f"[Voxelator] Fast skinning unavailable ({reason}); evaluating frames through the depsgraph")
+        return None
+    try:
+        skinner = _ArmatureSkinner(source, mod)
+    except Exception as exc:
+        _log(f"[Voxelator] Fast skinning failed ({exc!r}); evaluating frames through the depsgraph")
+        return None
+    mod.show_viewport = False
+    return skinner
+
+def _most_posed_frame(scene, skinner, frames):
+    step = max(1, len(frames) // SKINNING_CHECK_SAMPLES)
+    best_frame, best_motion = frames[0], -1.0
+    for frame in frames[::step]:
+        scene.frame_set(frame)
+        motion = skinner.pose_displacement()
+        if motion > best_motion:
+            best_frame, best_motion = frame, motion
+    return best_frame
+
+def _validate_fast_skinning(skinner, scene, frames, depsgraph, rot_offset_matrix):
+    source = skinner.source
+    mod = skinner.modifier
+    error = 0.0
+    try:
+        check_frames = sorted({frames[0], _most_posed_frame(scene, skinner, frames)})
+        for frame in check_frames:
+            mod.show_viewport = True
+            scene.frame_set(frame)
+            eval_mesh = bpy.data.meshes.new_from_object(source.evaluated_get(depsgraph), preserve_all_data_layers=True, depsgraph=depsgraph)
+            reference = _mesh_vertex_array(eval_mesh, source.matrix_world @ rot_offset_matrix)
+            bpy.data.meshes.remove(eval_mesh)
+            mod.show_viewport = False
+            scene.frame_set(frame)
+            verts = skinner.frame_geometry(source.matrix_world @ rot_offset_matrix)["verts"]
+            span = float(np.ptp(reference, axis=0).max()) if len(reference) else 0.0
+            frame_error = float(np.abs(verts - reference).max()) if verts.shape == reference.shape and len(reference) else math.inf
+            if frame_error > SKINNING_TOLERANCE * max(span, 1e-9):
+                mod.show_viewport = True
+                _log(f"[Voxelator] Fast skinning disabled: frame {frame} differs from the depsgraph by {frame_error:.6g}; evaluating frames through the depsgraph")
+                return False
+            error = max(error, frame_error)
+    except Exception as exc:
+        mod.show_viewport = True
+        _log(f"[Voxelator] Fast skinning failed ({exc!r}); evaluating frames through the depsgraph")
+        return False
 
-    verts = []
-    faces = []
-    face_cells = []
-    vert_map = {}
-    half = 0.5 * cell_len
-
-    for cell in sorted(occupied_cells):
-        ix, iy, iz = cell
-        for normal, corners in face_defs:
-            nx, ny, nz = normal
-            if (not separate_cubes) and ((ix + nx, iy + ny, iz + nz) in occupied_cells):
-                continue
+    _log(f"[Voxelator] Fast skinning: {len(skinner.bone_names)} deform bones, max error vs depsgraph {error:.3g} at frames {check_frames}")
+    return True
 
-            face = []
-            for sx, sy, sz in corners:
-                lx = 2 * ix + sx
-                ly = 2 * iy + sy
-                lz = 2 * iz + sz
-                key = (lx, ly, lz)
-
-                if separate_cubes:
-                    vx = ox + lx * half
-                    vy = oy + ly * half
-                    vz = oz + lz * half
-                    verts.append((vx, vy, vz))
-                    face.append(len(verts) - 1)
-                else:
-                    vi = vert_map.get(key)
-                    if vi is None:
-                        vx = ox + lx * half
-                        vy = oy + ly * half
-                        vz = oz + lz * half
-                        vi = len(verts)
-                        verts.append((vx, vy, vz))
-                        vert_map[key] = vi
-                    face.append(vi)
-
-            faces.append(face)
-            face_cells.append(cell)
-
-    return verts, faces, face_cells
+def _voxelize_geometry(geometry, grid, fill_volume, overlap_engine='NUMPY'):
+    tri_pts = voxel_core.triangle_points(geometry["verts"], geometry["tri_verts"])
+    voxels = voxel_core.voxelize(tri_pts, grid, fill_volume=fill_volume, overlap_engine=overlap_engine, log=_log)
+    return voxels, tri_pts
+
+def _nearest_triangle_owners(tri_pts, points):
+    n_tris = len(tri_pts)
+    tree = BVHTree.FromPolygons(tri_pts.reshape(-1, 3).tolist(), np.arange(n_tris * 3).reshape(-1, 3).tolist(), all_triangles=True)
+    tri = np.full(len(points), -1, dtype=np.int64)
+    for i, co in enumerate(points.tolist()):
+        location, normal, index, dist = tree.find_nearest(co)
+        if index is not None:
+            tri[i] = index
+    bary = np.zeros((len(points), 3), dtype=np.float64)
+    found = tri >= 0
+    if found.any():
+        _, bary[found] = voxel_core.closest_point_on_triangles(points[found], tri_pts[tri[found]])
+    return tri, bary
 
 def _animation_items_for_object(self, context):
     obj = context.object if context else None
@@ -542,50 +535,157 @@ def _get_animation_owner(obj):
             return mod.object
     return obj
 
-def _build_cube_maps(source, occupied, ox, oy, oz, cell_len, world_to_source_matrix=None):
-    cube_mat_map = {}
-    cube_color_map = {}
-    source_inv = world_to_source_matrix if world_to_source_matrix is not None else source.matrix_world.inverted()
-    source_polys = source.data.polygons
-    source_mats = source.data.materials
-    source_mesh = source.data
-    source_loops = source_mesh.loops
-    source_verts = source_mesh.vertices
-    uv_layer = source_mesh.uv_layers.active
-    uv_data = uv_layer.data if uv_layer else None
-    mat_source_cache = {}
-    image_cache = {}
-    occ_list = sorted(occupied)
-    n_occ = len(occ_list)
-    step_occ = max(1, n_occ // 10) if n_occ else 1
-
-    for i, (ix, iy, iz) in enumerate(occ_list):
-        cube_loc = Vector((ox + ix * cell_len, oy + iy * cell_len, oz + iz * cell_len))
-        result, location, normal, poly_index = source.closest_point_on_mesh(source_inv @ cube_loc)
-        if result and poly_index < len(source_polys):
-            poly = source_polys[poly_index]
-            if poly.material_index < len(source_mats):
-                mat = source_mats[poly.material_index]
-                if mat:
-                    cube_mat_map[(ix, iy, iz)] = mat
-
-                    source_info = _get_material_color_source(mat, mat_source_cache)
-                    if source_info[0] == "solid":
-                        cube_color_map[(ix, iy, iz)] = source_info[1]
-                    else:
-                        uv = None
-                        if uv_data and poly.loop_indices:
-                            uv = _estimate_face_uv(location, poly, uv_data, source_loops, source_verts)
-
-                        if uv is None:
-                            cube_color_map[(ix, iy, iz)] = source_info[2]
+def _build_cube_maps(geometry, tri_pts, voxels, material_sources, image_pixels, surface_only=False, previous=None):
+    voxels.init_attributes()
+    unowned = np.flatnonzero(voxels.owner_tri < 0)
+    if len(unowned) and len(tri_pts) and not surface_only:
+        _log(f"[Voxelator] Nearest-surface lookup for {len(unowned)} voxels without a source triangle")
+        tri, bary = _nearest_triangle_owners(tri_pts, voxels.cell_centers()[unowned])
+        voxels.owner_tri[unowned] = tri
+        voxels.owner_bary[unowned] = bary
+
+    voxel_core.color_owned_voxels(voxels, geometry, material_sources, image_pixels, previous=previous, log=_log)
+
+    if surface_only and len(unowned):
+        voxel_core.propagate_shell_attributes(voxels)
+        _log(f"[Voxelator] Interior colors propagated from shell: interior={len(unowned)} shell={len(voxels.owner_tri) - len(unowned)}")
+
+    return voxels
+
+def _export_worker_images(source_images, tmp_dir):
+    image_paths = {}
+    for key, image in source_images.items():
+        pixels = _IMAGE_CACHE.pixels(image)
+        if pixels is not None:
+            image_paths[key] = os.path.join(tmp_dir, f"{len(image_paths)}.npy")
+            np.save(image_paths[key], pixels)
+    return image_paths
+
+def _voxelize_frames_serial(frame_geometry, keys, grid, options, material_sources, image_pixels):
+    incremental = voxel_core.IncrementalVoxelizer(grid, fill_volume=options["fill_volume"], log=_log) if options["incremental"] else None
+    last_voxels = None
+    for i, key in enumerate(keys):
+        frame = key[1]
+        geometry = frame_geometry(key)
+        if incremental is None:
+            voxels, tri_pts = _voxelize_geometry(geometry, grid, options["fill_volume"], overlap_engine=options["overlap_engine"])
+            previous = None
+        else:
+            tri_pts = voxel_core.triangle_points(geometry["verts"], geometry["tri_verts"])
+            voxels = incremental.update(tri_pts)
+            previous = last_voxels if incremental.moved_count < len(tri_pts) else None
+            if previous is not None and incremental.moved_count == 0:
+                _log(f"[Voxelator] Frame {frame}: unchanged from previous frame ({i+1}/{len(keys)})")
+                yield previous
+                continue
+        _log(f"[Voxelator] Frame {frame}: occupied={voxels.count}")
+
+        _build_cube_maps(geometry, tri_pts, voxels, material_sources, image_pixels, surface_only=options["surface_only"], previous=previous)
+        last_voxels = voxels
+        _log(f"[Voxelator] Frame {frame}: mapped={voxels.colored_count} colorized={voxels.colored_count} ({i+1}/{len(keys)})")
+        yield voxels
+
+    if incremental is not None:
+        _log(f"[Voxelator] Incremental frames: {incremental.stats()}")
+
+def _finish_worker_frame(frame_geometry, key, voxels, options, material_sources, image_pixels):
+    unowned = np.flatnonzero(voxels.owner_tri < 0)
+    if len(unowned) and not options["surface_only"]:
+        geometry = frame_geometry(key)
+        tri_pts = voxel_core.triangle_points(geometry["verts"], geometry["tri_verts"])
+        if len(tri_pts):
+            tri, bary = _nearest_triangle_owners(tri_pts, voxels.cell_centers()[unowned])
+            voxels.owner_tri[unowned] = tri
+            voxels.owner_bary[unowned] = bary
+            voxel_core.color_voxels(voxels, unowned, geometry["tri_mat"], geometry.get("tri_uvs"), material_sources, image_pixels)
+
+@contextlib.contextmanager
+def _spawn_safe_main():
+    # Spawned workers re-import the parent's __main__ unless it looks
+    # interactive; in headless runs that is the bpy script itself. Workers
+    # are spawned inside pool.submit, so only wrap that call.
+    main_module = sys.modules.get("__main__")
+    if main_module is None:
+        yield
+        return
+    main_file = main_module.__dict__.pop("__file__", None)
+    main_spec = getattr(main_module, "__spec__", None)
+    main_module.__spec__ = None
+    try:
+        yield
+    finally:
+        main_module.__spec__ = main_spec
+        if main_file is not None:
+            main_module.__file__ = main_file
+
+def _voxelize_frames_parallel(frame_geometry, keys, grid, options, material_sources, image_paths, image_pixels, workers):
+    # Frames go out in small jobs with a bounded number in flight, and come
+    # back in order, so only a few frames' geometry and voxels are alive at
+    # once no matter how long the action is.
+    done = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            pending = []
+            try:
+                starts = iter(range(0, len(keys), FRAMES_PER_WORKER_JOB))
+                while True:
+                    while len(pending) < 2 * workers:
+                        start = next(starts, None)
+                        if start is None:
+                            break
+                        job = dict(options)
+                        job.update(grid=grid, frames=[frame_geometry(key) for key in keys[start:start + FRAMES_PER_WORKER_JOB]], material_sources=material_sources, image_paths=image_paths)
+                        with _spawn_safe_main():
+                            pending.append(pool.submit(voxel_core.voxelize_frame_chunk, job))
+                    if not pending:
+                        break
+                    previous = None
+                    for voxels in pending.pop(0).result():
+                        key = keys[done]
+                        if voxels is previous:
+                            _log(f"[Voxelator] Frame {key[1]}: unchanged from previous frame ({done+1}/{len(keys)})")
                         else:
-                            sampled = _sample_image_bilinear(source_info[1], uv, image_cache)
-                            cube_color_map[(ix, iy, iz)] = sampled if sampled is not None else source_info[2]
-        if ((i + 1) % step_occ) == 0 or (i + 1) == n_occ:
-            _log(f"[Voxelator] Material map {i+1}/{n_occ}")
-
-    return cube_mat_map, cube_color_map
+                            _finish_worker_frame(frame_geometry, key, voxels, options, material_sources, image_pixels)
+                            _log(f"[Voxelator] Frame {key[1]}: occupied={voxels.count} mapped={voxels.colored_count} ({done+1}/{len(keys)})")
+                        previous = voxels
+                        yield voxels
+                        done += 1
+            finally:
+                for future in pending:
+                    future.cancel()
+    except (BrokenProcessPool, OSError, pickle.PicklingError) as exc:
+        # Only the pool itself failing falls back; errors raised by the
+        # voxelization code are real bugs and propagate.
+        _log(f"[Voxelator] Worker pool failed ({exc!r}); falling back to serial frame processing for {len(keys) - done} frame(s)")
+        yield from _voxelize_frames_serial(frame_geometry, keys[done:], grid, options, material_sources, image_pixels)
+
+def _parse_rotation_offsets(text):
+    return [float(part) for part in text.replace(";", ",").split(",") if part.strip()]
+
+def _out_path_for_angle(path, angle):
+    root, ext = os.path.splitext(path)
+    return f"{root}__rot{angle:g}{ext}"
+
+def _angle_transform(matrix_world, angle_deg):
+    # Rotating about the object's local Z after the fact: M @ Rz @ M^-1
+    # applied to geometry already in world space.
+    return np.array(matrix_world @ Matrix.Rotation(math.radians(angle_deg), 4, 'Z') @ matrix_world.inverted(), dtype=np.float64)
+
+def _rotated_geometry(geometry, transform):
+    if transform is None:
+        return geometry
+    rotated = dict(geometry)
+    rotated["verts"] = voxel_core.transform_points(geometry["verts"], transform)
+    return rotated
+
+def _sampled_frames(action, frame_step):
+    frame_start = int(math.floor(action.frame_range[0]))
+    frame_end = int(math.ceil(action.frame_range[1]))
+    frames = list(range(frame_start, frame_end, frame_step))
+    if not frames:
+        frames = [frame_start]
+    _log(f"[Voxelator] Animation range '{action.name}': {frame_start}..{frame_end} (last frame excluded for looping) step={frame_step} sampled={len(frames)}")
+    return frames
 
 class OBJECT_OT_voxelize(Operator):
     bl_label = "Voxelate"
@@ -621,6 +721,11 @@ class OBJECT_OT_voxelize(Operator):
         soft_max=360.0,
         step=10,
     )
+    rotation_offsets: bpy.props.StringProperty(
+        name="Rotation Offsets",
+        description="Comma-separated Z rotation offsets in degrees; animation exports evaluate each frame once and write one spritesheet per angle (overrides Rotation Offset Z)",
+        default=""
+    )
     animation_action: bpy.props.EnumProperty(
         name="Animation",
         description="Select an animation available in this project",
@@ -637,6 +742,55 @@ class OBJECT_OT_voxelize(Operator):
         default=1,
         min=1
     )
+    frame_sampling: bpy.props.EnumProperty(
+        name="Frame Sampling",
+        description="How animation frames are chosen from the Frame Step candidates",
+        items=(
+            ('STRIDE', "Stride", "Keep every candidate frame"),
+            ('ADAPTIVE', "Adaptive", "Keep candidates according to how far the mesh moved since the last kept frame"),
+        ),
+        default='STRIDE'
+    )
+    frame_budget: bpy.props.IntProperty(
+        name="Frame Budget",
+        description="With adaptive sampling, keep at most this many frames per animation (0 for no limit)",
+        default=0,
+        min=0
+    )
+    motion_threshold: bpy.props.FloatProperty(
+        name="Motion Threshold",
+        description="With adaptive sampling, keep a frame once some vertex moved this many voxels since the last kept frame",
+        default=1.0,
+        min=0.0
+    )
+    animation_batch: bpy.props.StringProperty(
+        name="Animation Batch",
+        description="JSON list of {\"action\", \"filepath\"} entries exported in one run on a shared grid; overrides Animation and the slices path",
+        default=""
+    )
+    frame_cache_mb: bpy.props.IntProperty(
+        name="Frame Cache (MB)",
+        description="Memory for evaluated frame geometry kept between the bounds pass and voxelization; frames beyond it are spilled to temporary files",
+        default=2048,
+        min=0
+    )
+    incremental_frames: bpy.props.BoolProperty(
+        name="Incremental Frames",
+        description="Only re-voxelize and re-color triangles that moved since the previous animation frame",
+        default=True
+    )
+    fast_skinning: bpy.props.BoolProperty(
+        name="Fast Skinning",
+        description="For meshes deformed only by an armature modifier, skin vertices from pose bone matrices instead of evaluating the mesh each frame",
+        default=True
+    )
+    workers: bpy.props.IntProperty(
+        name="Workers",
+        description="Worker processes used to voxelize animation frames (1 processes frames in Blender itself)",
+        default=1,
+        min=1,
+        max=64
+    )
     slices_only: bpy.props.BoolProperty(
         name="Slices Only",
         description="Only export voxel slices PNG and skip building the voxel mesh",
@@ -648,6 +802,83 @@ class OBJECT_OT_voxelize(Operator):
         subtype='FILE_PATH',
         default=""
     )
+    voxel_data: bpy.props.BoolProperty(
+        name="Voxel Data (.vxa)",
+        description="Also write the voxel colors as a run-length encoded, palette-indexed .vxa file next to the PNG",
+        default=False
+    )
+    slice_columns: bpy.props.IntProperty(
+        name="Slice Columns",
+        description="Slice tiles per row inside each frame (0 puts all slices of a frame in one row)",
+        default=0,
+        min=0
+    )
+    frame_columns: bpy.props.IntProperty(
+        name="Frame Columns",
+        description="Animation frames per row of the spritesheet (1 stacks frames vertically)",
+        default=1,
+        min=1
+    )
+    pad_pow2: bpy.props.BoolProperty(
+        name="Power-of-Two Size",
+        description="Pad spritesheets to power-of-two width and height; tile offsets are written to the JSON sidecar",
+        default=False
+    )
+    palette_mode: bpy.props.EnumProperty(
+        name="Palette",
+        description="Write spritesheets as indexed-color PNGs with a palette",
+        items=(
+            ('NONE', "None", "Write 32-bit RGBA PNGs"),
+            ('EXACT', "Exact", "Palette of the exact distinct colors (quantized only if there are more than 255)"),
+            ('QUANTIZE', "Quantize", "Reduce colors to at most Palette Colors with a median cut"),
+        ),
+        default='NONE'
+    )
+    palette_colors: bpy.props.IntProperty(
+        name="Palette Colors",
+        description="Largest palette size when quantizing, including the transparent background entry",
+        default=256,
+        min=2,
+        max=256
+    )
+    palette_scope: bpy.props.EnumProperty(
+        name="Palette Scope",
+        description="Which animation spritesheets share one palette",
+        items=(
+            ('ACTION', "Per Action", "One palette per animation (shared by its rotation offsets)"),
+            ('ALL', "All Outputs", "One palette for every spritesheet written in this run, e.g. all actions of an FBX"),
+        ),
+        default='ACTION'
+    )
+    png_backend: bpy.props.EnumProperty(
+        name="PNG Backend",
+        description="How single-frame spritesheets are written; animation spritesheets are always streamed by the direct encoder",
+        items=(
+            ('DIRECT', "Direct", "Encode the voxel colors straight to an 8-bit RGBA PNG without creating an image datablock"),
+            ('BLENDER', "Blender", "Fill a temporary image datablock and save it with Blender's image pipeline"),
+        ),
+        default='DIRECT'
+    )
+    png_compression: bpy.props.IntProperty(
+        name="PNG Compression",
+        description="zlib compression level for directly encoded PNGs",
+        default=6,
+        min=0,
+        max=9
+    )
+    png_filter: bpy.props.EnumProperty(
+        name="PNG Filter",
+        description="Scanline filter for directly encoded PNGs",
+        items=(
+            ('NONE', "None", "No filtering (fastest)"),
+            ('SUB', "Sub", "Difference to the pixel on the left"),
+            ('UP', "Up", "Difference to the pixel above"),
+            ('AVERAGE', "Average", "Difference to the mean of the left and upper pixels"),
+            ('PAETH', "Paeth", "Difference to the Paeth predictor"),
+            ('ADAPTIVE', "Adaptive", "Choose the filter per row that minimizes the residuals"),
+        ),
+        default='NONE'
+    )
     log_filepath: bpy.props.StringProperty(
         name="Log File",
         description="Path to save processing log (.log)",
@@ -659,6 +890,20 @@ class OBJECT_OT_voxelize(Operator):
         description="Print progress logs to console",
         default=False
     )
+    surface_color_only: bpy.props.BoolProperty(
+        name="Surface Color Only",
+        description="With Fill Volume, sample colors for surface voxels only and give interior voxels the color of their nearest surface voxel",
+        default=False
+    )
+    overlap_engine: bpy.props.EnumProperty(
+        name="Overlap Engine",
+        description="Triangle/box overlap implementation used for surface voxelization",
+        items=(
+            ('NUMPY', "NumPy", "Batched triangle/box tests over many candidate cells at once"),
+            ('SCALAR', "Scalar", "Reference pure-Python test, one candidate cell at a time"),
+        ),
+        default='NUMPY'
+    )
     
     @classmethod
     def poll(cls, context):
@@ -671,16 +916,227 @@ class OBJECT_OT_voxelize(Operator):
         layout = self.layout
         layout.prop(self, "voxelizeResolution")
         layout.prop(self, "fill_volume")
+        if self.fill_volume:
+            layout.prop(self, "surface_color_only")
         layout.prop(self, "separate_cubes")
         layout.prop(self, "rotation_offset_deg")
+        if self.export_animation:
+            layout.prop(self, "rotation_offsets")
         layout.prop(self, "animation_action")
         layout.prop(self, "export_animation")
         if self.export_animation:
             layout.prop(self, "frame_step")
+            layout.prop(self, "frame_sampling")
+            if self.frame_sampling == 'ADAPTIVE':
+                layout.prop(self, "frame_budget")
+                layout.prop(self, "motion_threshold")
         layout.prop(self, "slices_only")
         layout.prop(self, "slices_filepath")
+        layout.prop(self, "voxel_data")
+        layout.prop(self, "slice_columns")
+        if self.export_animation:
+            layout.prop(self, "frame_columns")
+        layout.prop(self, "pad_pow2")
+        layout.prop(self, "palette_mode")
+        if self.palette_mode != 'NONE':
+            layout.prop(self, "palette_colors")
+            layout.prop(self, "palette_scope")
+        layout.prop(self, "png_backend")
+        layout.prop(self, "png_compression")
+        layout.prop(self, "png_filter")
         layout.prop(self, "log_filepath")
     
+    def _export_animations(self, context, source, exports, angles, depsgraph, rot_offset_matrix, mat_source_cache):
+        anim_owner = _get_animation_owner(source)
+        scene = context.scene
+        original_frame = scene.frame_current
+        created_anim_data = False
+        if not anim_owner.animation_data:
+            anim_owner.animation_data_create()
+            created_anim_data = True
+        prev_action = anim_owner.animation_data.action
+        frame_step = max(1, int(self.frame_step))
+        _log(f"[Voxelator] Animation export owner: {anim_owner.name} actions={len(exports)} angles={', '.join(f'{a:g}' for a in angles)}")
+
+        frame_store = voxel_core.FrameGeometryStore(int(self.frame_cache_mb) << 20)
+        worker_dir = None
+        skinner = None
+        pending_sheets = []
+        try:
+            bounds_start = time.perf_counter()
+            bounds_min = None
+            bounds_max = None
+            action_frames = []
+            action_motion = []
+            frame_keys = {}
+            angle_transforms = {}
+
+            for ai, (action, _) in enumerate(exports):
+                anim_owner.animation_data.action = action
+                frames = _sampled_frames(action, frame_step)
+                action_frames.append(frames)
+                step_motion = []
+                prev_verts = None
+                if self.fast_skinning and ai == 0:
+                    skinner = _setup_fast_skinning(source)
+                if skinner is not None and not _validate_fast_skinning(skinner, scene, frames, depsgraph, rot_offset_matrix):
+                    skinner = None
+
+                for i, frame in enumerate(frames):
+                    scene.frame_set(frame)
+                    processing_matrix = source.matrix_world @ rot_offset_matrix
+                    if skinner is not None:
+                        geometry = skinner.frame_geometry(processing_matrix)
+                    else:
+                        source_eval = source.evaluated_get(depsgraph)
+                        eval_mesh = bpy.data.meshes.new_from_object(source_eval, preserve_all_data_layers=True, depsgraph=depsgraph)
+                        geometry = _mesh_frame_geometry(eval_mesh, processing_matrix)
+                        bpy.data.meshes.remove(eval_mesh)
+                    frame_store.put((ai, frame), **geometry)
+                    if len(angles) > 1:
+                        angle_transforms[(ai, frame)] = [None] + [_angle_transform(source.matrix_world, angle - angles[0]) for angle in angles[1:]]
+                    frame_keys[(ai, frame)] = voxel_core.geometry_fingerprint(geometry)
+                    verts_world = geometry["verts"]
+                    if self.frame_sampling == 'ADAPTIVE':
+                        step_motion.append(voxel_core.vertex_displacement(prev_verts, verts_world) if i else 0.0)
+                        prev_verts = verts_world
+                    if not len(verts_world):
+                        continue
+
+                    for transform in angle_transforms.get((ai, frame), [None]):
+                        angle_verts = verts_world if transform is None else voxel_core.transform_points(verts_world, transform)
+                        frame_min = angle_verts.min(axis=0)
+                        frame_max = angle_verts.max(axis=0)
+                        bounds_min = frame_min if bounds_min is None else np.minimum(bounds_min, frame_min)
+                        bounds_max = frame_max if bounds_max is None else np.maximum(bounds_max, frame_max)
+                    _log(f"[Voxelator] Animation bounds {i+1}/{len(frames)} frame={frame}")
+                action_motion.append(step_motion)
+
+            _log(f"[Voxelator] Frame geometry store: {frame_store.stats()}")
+            if bounds_min is None:
+                _log("[Voxelator] Aborted: no vertices found across sampled animation frames")
+                self.report({'ERROR'}, "Voxelator: no vertices found in sampled animation")
+                return {'CANCELLED'}
+
+            grid = voxel_core.compute_grid(bounds_min, bounds_max, self.voxelizeResolution)
+            dx, dy, dz = grid.dims
+            cell_len = grid.cell_len
+            center_x, center_y, center_z = grid.center
+
+            _log(f"[Voxelator][Timing] Animation bounds prepass: {time.perf_counter() - bounds_start:.3f}s")
+            _log(f"[Voxelator] Global animation grid: {dx}x{dy}x{dz} shared by {len(exports)} action(s) x {len(angles)} angle(s)")
+            _log(f"[Voxelator] cube_size={cell_len * 0.5:.6f} cell_len={cell_len:.6f}")
+            _log(f"[Voxelator] Grid center: ({center_x:.6f}, {center_y:.6f}, {center_z:.6f})")
+
+            material_sources, source_images = _material_sources(source.data.materials, mat_source_cache)
+            image_pixels = lambda key: _IMAGE_CACHE.pixels(source_images[key])
+            image_paths = None
+            if int(self.workers) > 1:
+                worker_dir = tempfile.mkdtemp(prefix="voxelator_images_")
+                image_paths = _export_worker_images(source_images, worker_dir)
+
+            for ai, (action, save_path) in enumerate(exports):
+                frames = action_frames[ai]
+                if self.frame_sampling == 'ADAPTIVE':
+                    kept = voxel_core.select_frames_by_motion(action_motion[ai], budget=self.frame_budget, threshold=self.motion_threshold * cell_len)
+                    frames = [frames[i] for i in kept]
+                    _log(f"[Voxelator] Adaptive sampling '{action.name}': kept {len(frames)}/{len(action_frames[ai])} frames {frames}")
+                for k, angle in enumerate(angles):
+                    if len(angles) > 1:
+                        path = _out_path_for_angle(save_path, angle)
+                        transform_key = lambda frame: angle_transforms[(ai, frame)][k].tobytes() if k else None
+                        frame_geometry = lambda key: _rotated_geometry(frame_store.get(key), angle_transforms[key][k])
+                    else:
+                        path = save_path
+                        transform_key = lambda frame: None
+                        frame_geometry = frame_store.get
+                    first_frame_for_key = {}
+                    sources = [first_frame_for_key.setdefault((frame_keys[(ai, frame)], transform_key(frame)), frame) for frame in frames]
+                    indexed_sheet = self._export_action_sheet(action, path, angle, ai, frames, sources, frame_geometry, grid, material_sources, image_paths, image_pixels)
+                    if indexed_sheet is not None:
+                        pending_sheets.append(indexed_sheet)
+                if self.palette_scope == 'ACTION':
+                    self._finish_indexed_sheets(pending_sheets, grid)
+            self._finish_indexed_sheets(pending_sheets, grid)
+        finally:
+            for sheet, *_ in pending_sheets:
+                sheet.abort()
+            frame_store.close()
+            if worker_dir is not None:
+                shutil.rmtree(worker_dir, ignore_errors=True)
+            if skinner is not None:
+                skinner.modifier.show_viewport = True
+            scene.frame_set(original_frame)
+            if anim_owner.animation_data:
+                anim_owner.animation_data.action = prev_action
+            if created_anim_data and anim_owner.animation_data and anim_owner.animation_data.action is None and not anim_owner.animation_data.nla_tracks:
+                anim_owner.animation_data_clear()
+        return {'FINISHED'}
+
+    def _export_action_sheet(self, action, save_path, angle, ai, frames, sources, frame_geometry, grid, material_sources, image_paths, image_pixels):
+        anim_proc_start = time.perf_counter()
+        unique_frames = [frame for frame, source_frame in zip(frames, sources) if source_frame == frame]
+        _log(f"[Voxelator] Action '{action.name}': {len(frames) - len(unique_frames)}/{len(frames)} sampled frames repeat earlier geometry")
+        use_incremental = self.incremental_frames and self.overlap_engine != 'SCALAR'
+
+        _log(f"[Voxelator] Saving animation spritesheet to: {save_path}")
+        with contextlib.ExitStack() as stack:
+            indexed = self.palette_mode != 'NONE'
+            sheet = stack.enter_context(_open_animation_spritesheet(save_path, grid, self.voxelizeResolution, len(frames), compress_level=self.png_compression, filter_name=self.png_filter.lower(), indexed=indexed, slice_columns=self.slice_columns, frame_columns=self.frame_columns, pad_pow2=self.pad_pow2))
+            outputs = [sheet]
+            if self.voxel_data:
+                outputs.append(stack.enter_context(_open_voxel_data(save_path, grid)))
+            options = {
+                "fill_volume": self.fill_volume,
+                "surface_only": self.surface_color_only,
+                "overlap_engine": self.overlap_engine,
+                "incremental": use_incremental,
+            }
+            keys = [(ai, frame) for frame in unique_frames]
+            workers = max(1, int(self.workers))
+            if workers > 1 and len(unique_frames) > 1:
+                _log(f"[Voxelator] Voxelizing {len(unique_frames)} frames on {min(workers, len(unique_frames))} worker processes")
+                frame_voxels = _voxelize_frames_parallel(frame_geometry, keys, grid, options, material_sources, image_paths, image_pixels, min(workers, len(unique_frames)))
+            else:
+                frame_voxels = _voxelize_frames_serial(frame_geometry, keys, grid, options, material_sources, image_pixels)
+            frame_voxels = stack.enter_context(contextlib.closing(frame_voxels))
+
+            row_for_frame = {}
+            for i, (frame, source_frame) in enumerate(zip(frames, sources)):
+                row_for_frame[frame] = i
+                if source_frame != frame:
+                    for output in outputs:
+                        output.repeat_frame(row_for_frame[source_frame])
+                    _log(f"[Voxelator] Frame {frame}: same geometry as frame {source_frame} ({i+1}/{len(frames)})")
+                    continue
+                voxels = next(frame_voxels)
+                for output in outputs:
+                    output.add_frame(voxels)
+
+        _log(f"[Voxelator] Frame dedup: voxelized={len(unique_frames)} reused={len(frames) - len(unique_frames)} reused_rows={sheet.reused}/{len(frames)}")
+        _log(f"[Voxelator][Timing] Action '{action.name}' frame processing + spritesheet: {time.perf_counter() - anim_proc_start:.3f}s")
+        if indexed:
+            return (sheet, save_path, action, frames, angle)
+        _log(f"[Voxelator] Saved animation spritesheet: {bpy.path.abspath(save_path)}")
+        metadata_path = _write_animation_metadata(save_path, action, frames, grid, sheet.layout, self.frame_sampling, angle)
+        _log(f"[Voxelator] Saved animation metadata: {metadata_path}")
+        return None
+
+    def _finish_indexed_sheets(self, pending, grid):
+        if not pending:
+            return
+        counts = voxel_core.ColorCounts()
+        for sheet, *_ in pending:
+            counts.update(sheet.color_counts)
+        palette = voxel_core.build_palette(counts, self.palette_colors, exact=self.palette_mode == 'EXACT', log=_log)
+        _log(f"[Voxelator] Palette: {len(counts)} distinct colors -> {len(palette)} entries shared by {len(pending)} spritesheet(s)")
+        while pending:
+            sheet, save_path, action, frames, angle = pending.pop(0)
+            sheet.encode(palette)
+            _log(f"[Voxelator] Saved animation spritesheet: {bpy.path.abspath(save_path)}")
+            metadata_path = _write_animation_metadata(save_path, action, frames, grid, sheet.layout, self.frame_sampling, angle, palette=palette)
+            _log(f"[Voxelator] Saved animation metadata: {metadata_path}")
+
     def execute(self, context):
         total_start = time.perf_counter()
         stage_start = total_start
@@ -691,6 +1147,7 @@ class OBJECT_OT_voxelize(Operator):
         source_name = source.name
 
         LOG_TO_STDOUT = bool(self.console_progress)
+        _IMAGE_CACHE.drop_unsaved()
 
         log_path = self.log_filepath.strip()
         if not log_path:
@@ -702,11 +1159,16 @@ class OBJECT_OT_voxelize(Operator):
 
         _log(f"[Voxelator] Start: {source_name}")
         _log(f"[Voxelator] res: {self.voxelizeResolution} fill_volume: {self.fill_volume} separate_cubes: {self.separate_cubes}")
-        _log(f"[Voxelator] rotation_offset_deg: {self.rotation_offset_deg}")
-        _log(f"[Voxelator] animation: {self.animation_action}")
-        _log(f"[Voxelator] export_animation: {self.export_animation} frame_step: {self.frame_step}")
+        _log(f"[Voxelator] surface_color_only: {self.surface_color_only}")
+        _log(f"[Voxelator] rotation_offset_deg: {self.rotation_offset_deg} rotation_offsets: {self.rotation_offsets or '(none)'}")
+        _log(f"[Voxelator] animation: {self.animation_action} batch: {self.animation_batch or '(none)'}")
+        _log(f"[Voxelator] export_animation: {self.export_animation} frame_step: {self.frame_step} frame_sampling: {self.frame_sampling} frame_budget: {self.frame_budget} motion_threshold: {self.motion_threshold} frame_cache_mb: {self.frame_cache_mb} incremental_frames: {self.incremental_frames} workers: {self.workers} fast_skinning: {self.fast_skinning}")
         _log(f"[Voxelator] slices_only: {self.slices_only}")
+        _log(f"[Voxelator] overlap_engine: {self.overlap_engine}")
         _log(f"[Voxelator] slices path: {self.slices_filepath or '(default)'}")
+        _log(f"[Voxelator] slice_columns: {self.slice_columns} frame_columns: {self.frame_columns} pad_pow2: {self.pad_pow2}")
+        _log(f"[Voxelator] palette_mode: {self.palette_mode} palette_colors: {self.palette_colors} palette_scope: {self.palette_scope}")
+        _log(f"[Voxelator] voxel_data: {self.voxel_data} png_backend: {self.png_backend} png_compression: {self.png_compression} png_filter: {self.png_filter}")
         _log(f"[Voxelator] log path: {LOG_FILE}")
 
         save_path = self.slices_filepath.strip()
@@ -716,152 +1178,59 @@ class OBJECT_OT_voxelize(Operator):
             save_path = save_path + ".png"
 
         depsgraph = context.evaluated_depsgraph_get()
-        rot_rad = math.radians(float(self.rotation_offset_deg))
+        mat_source_cache = {}
+        try:
+            angles = _parse_rotation_offsets(self.rotation_offsets)
+        except ValueError:
+            _log(f"[Voxelator] Aborted: invalid rotation offsets: {self.rotation_offsets}")
+            self.report({'ERROR'}, "Voxelator: invalid rotation offsets")
+            return {'CANCELLED'}
+        if not angles:
+            angles = [float(self.rotation_offset_deg)]
+        elif not self.export_animation and len(angles) > 1:
+            _log(f"[Voxelator] Warning: extra rotation offsets only apply to animation exports; using {angles[0]:g}")
+        rot_rad = math.radians(angles[0])
         rot_offset_matrix = Matrix.Rotation(rot_rad, 4, 'Z')
 
         if self.export_animation:
-            if self.animation_action in {"", "NONE"}:
+            if self.animation_batch.strip():
+                try:
+                    jobs = [(str(entry["action"]), str(entry["filepath"])) for entry in json.loads(self.animation_batch)]
+                except (ValueError, KeyError, TypeError) as exc:
+                    _log(f"[Voxelator] Aborted: invalid animation batch: {exc}")
+                    self.report({'ERROR'}, "Voxelator: invalid animation batch")
+                    return {'CANCELLED'}
+            elif self.animation_action in {"", "NONE"}:
                 _log("[Voxelator] Aborted: no animation selected for export")
                 self.report({'ERROR'}, "Voxelator: no animation selected")
                 return {'CANCELLED'}
-
-            action = bpy.data.actions.get(self.animation_action)
-            if not action:
-                _log(f"[Voxelator] Aborted: animation not found: {self.animation_action}")
-                self.report({'ERROR'}, f"Voxelator: animation not found ({self.animation_action})")
-                return {'CANCELLED'}
-
-            anim_owner = _get_animation_owner(source)
-            scene = context.scene
-            original_frame = scene.frame_current
-            created_anim_data = False
-            prev_action = None
-
-            if not anim_owner.animation_data:
-                anim_owner.animation_data_create()
-                created_anim_data = True
-            prev_action = anim_owner.animation_data.action
-            anim_owner.animation_data.action = action
-
-            frame_start = int(math.floor(action.frame_range[0]))
-            frame_end = int(math.ceil(action.frame_range[1]))
-            frame_step = max(1, int(self.frame_step))
-            frames = list(range(frame_start, frame_end, frame_step))
-            if not frames:
-                frames = [frame_start]
-
-            _log(f"[Voxelator] Animation export owner: {anim_owner.name}")
-            _log(f"[Voxelator] Animation range: {frame_start}..{frame_end} (last frame excluded for looping) step={frame_step} sampled={len(frames)}")
-
-            try:
-                bounds_start = time.perf_counter()
-                min_x = float('inf')
-                min_y = float('inf')
-                min_z = float('inf')
-                max_x = float('-inf')
-                max_y = float('-inf')
-                max_z = float('-inf')
-
-                for i, frame in enumerate(frames):
-                    scene.frame_set(frame)
-                    source_eval = source.evaluated_get(depsgraph)
-                    eval_mesh = bpy.data.meshes.new_from_object(source_eval, preserve_all_data_layers=True, depsgraph=depsgraph)
-                    processing_matrix = source.matrix_world @ rot_offset_matrix
-                    verts_world = [processing_matrix @ v.co for v in eval_mesh.vertices]
-                    bpy.data.meshes.remove(eval_mesh)
-                    if not verts_world:
-                        continue
-
-                    min_x = min(min_x, min(v.x for v in verts_world))
-                    min_y = min(min_y, min(v.y for v in verts_world))
-                    min_z = min(min_z, min(v.z for v in verts_world))
-                    max_x = max(max_x, max(v.x for v in verts_world))
-                    max_y = max(max_y, max(v.y for v in verts_world))
-                    max_z = max(max_z, max(v.z for v in verts_world))
-                    _log(f"[Voxelator] Animation bounds {i+1}/{len(frames)} frame={frame}")
-
-                if min_x == float('inf'):
-                    _log("[Voxelator] Aborted: no vertices found across sampled animation frames")
-                    self.report({'ERROR'}, "Voxelator: no vertices found in sampled animation")
+            else:
+                jobs = [(self.animation_action, save_path)]
+
+            exports = []
+            for action_name, path in jobs:
+                action = bpy.data.actions.get(action_name)
+                if not action:
+                    _log(f"[Voxelator] Aborted: animation not found: {action_name}")
+                    self.report({'ERROR'}, f"Voxelator: animation not found ({action_name})")
                     return {'CANCELLED'}
+                if not path.lower().endswith(".png"):
+                    path = path + ".png"
+                exports.append((action, path))
+            if not exports:
+                _log("[Voxelator] Aborted: animation batch is empty")
+                self.report({'ERROR'}, "Voxelator: no animation selected")
+                return {'CANCELLED'}
 
-                span_x = max_x - min_x
-                span_y = max_y - min_y
-                span_z = max_z - min_z
-                max_span = max(span_x, span_y, span_z)
-
-                cube_size = max_span / (self.voxelizeResolution * 2) if self.voxelizeResolution else 0.5
-                cell_len = cube_size * 2
-                grid_min_x = min_x
-                grid_min_y = min_y
-                grid_min_z = min_z
-
-                eps = cell_len * 1e-6
-                tol = max_span * 1e-6 if max_span > 0.0 else 0.0
-
-                if abs(span_x - max_span) <= tol:
-                    dx = max(1, int(self.voxelizeResolution))
-                else:
-                    dx = max(1, int(math.ceil((span_x + eps) / cell_len)))
-
-                if abs(span_y - max_span) <= tol:
-                    dy = max(1, int(self.voxelizeResolution))
-                else:
-                    dy = max(1, int(math.ceil((span_y + eps) / cell_len)))
-
-                if abs(span_z - max_span) <= tol:
-                    dz = max(1, int(self.voxelizeResolution))
-                else:
-                    dz = max(1, int(math.ceil((span_z + eps) / cell_len)))
-
-                center_x = (min_x + max_x) * 0.5
-                center_y = (min_y + max_y) * 0.5
-                center_z = (min_z + max_z) * 0.5
-                grid_min_x = center_x - (dx * cell_len) * 0.5
-                grid_min_y = center_y - (dy * cell_len) * 0.5
-                grid_min_z = center_z - (dz * cell_len) * 0.5
-
-                ox = grid_min_x + 0.5 * cell_len
-                oy = grid_min_y + 0.5 * cell_len
-                oz = grid_min_z + 0.5 * cell_len
-
-                _log(f"[Voxelator][Timing] Animation bounds prepass: {time.perf_counter() - bounds_start:.3f}s")
-                _log(f"[Voxelator] Global animation grid: {dx}x{dy}x{dz}")
-                _log(f"[Voxelator] cube_size={cube_size:.6f} cell_len={cell_len:.6f}")
-                _log(f"[Voxelator] Grid center: ({center_x:.6f}, {center_y:.6f}, {center_z:.6f})")
-
-                frame_color_maps = []
-                anim_proc_start = time.perf_counter()
-                for i, frame in enumerate(frames):
-                    scene.frame_set(frame)
-                    source_eval = source.evaluated_get(depsgraph)
-                    eval_mesh = bpy.data.meshes.new_from_object(source_eval, preserve_all_data_layers=True, depsgraph=depsgraph)
-                    processing_matrix = source.matrix_world @ rot_offset_matrix
-                    occupied = _build_occupied_cells_from_mesh(eval_mesh, processing_matrix, cell_len, grid_min_x, grid_min_y, grid_min_z, dx, dy, dz, self.fill_volume)
-                    bpy.data.meshes.remove(eval_mesh)
-                    _log(f"[Voxelator] Frame {frame}: occupied={len(occupied)}")
-
-                    cube_mat_map, cube_color_map = _build_cube_maps(source, occupied, ox, oy, oz, cell_len, world_to_source_matrix=processing_matrix.inverted())
-                    frame_color_maps.append(cube_color_map)
-                    _log(f"[Voxelator] Frame {frame}: mapped={len(cube_mat_map)} colorized={len(cube_color_map)} ({i+1}/{len(frames)})")
-
-                _log(f"[Voxelator][Timing] Animation frame processing: {time.perf_counter() - anim_proc_start:.3f}s")
-
-                _log(f"[Voxelator] Saving animation spritesheet to: {save_path}")
-                sprite_start = time.perf_counter()
-                _save_voxel_animation_spritesheet(frame_color_maps, dx, dy, dz, save_path, self.voxelizeResolution)
-                _log(f"[Voxelator][Timing] Animation spritesheet: {time.perf_counter() - sprite_start:.3f}s")
-            finally:
-                scene.frame_set(original_frame)
-                if anim_owner.animation_data:
-                    anim_owner.animation_data.action = prev_action
-                if created_anim_data and anim_owner.animation_data and anim_owner.animation_data.action is None and not anim_owner.animation_data.nla_tracks:
-                    anim_owner.animation_data_clear()
+            result = self._export_animations(context, source, exports, angles, depsgraph, rot_offset_matrix, mat_source_cache)
+            if result != {'FINISHED'}:
+                return result
 
             _log("[Voxelator] Animation mode: PNG-only export complete")
+            _log(f"[Voxelator] Image cache: {_IMAGE_CACHE.stats()}")
             _log(f"[Voxelator][Timing] Total: {time.perf_counter() - total_start:.3f}s")
             _log("[Voxelator] Finished")
-            self.report({'INFO'}, f"Voxelator completed animation PNG: {os.path.basename(save_path)}")
+            self.report({'INFO'}, f"Voxelator completed animation PNG: {', '.join(os.path.basename(path) for _, path in exports)} angles={len(angles)}")
             return {'FINISHED'}
         source_eval = source.evaluated_get(depsgraph)
         target_mesh = bpy.data.meshes.new_from_object(source_eval, preserve_all_data_layers=True, depsgraph=depsgraph)
@@ -874,85 +1243,51 @@ class OBJECT_OT_voxelize(Operator):
         _log(f"[Voxelator] Built eval mesh object: {target.name}")
         _log(f"[Voxelator] Target dims: {target.dimensions[:]}")
 
-        verts_world = [target.matrix_world @ v.co for v in target.data.vertices]
-        if not verts_world:
+        verts_world = _mesh_vertex_array(target.data, target.matrix_world)
+        if not len(verts_world):
             bpy.data.objects.remove(target, do_unlink=True)
             _log("[Voxelator] Aborted: target has no vertices")
             self.report({'ERROR'}, "Voxelator: target has no vertices")
             return {'CANCELLED'}
-        min_x = min(v.x for v in verts_world)
-        min_y = min(v.y for v in verts_world)
-        min_z = min(v.z for v in verts_world)
-        max_x = max(v.x for v in verts_world)
-        max_y = max(v.y for v in verts_world)
-        max_z = max(v.z for v in verts_world)
-
-        span_x = max_x - min_x
-        span_y = max_y - min_y
-        span_z = max_z - min_z
-        max_span = max(span_x, span_y, span_z)
-
-        cube_size = max_span / (self.voxelizeResolution * 2) if self.voxelizeResolution else 0.5
-        cell_len = cube_size * 2
-        _log(f"[Voxelator] cube_size={cube_size:.6f} cell_len={cell_len:.6f}")
+
+        grid = voxel_core.compute_grid(verts_world.min(axis=0), verts_world.max(axis=0), self.voxelizeResolution)
+        dx, dy, dz = grid.dims
+        cell_len = grid.cell_len
+        _log(f"[Voxelator] cube_size={cell_len * 0.5:.6f} cell_len={cell_len:.6f}")
         _log(f"[Voxelator][Timing] Setup: {time.perf_counter() - stage_start:.3f}s")
         stage_start = time.perf_counter()
 
-        grid_min_x = min_x
-        grid_min_y = min_y
-        grid_min_z = min_z
-
-        eps = cell_len * 1e-6
-        tol = max_span * 1e-6 if max_span > 0.0 else 0.0
-
-        if abs(span_x - max_span) <= tol:
-            dx = max(1, int(self.voxelizeResolution))
-        else:
-            dx = max(1, int(math.ceil((span_x + eps) / cell_len)))
-
-        if abs(span_y - max_span) <= tol:
-            dy = max(1, int(self.voxelizeResolution))
-        else:
-            dy = max(1, int(math.ceil((span_y + eps) / cell_len)))
-
-        if abs(span_z - max_span) <= tol:
-            dz = max(1, int(self.voxelizeResolution))
-        else:
-            dz = max(1, int(math.ceil((span_z + eps) / cell_len)))
-
-        center_x = (min_x + max_x) * 0.5
-        center_y = (min_y + max_y) * 0.5
-        center_z = (min_z + max_z) * 0.5
-        grid_min_x = center_x - (dx * cell_len) * 0.5
-        grid_min_y = center_y - (dy * cell_len) * 0.5
-        grid_min_z = center_z - (dz * cell_len) * 0.5
-
-        ox = grid_min_x + 0.5 * cell_len
-        oy = grid_min_y + 0.5 * cell_len
-        oz = grid_min_z + 0.5 * cell_len
+        ox, oy, oz = grid.origin
+        center_x, center_y, center_z = grid.center
         _log(f"[Voxelator] Grid center: ({center_x:.6f}, {center_y:.6f}, {center_z:.6f})")
 
         surface_start = time.perf_counter()
-        occupied = _build_occupied_cells_from_mesh(target.data, target.matrix_world, cell_len, grid_min_x, grid_min_y, grid_min_z, dx, dy, dz, self.fill_volume)
+        geometry = _mesh_frame_geometry(target.data, target.matrix_world)
+        voxels, tri_pts = _voxelize_geometry(geometry, grid, self.fill_volume, overlap_engine=self.overlap_engine)
         _log(f"[Voxelator][Timing] Surface/volume voxelize: {time.perf_counter() - surface_start:.3f}s")
         stage_start = time.perf_counter()
 
         _log(f"[Voxelator] Grid: {dx}x{dy}x{dz}")
-        _log(f"[Voxelator] Occupied cells: {len(occupied)}")
+        _log(f"[Voxelator] Occupied cells: {voxels.count}")
         _log(f"[Voxelator][Timing] Occupancy bookkeeping: {time.perf_counter() - stage_start:.3f}s")
         stage_start = time.perf_counter()
 
-        cube_mat_map, cube_color_map = _build_cube_maps(source, occupied, ox, oy, oz, cell_len, world_to_source_matrix=processing_matrix.inverted())
+        material_sources, source_images = _material_sources(source.data.materials, mat_source_cache)
+        _build_cube_maps(geometry, tri_pts, voxels, material_sources, lambda key: _IMAGE_CACHE.pixels(source_images[key]), surface_only=self.surface_color_only)
         _log(f"[Voxelator][Timing] Material map: {time.perf_counter() - stage_start:.3f}s")
         stage_start = time.perf_counter()
 
         _log(f"[Voxelator] Saving spritesheet to: {save_path}")
-        _save_voxel_spritesheet(dx, dy, dz, save_path, cube_color_map, self.voxelizeResolution)
+        _save_voxel_spritesheet(voxels, save_path, self.voxelizeResolution, backend=self.png_backend, compress_level=self.png_compression, filter_name=self.png_filter.lower(), palette_mode=self.palette_mode, palette_colors=self.palette_colors, slice_columns=self.slice_columns, pad_pow2=self.pad_pow2)
+        if self.voxel_data:
+            with _open_voxel_data(save_path, grid) as voxel_data:
+                voxel_data.add_frame(voxels)
         _log(f"[Voxelator][Timing] Spritesheet: {time.perf_counter() - stage_start:.3f}s")
 
         if self.slices_only:
             bpy.data.objects.remove(target, do_unlink=True)
             _log("[Voxelator] Slices-only mode: skipped voxel mesh build")
+            _log(f"[Voxelator] Image cache: {_IMAGE_CACHE.stats()}")
             _log(f"[Voxelator][Timing] Total: {time.perf_counter() - total_start:.3f}s")
             _log("[Voxelator] Finished")
             self.report({'INFO'}, f"Voxelator completed PNG: {os.path.basename(save_path)}")
@@ -960,11 +1295,9 @@ class OBJECT_OT_voxelize(Operator):
 
         stage_start = time.perf_counter()
 
-        verts, faces, face_cells = _build_voxel_mesh_data(occupied, ox, oy, oz, cell_len, self.separate_cubes)
+        verts, faces, face_cells = voxel_core.build_voxel_mesh_data(voxels, self.separate_cubes)
         mesh_name = source_name + "_voxel_mesh"
-        mesh = bpy.data.meshes.new(mesh_name)
-        mesh.from_pydata(verts, [], faces)
-        mesh.update()
+        mesh = _mesh_from_voxel_buffers(mesh_name, verts, faces)
         obj = bpy.data.objects.new(mesh_name, mesh)
         context.collection.objects.link(obj)
 
@@ -986,19 +1319,16 @@ class OBJECT_OT_voxelize(Operator):
         _log(f"[Voxelator] Materials appended: {sum(1 for s in source.material_slots if s.material)}")
 
         mat_name_to_idx = {m.name: i for i, m in enumerate(obj.data.materials)}
-        polys = obj.data.polygons
-        total_p = len(polys)
-        step_p = max(1, total_p // 10) if total_p else 1
-        for pi, poly in enumerate(polys):
-            if pi >= len(face_cells):
-                break
-            mat = cube_mat_map.get(face_cells[pi])
+        source_mats = source.data.materials
+        slot_lut = np.zeros(len(source_mats) + 1, dtype=np.int32)
+        for si, mat in enumerate(source_mats):
             if mat:
-                idx = mat_name_to_idx.get(mat.name, -1)
-                if idx != -1:
-                    poly.material_index = idx
-            if ((pi + 1) % step_p) == 0 or (pi + 1) == total_p:
-                _log(f"[Voxelator] Face material assign {pi+1}/{total_p}")
+                slot_lut[si] = mat_name_to_idx.get(mat.name, 0)
+        polys = obj.data.polygons
+        face_mats = voxels.material_index[face_cells].astype(np.int64)
+        poly_mats = np.where(face_mats >= 0, slot_lut[face_mats], 0).astype(np.int32)
+        polys.foreach_set("material_index", poly_mats[:len(polys)])
+        _log(f"[Voxelator] Face material assign {len(poly_mats)}/{len(polys)}")
 
         mod = obj.modifiers.new(name='DataTransfer', type='DATA_TRANSFER')
         mod.use_loop_data = True
@@ -1077,6 +1407,7 @@ class OBJECT_OT_voxelize(Operator):
         obj.location = (0.0, 0.0, 0.0)
         _log("[Voxelator] Centered at origin")
         _log(f"[Voxelator][Timing] Finalize: {time.perf_counter() - stage_start:.3f}s")
+        _log(f"[Voxelator] Image cache: {_IMAGE_CACHE.stats()}")
         _log(f"[Voxelator][Timing] Total: {time.perf_counter() - total_start:.3f}s")
         _log("[Voxelator] Finished")
         self.report({'INFO'}, f"Voxelator completed mesh + PNG: {os.path.basename(save_path)}")